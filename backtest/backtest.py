@@ -1,16 +1,31 @@
-from backtest.utils.position import Position
+from backtest.utils.position import PositionBook
 from backtest.utils.dataretriever import DataRetriever
 from backtest.utils.indicators import *
-from backtest.utils.performance import get_performance_metrics, calculate_metrics
+from backtest.utils.performance import (
+    get_performance_metrics,
+    calculate_metrics,
+    MetricsAccumulator,
+)
+from backtest.utils.vectorized import simulate_targets
+from backtest.utils.panel import PricePanel, PanelRow, History, CrossSection
+from backtest.utils.optimize import expand_grid, SharedPanel
+from backtest.utils.history import HistoryRecorder, TradeLog, DATE
+from backtest.utils.streaming import IndicatorFeed
+from backtest.utils.events import EventSchedule
+from backtest.utils.stops import StopRule, StopBook
+from backtest.utils.snapshot import SnapshotPublisher
+from backtest.utils.indicator_graph import LazyIndicators
+from backtest.utils.indicator_cache import IndicatorCache
 
 from backtest.core.strategy_base import Strategy
-from backtest.core.indicator_base import Indicator
-from backtest.core.action_base import Action
+from backtest.core.indicator_base import check_valid_universe, make_indicator
+from backtest.core.action_base import Action, ActionType, NO_ACTION
 
 from backtest.frontend import Frontend
 
 import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 import pandas as pd
 import numpy as np
@@ -27,10 +42,25 @@ class Backtest:
         commission=0.001,
         slippage=0.0,
         stop_loss_pct=0.02,
+        trailing_stop_pct=None,
+        stop_trigger="close",
+        stop_gap="close",
         duration=365 * 10,
         start_date=None,
         end_date=None,
         interval="1h",
+        metrics_every=1,
+        cache=None,
+        offline=False,
+        provider=None,
+        indicators=None,
+        stream_indicators=False,
+        record_noops=True,
+        indicator_backend="serial",
+        indicator_workers=None,
+        indicator_cache=None,
+        snapshot_every=None,
+        snapshot_ms=250,
     ):
 
         self.datatretriever = DataRetriever(
@@ -38,39 +68,176 @@ class Backtest:
             start_date=start_date,
             end_date=end_date,
             interval=interval,
+            cache=cache,
+            offline=offline,
+            provider=provider,
         )
         # self.visualizer = Frontend()
 
         self.tickers = None  # List of tickers or sectors
+        self.requested_tickers = None  # self.tickers before failed downloads were dropped
 
         self.initial_capital = initial_capital
         self.capital = initial_capital
         self.commission = commission
         self.slippage = slippage
         self.stop_loss_pct = stop_loss_pct  # Percentage for stop loss (default 2%)
+        # Trailing, trigger (close / low) and fill (close / stop / level) policy of the stops
+        self.stop_rule = StopRule(trailing_stop_pct, stop_trigger, stop_gap)
+        self.stops = None  # StopBook of the open positions during run_backtest
+        self.metrics_every = metrics_every  # Record metrics every N bars, None = only at the end
 
         self.positions = None
         self.data = None
-        self.orders = []  # Orders executed during the backtest
+        self.panel = None  # Aligned (dates x tickers x fields) array of self.data
+        self.first_closes = None  # First close of every ticker, for Buy & Hold
+        self.aborted = False
+        # Orders executed during the backtest (stop loss NaN for sells), see orders
+        self._order_recorder = HistoryRecorder(
+            {
+                "Type": object,
+                "Price": np.float64,
+                "Amount": np.float64,
+                "Ticker": object,
+                "Stop Loss": np.float64,
+            }
+        )
 
-        self.portfolio_history = pd.DataFrame(
-            columns=["Date", "Capital", "Cash", "Equity", "Portfolio Value"]
-        ).set_index("Date")
-        self.action_history = pd.DataFrame(
-            columns=["Date", "Ticker", "Type", "Amount", "Price", "Stop Loss"]
-        ).set_index("Date")
-        self.position_history = pd.DataFrame(
-            columns=["Date", "Ticker", "Size", "Entry Price", "Stop Loss"]
-        ).set_index("Date")
+        self.metrics = None
+        self.create_history()
+        # Snapshots of the run for the frontend, published every N bars and / or T ms
+        self.snapshots = SnapshotPublisher(every=snapshot_every, interval_ms=snapshot_ms)
+
+        # Indicators offered in the frontend besides the strategy's (specs as in
+        # Strategy.indicators, e.g. ("SMA", {"window": 100})), None for
+        # DEFAULT_INDICATORS. They are only computed once selected.
+        self.extra_indicators = indicators
+        self.ta_indicators = []  # Indicators the strategy reads, computed with the data
+        self.indicators = None  # LazyIndicators over self.data
+        # Compute the strategy's indicators bar by bar with Indicator.stream() in the
+        # event loop instead of up front (vectorized runs still compute whole columns)
+        self.stream_indicators = stream_indicators
+        # Record the actions that are neither buys nor sells in the action history
+        self.record_noops = record_noops
+        # serial / threads / processes, for indicators that are applied ticker by ticker
+        self.indicator_backend = indicator_backend
+        self.indicator_workers = indicator_workers
+        # IndicatorCache (or a directory for one) to reuse indicator columns across runs
+        if isinstance(indicator_cache, str):
+            indicator_cache = IndicatorCache(directory=indicator_cache)
+        self.indicator_cache = indicator_cache
+
+    def create_history(self, dates=None, n_tickers=1):
+        """
+        Creates the columnar history recorders, preallocated for the aligned date index.
+        """
 
-        self.performance_history = pd.DataFrame(
-            columns=["Date"] + get_performance_metrics()
-        ).set_index("Date")
+        n_bars = len(dates) if dates is not None else 0
+        rows = max(n_bars * n_tickers, 1)
+
+        self._portfolio_recorder = HistoryRecorder(
+            {
+                "Date": DATE,
+                "Capital": np.float64,
+                "Cash": np.float64,
+                "Equity": np.float64,
+                "Portfolio Value": np.float64,
+            },
+            index="Date",
+            dates=dates,
+            capacity=max(n_bars, 1),
+        )
+        # Indexes the buy / sell rows per ticker, see TradeLog
+        self._action_recorder = TradeLog(
+            {
+                "Ticker": object,
+                "Type": object,
+                "Amount": np.float64,
+                "Price": np.float64,
+                "Stop Loss": np.float64,
+                "Date": DATE,
+            },
+            dates=dates,
+            capacity=rows,
+        )
+        self._position_recorder = HistoryRecorder(
+            {
+                "Ticker": object,
+                "Size": np.float64,
+                "Entry Price": np.float64,
+                "Stop Loss": np.float64,
+                "Date": DATE,
+            },
+            dates=dates,
+            capacity=rows,
+        )
+        self._performance_recorder = HistoryRecorder(
+            dict(
+                [(metric, object) for metric in get_performance_metrics()]
+                + [("Date", DATE)]
+            ),
+            dates=dates,
+            capacity=max(n_bars, 1),
+        )
 
-        self.ta_indicators = [cls() for cls in Indicator.__subclasses__()]
+    @property
+    def snapshot(self):
+        """The latest published Snapshot of the run (None before the first one)."""
+        return self.snapshots.latest
+
+    def publish_snapshot(self, i, done=False):
+        """Publishes the state up to bar i for readers on other threads (the frontend)."""
+
+        self.snapshots.publish(
+            i,
+            self.data,
+            {
+                "portfolio": self._portfolio_recorder.snapshot(),
+                "action": self._action_recorder.snapshot(),
+                "position": self._position_recorder.snapshot(),
+                "performance": self._performance_recorder.snapshot(),
+            },
+            done,
+        )
 
-    def execute_order(self, order_type, price, amount, ticker):
-        """Executes an order and updates the portfolio accordingly."""
+    @property
+    def order_history(self) -> pd.DataFrame:
+        return self._order_recorder.to_frame()
+
+    @property
+    def orders(self) -> list:
+        """The executed orders as dicts, like order_history (buys carry their stop loss)."""
+        orders = []
+        for type_, price, amount, ticker, stop_loss in zip(
+            *(self._order_recorder.column(name).tolist() for name in self._order_recorder.dtypes)
+        ):
+            order = {"type": type_, "price": price, "amount": amount, "ticker": ticker}
+            if type_ == "buy":
+                order["stop_loss"] = stop_loss
+            orders.append(order)
+        return orders
+
+    @property
+    def portfolio_history(self) -> pd.DataFrame:
+        return self._portfolio_recorder.to_frame()
+
+    @property
+    def action_history(self) -> pd.DataFrame:
+        return self._action_recorder.to_frame()
+
+    @property
+    def position_history(self) -> pd.DataFrame:
+        return self._position_recorder.to_frame()
+
+    @property
+    def performance_history(self) -> pd.DataFrame:
+        return self._performance_recorder.to_frame()
+
+    def execute_order(self, order_type, price, amount, ticker) -> float:
+        """
+        Executes an order and updates the portfolio accordingly. Returns the proceeds
+        credited by a sell (0 for buys and orders that were not filled).
+        """
 
         slippage_adjustment = price * self.slippage
         if order_type == "buy":
@@ -78,28 +245,156 @@ class Backtest:
 
             if self.capital >= price * amount:
                 stop_loss_price = price * (1 - self.stop_loss_pct)
+                if self.stops is not None:
+                    stop_loss_price = self.stops.set(ticker, stop_loss_price, price)
                 self.positions[ticker].buy(
                     price, amount, self.commission, stop_loss=stop_loss_price
                 )
 
                 self.capital -= price * amount * (1 + self.commission)
-                self.orders.append(
-                    {
-                        "type": "buy",
-                        "price": price,
-                        "amount": amount,
-                        "ticker": ticker,
-                        "stop_loss": stop_loss_price,
-                    }
-                )
+                self._order_recorder.append("buy", price, amount, ticker, stop_loss_price)
         elif order_type == "sell":
             price -= slippage_adjustment  # Apply slippage to sell price
             if self.positions[ticker].size >= amount:
                 proceeds = self.positions[ticker].sell(price, amount, self.commission)
                 self.capital += proceeds
-                self.orders.append(
-                    {"type": "sell", "price": price, "amount": amount, "ticker": ticker}
+                if self.stops is not None and not self.positions[ticker].is_open():
+                    self.stops.remove(ticker)
+                self._order_recorder.append("sell", price, amount, ticker, np.nan)
+                return proceeds
+        return 0.0
+
+    def fill_action(self, i, ticker, action: Action, price):
+        """Executes and records the strategy's action for a ticker on bar i."""
+
+        action_type = action.type
+        filled = True
+        if action_type in (ActionType.BUY, ActionType.SELL):
+            # Orders that were not executed are recorded, but not indexed as trades
+            orders = len(self._order_recorder)
+            self.execute_order(action_type, price, action.amount, ticker)
+            filled = len(self._order_recorder) > orders
+            self.metrics.count_trade()
+        elif not self.record_noops:
+            return
+        self._action_recorder.append(
+            ticker,
+            action_type,
+            action.amount,
+            price,
+            self.positions[ticker].stop_loss,
+            i,
+            filled=filled,
+        )
+
+    def fill_orders(self, i, orders: dict, stopped: dict, fills, closes):
+        """
+        Executes and records the orders (ticker -> Action) of a batched strategy on bar
+        i. The held back proceeds of the stop losses in `stopped` (j -> (size, proceeds))
+        are credited right before the ticker's own order, in ticker order. Only the
+        tickers with an order or a stop are visited; the bar's rows are recorded in one
+        step, with a no-op row for every other ticker if record_noops.
+        """
+
+        positions = self.positions
+        ticker_index = positions.index
+        active = sorted({ticker_index[t] for t in orders if t in ticker_index}.union(stopped))
+        rows = []  # (j, type, amount, price, stop loss, filled) in ticker order
+        for j in active:
+            ticker = self.tickers[j]
+            if j in stopped:
+                size, proceeds = stopped[j]
+                self.capital += proceeds
+                rows.append((j, ActionType.SELL, size, fills[j], positions.stop_loss[j], True))
+                self.metrics.count_trade()
+            action = orders.get(ticker, NO_ACTION)
+            filled = True
+            if action.type in (ActionType.BUY, ActionType.SELL):
+                n_orders = len(self._order_recorder)
+                self.execute_order(action.type, closes[j], action.amount, ticker)
+                filled = len(self._order_recorder) > n_orders
+                self.metrics.count_trade()
+            elif not self.record_noops:
+                continue
+            rows.append((j, action.type, action.amount, closes[j], positions.stop_loss[j], filled))
+
+        recorder = self._action_recorder
+        if not active:
+            if self.record_noops:
+                recorder.extend_values(
+                    len(positions),
+                    positions.ticker_array,
+                    ActionType.NONE,
+                    0.0,
+                    closes,
+                    positions.stop_loss,
+                    i,
                 )
+            return
+        if not rows:
+            return
+
+        columns = list(zip(*rows))
+        j_rows = np.array(columns[0], dtype=np.intp)
+        types = np.array(columns[1], dtype=object)
+        amounts = np.array(columns[2], dtype=np.float64)
+        prices = np.array(columns[3], dtype=np.float64)
+        stop_levels = np.array(columns[4], dtype=np.float64)
+        filled = np.array(columns[5], dtype=bool)
+        if self.record_noops:
+            # The other tickers hold, their rows go in between in ticker order
+            holds = np.ones(len(positions), dtype=bool)
+            holds[active] = False
+            holds = np.flatnonzero(holds)
+            order = np.argsort(np.concatenate([j_rows, holds]), kind="stable")
+            j_rows = np.concatenate([j_rows, holds])[order]
+            noops = np.full(len(holds), ActionType.NONE, dtype=object)
+            types = np.concatenate([types, noops])[order]
+            amounts = np.concatenate([amounts, np.zeros(len(holds))])[order]
+            prices = np.concatenate([prices, closes[holds]])[order]
+            stop_levels = np.concatenate([stop_levels, positions.stop_loss[holds]])[order]
+            filled = np.concatenate([filled, np.ones(len(holds), dtype=bool)])[order]
+        recorder.extend_values(
+            len(j_rows),
+            positions.ticker_array[j_rows],
+            types,
+            amounts,
+            prices,
+            stop_levels,
+            i,
+            filled=filled,
+        )
+
+    def record_stop(self, i, j, size, price):
+        """Records the stop loss sale of `size` of the j-th ticker on bar i."""
+        self._action_recorder.append(
+            self.tickers[j], ActionType.SELL, size, price, self.positions.stop_loss[j], i
+        )
+        self.metrics.count_trade()
+
+    def record_positions(self, start, end=None):
+        """Records every position on bars start..end-1 (just bar start by default) in one step."""
+
+        positions = self.positions
+        if end is None:
+            self._position_recorder.extend_values(
+                len(positions),
+                positions.ticker_array,
+                positions.size,
+                positions.entry_price,
+                positions.stop_loss,
+                start,
+            )
+            return
+        n_bars = end - start
+        self._position_recorder.extend_values(
+            n_bars * len(positions),
+            np.tile(positions.ticker_array, n_bars),
+            np.tile(positions.size, n_bars),
+            np.tile(positions.entry_price, n_bars),
+            np.tile(positions.stop_loss, n_bars),
+            np.repeat(np.arange(start, end), len(positions)),
+        )
 
     def run_backtest(
         self,
@@ -107,114 +402,417 @@ class Backtest:
         tickers: Union[str, List[str]],
         sector: str = None,
         fast=True,
+        abort=None,
+        abort_every=100,
     ):
-        """Runs the backtest with the given strategy and tickers."""
+        """
+        Runs the backtest with the given strategy and tickers.
+        abort(metrics, i) is called with the running metrics every `abort_every` bars
+        and stops the run early when it returns True (see utils/optimize.EarlyAbort).
+        Strategies implementing get_actions are called once per date after the stop
+        losses of every ticker closed their positions, the others once per ticker.
+        Either way a ticker's stop proceeds are credited right before its own order,
+        in ticker order, so both spend the cash in the same order.
+
+        Strategies implementing next_event are only called on event bars: the bars
+        their Wake asks for and stop loss triggers (see utils/events.py). The bars in
+        between are marked to market in bulk, without no-op action records, and
+        metrics are recorded at most once per skipped run of bars. Streamed
+        indicators need every bar, so they turn the skipping off.
+        """
 
-        all_dates = self.data[tickers[0]].index
+        panel = self.panel
+        feed = None
+        if self.stream_indicators and self.ta_indicators:
+            columns = [column for ind in self.ta_indicators for column in ind.columns]
+            if not panel.values.flags.writeable or any(
+                column not in panel.field_index for column in columns
+            ):
+                panel = self.panel = panel.with_fields(columns)
+            feed = IndicatorFeed(self.ta_indicators, self.tickers, panel.field_index)
+
+        all_dates = panel.dates
+        close = panel.field("Close")
+        series_rows = getattr(strategy, "series_rows", False)
+        history = strategy.history = History(panel)
+        # Strategies implementing get_actions get one call per date for all tickers
+        batched = type(strategy).get_actions is not Strategy.get_actions
+        # Strategies implementing next_event are only called on event bars
+        schedule = None
+        if type(strategy).next_event is not Strategy.next_event and feed is None:
+            schedule = EventSchedule(panel)
+        cross_section = CrossSection(panel) if batched or schedule is not None else None
+
+        self.create_history(all_dates, len(self.tickers))
+
+        self.metrics = MetricsAccumulator(self.initial_capital, self.first_closes)
+        self.aborted = False
+        self.snapshots.start_run()
+        self.publish_snapshot(-1)
+
+        positions = self.positions = PositionBook.of(self.positions)
+        stops = self.stops = StopBook(self.stop_rule, panel)
+        for ticker, position in positions.items():
+            if position.is_open() and position.stop_loss is not None:
+                stops.set(ticker, position.stop_loss, position.highest_price or position.entry_price)
+
+        i = 0
+        while i < len(all_dates):
+            date = all_dates[i]
+            # print("Date: ", date)
+            bar = panel.values[i]
+            closes = close[i]
+            history.seek(i)
+
+            # Every open stop is checked, then trailed, in one step
+            triggered, fills = stops.check(i)
+            trailed = stops.trail(i, skip=triggered)
+            positions.stop_loss[trailed] = stops.level[trailed]
+
+            if feed is not None:
+                for j in range(len(self.tickers)):
+                    feed.update(j, PanelRow(bar[j], panel.field_index, date), bar[j])
+
+            if not batched:
+                for j, ticker in enumerate(self.tickers):
+                    current_price = closes[j]
+                    if triggered[j]:
+                        stopped_size = positions.size[j]
+                        self.execute_order("sell", fills[j], stopped_size, ticker)
+                        self.record_stop(i, j, stopped_size, fills[j])
+
+                    row = PanelRow(bar[j], panel.field_index, date)
+                    if series_rows:
+                        row = row.to_series()
+                    action = strategy.get_action(row, ticker, positions)
+                    self.fill_action(i, ticker, action, current_price)
+            else:
+                # get_actions sees the stopped positions closed, but their proceeds are
+                # held back and credited right before the ticker's order, like above
+                stopped = {}
+                capital = self.capital
+                for j in np.flatnonzero(triggered):
+                    size = positions.size[j]
+                    stopped[j] = size, self.execute_order("sell", fills[j], size, self.tickers[j])
+                self.capital = capital
+
+                cross_section.seek(i)
+                # Sparse: tickers without an order hold
+                orders = strategy.get_actions(date, cross_section, positions) or {}
+                orders = orders if isinstance(orders, dict) else dict(orders)
+                self.fill_orders(i, orders, stopped, fills, closes)
+
+            # Positions are recorded and marked to market for all tickers at once
+            self.record_positions(i)
+            equity = self.capital + positions.value(closes)
+
+            self._portfolio_recorder.append(
+                i, self.initial_capital, self.capital, equity, equity
+            )
 
-        for ticker in self.tickers:
-            all_dates = all_dates.intersection(self.data[ticker].index)
+            self.metrics.update(date, self.capital, equity, closes)
+            if self.metrics_every is not None and (i + 1) % self.metrics_every == 0:
+                self.record_metrics(i)
 
-        for i, date in enumerate(all_dates):
-            # print("Date: ", date)
-            total_value = 0
-
-            for ticker in self.tickers:
-                row = self.data[ticker].loc[date]
-                current_price = row["Close"]
-                if self.positions[ticker].is_open():
-                    if current_price <= self.positions[ticker].stop_loss:
-                        self.execute_order(
-                            "sell", current_price, self.positions[ticker].size, ticker
-                        )
-                        action_entry = {
-                            "Date": date,
-                            "Ticker": ticker,
-                            "Type": "sell",
-                            "Amount": self.positions[ticker].size,
-                            "Price": current_price,
-                            "Stop Loss": self.positions[ticker].stop_loss,
-                        }
-                        self.action_history = pd.concat(
-                            [self.action_history, pd.DataFrame([action_entry])],
-                            ignore_index=True,
-                        )
-
-                    self.positions[ticker].update_stop_loss(
-                        current_price, trailing_stop_pct=0.05
-                    )
-
-                action = strategy.get_action(row, ticker, self.positions)
-
-                if action.type == "buy":
-                    self.execute_order("buy", current_price, action.amount, ticker)
-                elif action.type == "sell":
-                    self.execute_order("sell", current_price, action.amount, ticker)
-
-                total_value += self.positions[ticker].get_value(current_price)
-
-                action_entry = {
-                    "Date": date,
-                    "Ticker": ticker,
-                    "Type": action.type,
-                    "Amount": action.amount,
-                    "Price": current_price,
-                    "Stop Loss": self.positions[ticker].stop_loss,
-                }
-
-                Position_entry = {
-                    "Date": date,
-                    "Ticker": ticker,
-                    "Size": self.positions[ticker].size,
-                    "Entry Price": self.positions[ticker].entry_price,
-                    "Stop Loss": self.positions[ticker].stop_loss,
-                }
-
-                self.action_history = pd.concat(
-                    [self.action_history, pd.DataFrame([action_entry])],
-                    ignore_index=True,
-                )
-                self.position_history = pd.concat(
-                    [self.position_history, pd.DataFrame([Position_entry])],
-                    ignore_index=True,
-                )
+            if (
+                abort is not None
+                and (i + 1) % abort_every == 0
+                and abort(self.metrics.metrics(), i)
+            ):
+                self.aborted = True
+                break
+
+            if self.snapshots.due(i):
+                self.publish_snapshot(i)
+
+            if not fast:
+                time.sleep(0.5)
 
-            equity = self.capital + total_value
+            if schedule is None:
+                i += 1
+                continue
+            cross_section.seek(i)
+            wake = strategy.next_event(date, cross_section, positions)
+            if wake is None:
+                i += 1
+                continue
+            next_i = schedule.next_event(i, wake, stops)
+            if next_i > i + 1 and self.fast_forward(i + 1, next_i, abort, abort_every):
+                break
+            i = next_i
+
+        n_bars = len(self._portfolio_recorder)
+        recorded = self._performance_recorder.column("Date")
+        if n_bars and (not len(recorded) or recorded[-1] != n_bars - 1):
+            self.record_metrics(n_bars - 1)
+        self.stops = None
+        self.publish_snapshot(n_bars - 1, done=True)
+
+    def fast_forward(self, start, end, abort=None, abort_every=100) -> bool:
+        """
+        Records bars start..end-1 of an event driven run, on which nothing happens,
+        in bulk: positions are carried over and marked to market at the closes.
+        Returns True if `abort` stopped the run.
+        """
 
-            portfolio_entry = {
-                "Date": date,
+        positions = self.positions
+        close = self.panel.field("Close")[start:end]
+        equity = self.capital + close @ positions.size
+
+        self._portfolio_recorder.extend(
+            {
+                "Date": np.arange(start, end),
                 "Capital": self.initial_capital,
                 "Cash": self.capital,
                 "Equity": equity,
                 "Portfolio Value": equity,
             }
+        )
+        # Trailing stops keep moving on skipped bars, the others keep their level
+        levels = self.stops.advance(start, end)
+        self.record_positions(start, end)
+        recorded = self._position_recorder.column("Stop Loss")[-levels.size :]
+        np.copyto(recorded, levels.reshape(-1), where=~np.isnan(levels.reshape(-1)))
+        active = self.stops.active
+        positions.stop_loss[active] = self.stops.level[active]
+
+        dates = self.panel.dates
+        self.metrics.update_many(dates[start], dates[end - 1], self.capital, equity, close[-1])
+        # The bars' own boundaries were skipped, so these fire on the last bar of the run
+        if self.metrics_every is not None and end // self.metrics_every > start // self.metrics_every:
+            self.record_metrics(end - 1)
+        if self.snapshots.due(end - 1):
+            self.publish_snapshot(end - 1)
+        if (
+            abort is not None
+            and end // abort_every > start // abort_every
+            and abort(self.metrics.metrics(), end - 1)
+        ):
+            self.aborted = True
+            return True
+        return False
+
+    def run_vectorized_backtest(self, strategy: Strategy):
+        """
+        Runs the backtest on the whole date axis at once from the target position
+        sizes returned by strategy.generate_signals. See utils/vectorized.py for the
+        fill rules, which match the event loop for strategies that fit both modes.
+        Only buys, sells and stop loss triggers are recorded in the action history,
+        and the performance metrics are computed once at the end.
+        """
 
-            self.portfolio_history.loc[date] = portfolio_entry
+        if self.stream_indicators and self.indicators is not None:
+            # Signals are generated from whole columns
+            self.indicators.materialize(str(ind) for ind in self.ta_indicators)
 
-            metrics_entry = calculate_metrics(
-                date, self.data, self.portfolio_history, self.action_history
-            )
+        all_dates = self.panel.dates
+        self.create_history(all_dates, len(self.tickers))
+        self.snapshots.start_run()
 
-            self.performance_history = pd.concat(
-                [self.performance_history, pd.DataFrame([metrics_entry])],
-                ignore_index=True,
+        frames = {
+            ticker: (
+                self.data[ticker]
+                if self.data[ticker].index.equals(all_dates)
+                else self.data[ticker].loc[all_dates]
             )
-            if not fast:
-                time.sleep(0.5)
+            for ticker in self.tickers
+        }
+        targets = self.align_signals(strategy.generate_signals(frames), all_dates)
+        close = self.panel.field("Close")
+
+        result = simulate_targets(
+            close,
+            targets,
+            self.initial_capital,
+            commission=self.commission,
+            slippage=self.slippage,
+            stop_loss_pct=self.stop_loss_pct,
+            stop_rule=self.stop_rule,
+            prices={
+                field: self.panel.field(field)
+                for field in ("Open", "High", "Low")
+                if field in self.panel.field_index
+            },
+        )
+        n_bars, n_tickers = close.shape
+        tickers = np.array(self.tickers, dtype=object)
+        bars = np.arange(n_bars)
+
+        self._portfolio_recorder.extend(
+            {
+                "Date": bars,
+                "Capital": self.initial_capital,
+                "Cash": result["cash"],
+                "Equity": result["equity"],
+                "Portfolio Value": result["equity"],
+            }
+        )
+        self._position_recorder.extend(
+            {
+                "Ticker": np.tile(tickers, n_bars),
+                "Size": result["size"].reshape(-1),
+                "Entry Price": result["entry_price"].reshape(-1),
+                "Stop Loss": result["stop_loss"].reshape(-1),
+                "Date": np.repeat(bars, n_tickers),
+            }
+        )
+
+        # Stop loss rows come before the order of the same bar, like in the event loop
+        stop_t, stop_n = np.nonzero(result["stopped"])
+        order_t, order_n = np.nonzero(result["attempted"])
+        t = np.concatenate([stop_t, order_t])
+        n = np.concatenate([stop_n, order_n])
+        kind = np.concatenate([np.zeros(stop_t.size), np.ones(order_t.size)])
+        order = np.lexsort((kind, n, t))
+        t, n, kind = t[order], n[order], kind[order]
+
+        attempted = result["attempted"][t, n]
+        executed = (kind == 0) | (result["executed"][t, n] != 0)
+        stop_level = np.vstack([np.full((1, n_tickers), np.nan), result["stop_loss"][:-1]])
+        self._action_recorder.extend(
+            {
+                "Ticker": tickers[n],
+                "Type": np.where((kind == 0) | (attempted < 0), "sell", "buy").astype(object),
+                "Amount": np.where(kind == 0, result["previous_size"][t, n], np.abs(attempted)),
+                "Price": np.where(kind == 0, result["stop_fill"][t, n], close[t, n]),
+                "Stop Loss": np.where(kind == 0, stop_level[t, n], result["stop_loss"][t, n]),
+                "Date": t,
+            },
+            filled=executed,
+        )
+
+        t, n, kind = t[executed], n[executed], kind[executed]
+        amount = np.where(kind == 0, -result["previous_size"][t, n], result["executed"][t, n])
+        is_buy = amount > 0
+        price = np.where(
+            kind == 0,
+            result["stop_price"][t, n],
+            np.where(is_buy, result["buy_price"][t, n], result["sell_price"][t, n]),
+        )
+        self._order_recorder.extend(
+            {
+                "Type": np.where(is_buy, "buy", "sell").astype(object),
+                "Price": price,
+                "Amount": np.abs(amount),
+                "Ticker": tickers[n],
+                "Stop Loss": np.where(is_buy, result["stop_loss"][t, n], np.nan),
+            }
+        )
+
+        self.capital = result["cash"][-1]
+        positions = self.positions
+        positions.size[:] = result["size"][-1]
+        traded = ~np.isnan(result["entry_price"][-1])
+        positions.entry_price[traded] = result["entry_price"][-1, traded]
+        positions.stop_loss[traded] = result["stop_loss"][-1, traded]
+
+        metrics_entry = calculate_metrics(
+            all_dates[-1], self.data, self.portfolio_history, self.action_history
+        )
+        metrics_entry["Date"] = n_bars - 1
+        self._performance_recorder.append_row(metrics_entry)
+        self.publish_snapshot(n_bars - 1, done=True)
+
+    def align_signals(self, signals, dates) -> np.ndarray:
+        """
+        Turns the output of generate_signals into a (dates x tickers) target array.
+        Accepts a DataFrame with one column per ticker, or a dict of Series/arrays.
+        Tickers without a signal get a target of 0.
+        """
+
+        if isinstance(signals, pd.DataFrame):
+            signals = {ticker: signals[ticker] for ticker in signals.columns}
+
+        targets = np.zeros((len(dates), len(self.tickers)))
+        for n, ticker in enumerate(self.tickers):
+            if ticker not in signals:
+                continue
+            signal = signals[ticker]
+            if isinstance(signal, pd.Series):
+                signal = signal.reindex(dates)
+            signal = np.asarray(signal, dtype=np.float64)
+            if signal.shape != (len(dates),):
+                raise ValueError(
+                    f"Signal for {ticker} has shape {signal.shape}, expected ({len(dates)},)"
+                )
+            targets[:, n] = signal
+        return targets
+
+    def get_dates(self):
+        """Returns the dates on which every ticker has data."""
+
+        all_dates = self.data[self.tickers[0]].index
+        for ticker in self.tickers:
+            all_dates = all_dates.intersection(self.data[ticker].index)
+        return all_dates
+
+    def record_metrics(self, i):
+        """Appends the current running metrics to the performance history at bar i."""
+
+        metrics_entry = self.metrics.metrics()
+        metrics_entry["Date"] = i
+        self._performance_recorder.append_row(metrics_entry)
 
     def get_data(self):
+        self.requested_tickers = list(self.tickers)
         self.data = self.datatretriever.get_data(self.tickers)
+        # Tickers that could not be downloaded are skipped (see datatretriever.failed_tickers)
+        self.tickers = [ticker for ticker in self.tickers if ticker in self.data]
+        if self.positions is not None:
+            self.positions = PositionBook.of(self.positions).select(self.tickers)
         self.data = self.apply_ta_indicators()
+        self.build_panel()
         return self.data
 
+    def build_panel(self):
+        self.panel = PricePanel.from_frames(self.data, self.tickers, self.get_dates())
+        self.first_closes = np.array(
+            [self.data[ticker]["Close"].iloc[0] for ticker in self.tickers]
+        )
+
+    def attach_panel(self, panel: PricePanel, first_closes):
+        """
+        Uses an already loaded price panel instead of downloading the data, e.g. in the
+        worker processes of optimize(). self.data is rebuilt from the panel.
+        """
+
+        self.tickers = list(panel.tickers)
+        self.requested_tickers = list(self.tickers)
+        self.positions = PositionBook(self.tickers)
+        self.panel = panel
+        self.first_closes = np.asarray(first_closes)
+        self.data = panel.to_frames()
+
+    def select_indicators(self, strategies):
+        """Sets ta_indicators to the indicators declared by the given strategies."""
+
+        selected = {}
+        for strategy in strategies:
+            for spec in strategy.indicators:
+                indicator = make_indicator(spec)
+                selected.setdefault(str(indicator), indicator)
+        self.ta_indicators = list(selected.values())
+
     def apply_ta_indicators(self):
         """
-        Applies the technical Indicators as found in utils/inidcators.py to the data.
+        Computes the strategy's indicators (ta_indicators) on the data, unless they
+        are streamed in the event loop. The other available indicators are computed
+        by self.indicators when first needed.
         """
 
-        for indicator in self.ta_indicators:
-            for ticker in self.tickers:
-                self.data[ticker] = indicator.apply(self.data[ticker])
+        # Indicators are computed on (dates x tickers) blocks, so the data is validated once
+        check_valid_universe(self.data)
+
+        extra = self.extra_indicators if self.extra_indicators is not None else DEFAULT_INDICATORS
+        self.indicators = LazyIndicators(
+            self.ta_indicators + [make_indicator(spec) for spec in extra],
+            self.data,
+            backend=self.indicator_backend,
+            max_workers=self.indicator_workers,
+            cache=self.indicator_cache,
+        )
+        if not self.stream_indicators:
+            self.indicators.materialize(str(ind) for ind in self.ta_indicators)
         return self.data
 
     def get_tickers(self, tickers=Union[str, List[str]], sector: str = None):
@@ -231,34 +829,131 @@ class Backtest:
         else:
             ["^GSPC"]
 
-    def run(self, strategy, tickers, sector=None, start_visualizer=True, fast=True):
-        """Runs the backtest and starts the frontend visualization."""
+    def settings(self) -> dict:
+        """Constructor parameters that affect the simulation, used to rebuild the Backtest in workers."""
+
+        return dict(
+            initial_capital=self.initial_capital,
+            commission=self.commission,
+            slippage=self.slippage,
+            stop_loss_pct=self.stop_loss_pct,
+            trailing_stop_pct=self.stop_rule.trailing_pct,
+            stop_trigger=self.stop_rule.trigger,
+            stop_gap=self.stop_rule.gap,
+            metrics_every=self.metrics_every,
+            stream_indicators=self.stream_indicators,
+        )
+
+    def optimize(
+        self,
+        strategy_cls,
+        param_grid,
+        tickers=None,
+        sector=None,
+        metric="Sharpe Ratio",
+        maximize=True,
+        n_jobs=None,
+        mode="event",
+        abort=None,
+        abort_every=100,
+    ) -> pd.DataFrame:
+        """
+        Runs strategy_cls(**params) for every combination in param_grid and ranks them by `metric`.
+
+        The data is downloaded once (again only for other tickers or a sector), the indicators
+        declared by the grid are added to it, then it is shared with the worker processes
+        through shared memory. n_jobs=1 runs everything in this
+        process, n_jobs=None uses all CPUs. `abort` is passed on to run_backtest so hopeless
+        parameter sets can be stopped mid-run; aborted runs are ranked last.
+        strategy_cls, the parameters and `abort` have to be picklable.
+
+        Returns a DataFrame with the parameters, the get_performance_metrics() columns
+        and an "Aborted" column, one row per combination, best first.
+        """
+
+        combinations = expand_grid(param_grid)
+        self.select_indicators(strategy_cls(**params) for params in combinations)
+
+        loaded = self.tickers
+        if self.panel is None or tickers is not None or sector is not None:
+            self.get_tickers(tickers=tickers, sector=sector)
+        if self.panel is None or self.tickers != self.requested_tickers:
+            self.positions = PositionBook(self.tickers)
+            self.get_data()
+        else:
+            self.tickers = loaded
+            if self.indicators is None:
+                # Attached panel (attach_panel), the indicators start from its frames
+                self.apply_ta_indicators()
+            self.indicators.add(self.ta_indicators)
+
+        # Streamed indicators are computed by the workers, except for vectorized runs,
+        # which generate signals from whole columns
+        if not self.stream_indicators or mode == "vectorized":
+            self.indicators.materialize(str(ind) for ind in self.ta_indicators)
+            columns = [column for ind in self.ta_indicators for column in ind.columns]
+            if any(column not in self.panel.field_index for column in columns):
+                self.build_panel()
+
+        tasks = [(strategy_cls, params, mode, abort, abort_every) for params in combinations]
+
+        if n_jobs == 1:
+            results = [
+                run_parameters(self.panel, self.first_closes, self.settings(), *task)
+                for task in tasks
+            ]
+        else:
+            with SharedPanel(self.panel) as shared:
+                with ProcessPoolExecutor(
+                    max_workers=n_jobs,
+                    initializer=init_optimize_worker,
+                    initargs=(shared.spec(), self.first_closes, self.settings()),
+                ) as pool:
+                    results = list(pool.map(run_worker_parameters, tasks))
+
+        ranking = pd.DataFrame(results)
+        ranking = ranking.sort_values(
+            ["Aborted", metric], ascending=[True, not maximize], na_position="last"
+        )
+        return ranking.reset_index(drop=True)
+
+    def run(
+        self,
+        strategy,
+        tickers,
+        sector=None,
+        start_visualizer=True,
+        fast=True,
+        mode="event",
+    ):
+        """
+        Runs the backtest and starts the frontend visualization.
+        mode="event" calls strategy.get_action bar by bar, mode="vectorized" uses
+        strategy.generate_signals and simulates the whole run with array operations.
+        """
+
+        if mode == "event":
+            target, args = self.run_backtest, (strategy, tickers, sector, fast)
+        elif mode == "vectorized":
+            target, args = self.run_vectorized_backtest, (strategy,)
+        else:
+            raise ValueError(f"Unknown mode {mode}, use 'event' or 'vectorized'")
 
         self.get_tickers(tickers=tickers, sector=sector)
-        self.positions = {
-            ticker: Position(size=0, entry_price=None, stop_loss=None)
-            for ticker in self.tickers
-        }
+        self.positions = PositionBook(self.tickers)
+        self.select_indicators([strategy])
         self.get_data()
 
         if start_visualizer:
             # Create Frontend instance with reference to this Backtest instance
             self.visualizer = Frontend(backtest_instance=self)
 
-            self.visualizer.update_info(
-                self.tickers,
-                dict(
-                    (str(indicator), (indicator.columns, indicator.need_extra_graph))
-                    for indicator in self.ta_indicators
-                ),
-            )
+            self.visualizer.update_info(self.tickers, self.indicators.info())
 
             webbrowser.open("http://127.0.0.1:8050/")
 
             # Start backtest in a separate thread
-            backtest_thread = threading.Thread(
-                target=self.run_backtest, args=(strategy, tickers, sector, fast)
-            )
+            backtest_thread = threading.Thread(target=target, args=args)
             backtest_thread.daemon = True
             backtest_thread.start()
 
@@ -267,7 +962,7 @@ class Backtest:
 
         else:
             print("Starting backtest...")
-            self.run_backtest(strategy, tickers, sector, fast)
+            target(*args)
 
             print("Backtest completed.")
 
@@ -275,3 +970,51 @@ class Backtest:
             print("Actions:\n", self.action_history)
             print("Positions:\n", self.position_history)
             print("Performance:\n", self.performance_history)
+
+
+def run_parameters(
+    panel, first_closes, settings, strategy_cls, params, mode, abort, abort_every
+) -> dict:
+    """Runs one parameter combination of Backtest.optimize on a loaded panel."""
+
+    backtest = Backtest(**settings)
+    backtest.attach_panel(panel, first_closes)
+    strategy = strategy_cls(**params)
+    backtest.select_indicators([strategy])
+
+    if mode == "event":
+        backtest.run_backtest(
+            strategy, backtest.tickers, abort=abort, abort_every=abort_every
+        )
+    elif mode == "vectorized":
+        backtest.run_vectorized_backtest(strategy)
+    else:
+        raise ValueError(f"Unknown mode {mode}, use 'event' or 'vectorized'")
+
+    metrics = backtest.performance_history.iloc[-1]
+    result = dict(params)
+    result.update((metric, metrics[metric]) for metric in get_performance_metrics())
+    result["Aborted"] = backtest.aborted
+    return result
+
+
+# State of an optimize() worker process, set once by init_optimize_worker
+_worker_state = {}
+
+
+def init_optimize_worker(spec, first_closes, settings):
+    shm, panel = SharedPanel.attach(spec)
+    # Keep the handle referenced for the lifetime of the worker
+    _worker_state["shm"] = shm
+    _worker_state["panel"] = panel
+    _worker_state["first_closes"] = first_closes
+    _worker_state["settings"] = settings
+
+
+def run_worker_parameters(task) -> dict:
+    return run_parameters(
+        _worker_state["panel"],
+        _worker_state["first_closes"],
+        _worker_state["settings"],
+        *task,
+    )
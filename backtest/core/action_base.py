@@ -1,10 +1,30 @@
+from enum import StrEnum
+
+
+class ActionType(StrEnum):
+    """Interned action types, equal to (and hashed like) the plain strings."""
+
+    BUY = "buy"
+    SELL = "sell"
+    NONE = "None"
+
+
+ACTION_TYPES = {action_type.value: action_type for action_type in ActionType}
+
+
 class Action:
 
+    __slots__ = ("type", "amount", "stop_loss")
+
     def __init__(self, type, amount, stop_loss):
-        self.type = type
+        # Known types are shared ActionType members, other strings are kept as given
+        self.type = ACTION_TYPES.get(type, type)
         self.amount = amount
         self.stop_loss = stop_loss
-        pass
 
     def __repr__(self):
         return f"Action({self.type},{self.amount},{self.stop_loss})"
+
+
+# The no-op action, used for tickers a batched strategy (Strategy.get_actions) gives no order
+NO_ACTION = Action(ActionType.NONE, 0, None)
@@ -1,5 +1,34 @@
 import pandas as pd
 
+from backtest.utils.indicator_graph import IndicatorGraph
+
+
+# Indicators that can be selected by name, see register_indicator
+INDICATORS = {}
+
+
+def register_indicator(cls):
+    """Class decorator making an Indicator selectable by its class name."""
+    INDICATORS[cls.__name__] = cls
+    return cls
+
+
+def make_indicator(spec):
+    """
+    Turns an indicator spec into an Indicator: an Indicator instance is used as is,
+    a name is looked up in INDICATORS, and (name, params) calls it with **params.
+    """
+
+    if isinstance(spec, Indicator):
+        return spec
+    if isinstance(spec, str):
+        name, params = spec, {}
+    else:
+        name, params = spec
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator {name}, registered: {', '.join(INDICATORS)}")
+    return INDICATORS[name](**params)
+
 
 class Indicator:
 
@@ -7,8 +36,43 @@ class Indicator:
         self.name = name
         self.columns = []
         self.need_extra_graph = False
+        # Nodes (see utils/indicator_graph.py) or columns compute() reads. None means
+        # the indicator only implements apply() and is run as a whole.
+        self.inputs = None
+        # Bars of history needed to compute the latest value exactly, None when every
+        # past bar matters (e.g. EWM) or it is unknown. Lets caches compute only new bars.
+        self.lookback = None
+
+    def params(self) -> dict:
+        """The scalar parameters of the indicator (window, span, ...), used in cache keys."""
+        return {
+            key: value
+            for key, value in vars(self).items()
+            if isinstance(value, (bool, int, float, str))
+            and key not in ("name", "need_extra_graph", "lookback")
+        }
+
+    def compute(self, inputs: dict) -> dict:
+        """
+        Gets the declared inputs (input -> values) and returns column -> values for
+        every column in self.columns. The values are Series for a single ticker or
+        (dates x tickers) DataFrames for a whole universe, so element-wise pandas
+        operations work for both.
+        """
+        raise NotImplementedError
 
     def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        if self.inputs is None:
+            raise NotImplementedError
+        if check_valid_data(data):
+            return IndicatorGraph([self]).apply(data)
+
+    def stream(self):
+        """
+        Streaming form of apply(): returns a new IndicatorStream (utils/streaming.py)
+        whose update(bar) takes one bar at a time and returns column -> value, in
+        O(1) per bar. Each ticker needs its own stream.
+        """
         raise NotImplementedError
 
     def visualize(self, data: pd.DataFrame) -> pd.DataFrame:
@@ -37,3 +101,17 @@ def check_valid_data(data: pd.DataFrame):
         raise ValueError("data does not contain 'volume' column")
 
     return True
+
+
+def check_valid_universe(data: dict):
+    """check_valid_data for every ticker of a universe, reporting all invalid tickers at once."""
+
+    problems = []
+    for ticker, frame in data.items():
+        try:
+            check_valid_data(frame)
+        except ValueError as e:
+            problems.append(f"{ticker}: {e}")
+    if problems:
+        raise ValueError("Invalid data for " + "; ".join(problems))
+    return True
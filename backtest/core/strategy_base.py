@@ -3,9 +3,57 @@ from backtest.core.action_base import Action
 
 class Strategy:
 
+    # get_action receives a lightweight PanelRow by default; set to True to get
+    # the row as a pandas Series instead.
+    series_rows = False
+
+    # Indicators the strategy reads: Indicator instances, registered names or
+    # (name, params) tuples. Only these are computed before the run; reading the
+    # column of an undeclared indicator raises a KeyError.
+    indicators = []
+
+    # Set by the engine for event driven runs: history(ticker, field, n) returns the
+    # last n values up to the current bar as a read-only NumPy view, see utils/panel.History.
+    history = None
+
     def __init__(self):
         pass
 
     def get_action(self, data, ticker) -> Action:
 
         pass
+
+    def get_actions(self, date, cross_section, positions) -> dict:
+        """
+        Optional batched form of get_action, called once per date instead of once per
+        ticker when a strategy implements it.
+
+        cross_section is a utils/panel.CrossSection of every ticker on the date:
+        cross_section["Close"] is a read-only (tickers,) array in the order of
+        cross_section.tickers. Returns only the non-trivial orders, as a dict of
+        ticker -> Action (or (ticker, Action) pairs); the other tickers hold.
+        """
+
+        raise NotImplementedError
+
+    def next_event(self, date, cross_section, positions):
+        """
+        Optional event schedule. Called after the strategy acted on a bar; returns a
+        utils/events.Wake telling the engine when to call the strategy next, or None
+        for the next bar. The bars in between are skipped, so the strategy must not
+        want to act on them: get_action would return a no-op there.
+        """
+
+        raise NotImplementedError
+
+    def generate_signals(self, data: dict):
+        """
+        Optional vectorized form of the strategy, used by Backtest.run(mode="vectorized").
+
+        Gets a dict of ticker -> DataFrame on the aligned dates and returns the target
+        position size of every ticker on every date, either as a DataFrame with one
+        column per ticker or as a dict of ticker -> Series/array. The engine buys or
+        sells the difference to the target on each bar.
+        """
+
+        raise NotImplementedError
@@ -3,25 +3,50 @@ from dash import dcc, html, dash_table
 import plotly.express as px
 from dash.dependencies import Input, Output, State
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from backtest.utils.indicators import *
 from backtest.utils.performance import get_performance_metrics, calculate_metrics
+from backtest.utils.downsample import Downsampler
+import threading
 import time
+from plotly.io.json import to_json_plotly
 
 
 class Frontend:
     """
     Uses a Dash Server to visualize the backtest results in real-time.
+
+    Long series are downsampled to about `max_points` points per trace, and to
+    `point_budget` points over all the traces of the graph (None plots every bar);
+    zooming in plots the visible range at full resolution. Lines with more than
+    `webgl_threshold` points are drawn with WebGL (Scattergl). With show_timings the
+    time to build and serialize every graph update is shown below the graph; measuring
+    the serialization encodes every update a second time, so it is off by default.
     """
 
-    def __init__(self, backtest_instance=None):
+    def __init__(
+        self,
+        backtest_instance=None,
+        max_points=2000,
+        point_budget=20000,
+        webgl_threshold=1000,
+        show_timings=False,
+    ):
         self.backtest_instance = backtest_instance
+        self.downsampler = Downsampler(max_points)
+        self.point_budget = point_budget
+        self.webgl_threshold = webgl_threshold
+        self.show_timings = show_timings
         self.app = dash.Dash(__name__, suppress_callback_exceptions=False)
         self.app.title = "Backtest Dashboard"
         self.server_thread = None
         self.stocks = ["GOOG"]
         self.ta_indicator_info = []
+        # (run, price frames with the indicators computed for the dashboard), see price_data
+        self._price_data = None
+        self._price_lock = threading.Lock()
         self._setup_layout()
         self._setup_callbacks()
 
@@ -30,12 +55,22 @@ class Frontend:
         Initializes callback functions to update visualization based on user input.
         """
 
+        self.app.callback(
+            Output("snapshot-version", "data"),
+            Input("interval-update", "n_intervals"),
+            State("snapshot-version", "data"),
+        )(self.update_snapshot_version)
+
         self.app.callback(
             Output("main-graph", "figure"),
+            Output("graph-state", "data"),
+            Output("render-stats", "children"),
             Input("dropdown", "value"),
             Input("dropdown3", "value"),
             Input("dropdown4", "value"),
-            Input("interval-update", "n_intervals"),
+            Input("snapshot-version", "data"),
+            Input("main-graph", "relayoutData"),
+            State("graph-state", "data"),
         )(self.update_graph)
 
         self.app.callback(Output("dropdown", "options"), Input("stocks-store", "data"))(
@@ -53,7 +88,7 @@ class Frontend:
         )(self.update_ta_dropdown_options)
 
         self.app.callback(
-            Output("performance-table", "data"), Input("interval-update", "n_intervals")
+            Output("performance-table", "data"), Input("snapshot-version", "data")
         )(self.update_table)
 
     def _setup_layout(self):
@@ -65,6 +100,10 @@ class Frontend:
             [
                 html.H1("Stock Price Dashboard", className="header-title"),
                 dcc.Store(id="stocks-store", data=self.stocks),
+                # Version of the backtest snapshot the page shows, see update_snapshot_version
+                dcc.Store(id="snapshot-version", data=0),
+                # What the main graph shows, for appending to it (see update_graph)
+                dcc.Store(id="graph-state", data=None),
                 dcc.Interval(id="once-interval", interval=1000, max_intervals=1),
                 html.Div(
                     [
@@ -142,6 +181,7 @@ class Frontend:
                                             interval=500,  # in milliseconds
                                             n_intervals=0,
                                         ),
+                                        html.Div(id="render-stats", className="render-stats"),
                                     ],
                                     className="main-graph-container",
                                 ),
@@ -202,40 +242,183 @@ class Frontend:
             for ta_indicator in self.ta_indicator_info.keys()
         ] + [{"label": "None", "value": None}]
 
-    def update_table(self, n_intervals):
+    def update_snapshot_version(self, n_intervals, current_version):
+        """
+        Polls the backtest for a new snapshot on every interval update. The graph and
+        table only update when the version changes, otherwise nothing is sent.
+        """
+
+        if not self.backtest_instance:
+            return dash.no_update
+        version = self.backtest_instance.snapshots.version
+        if version == current_version:
+            return dash.no_update
+        return version
+
+    def update_table(self, version):
         """
         Update the performance table with the latest performance metrics.
-        This callback is triggered on every interval update.
+        This callback is triggered whenever a new backtest snapshot is published.
         """
 
-        if (
-            not self.backtest_instance
-            or self.backtest_instance.performance_history.empty
-        ):
+        snapshot = self.backtest_instance.snapshot if self.backtest_instance else None
+        if snapshot is None or snapshot.performance_history.empty:
             return []
 
-        row = self.backtest_instance.performance_history.iloc[-1].round(2)
-        data = [{"Metric": metric, "Value": row[metric]} for metric in row.index]
+        row = snapshot.performance_history.iloc[-1]
+        # Start / End / Duration are timestamps, only the numbers are rounded
+        data = [
+            {
+                "Metric": metric,
+                "Value": round(value, 2) if isinstance(value, (int, float)) else str(value),
+            }
+            for metric, value in row.items()
+        ]
         return data
 
     def update_graph(
-        self, selected_stocks, selected_graphs, selected_indicators, n_intervals
+        self,
+        selected_stocks,
+        selected_graphs,
+        selected_indicators,
+        version,
+        relayout_data,
+        graph_state,
     ):
         """
         Update the main graph based on user input.
-        This callback is triggered on every interval update
-        and whenever the user changes the dropdown values.
+        The figure is built once per selection (dropdown change or zoom). New
+        snapshots of the same selection only send the rows added since the last
+        update, see extend_graph.
         """
 
-        if not self.backtest_instance:
-            return go.Figure()
+        snapshot = self.backtest_instance.snapshot if self.backtest_instance else None
+        if snapshot is None:
+            return go.Figure(), None, None
 
-        self.stock_data = self.backtest_instance.data
-        self.action_data = self.backtest_instance.action_history
-        self.additional_data = self.backtest_instance.portfolio_history
-        self.performance_data = self.backtest_instance.performance_history
+        started = time.perf_counter()
+        window = self.zoom_window(
+            relayout_data, graph_state["selection"][3] if graph_state else None
+        )
+        selection = [selected_stocks, selected_graphs, selected_indicators, window]
+        if (
+            graph_state is not None
+            and graph_state["selection"] == selection
+            and graph_state["run"] == snapshot.run
+        ):
+            if graph_state["version"] == snapshot.version:
+                return dash.no_update, dash.no_update, dash.no_update
+            bars = graph_state["bars"]
+            patch = self.extend_graph(snapshot, graph_state)
+            if patch is not None:
+                stats = self.render_stats(
+                    f"Appended {graph_state['bars'] - bars} bars", patch, started
+                )
+                return patch, graph_state, stats
 
-        current_timestamp = self.performance_data.index[-1]
+        fig, traces, points, trace_points = self.build_graph(
+            snapshot, selected_stocks, selected_graphs, selected_indicators, window
+        )
+        histories = snapshot.histories
+        graph_state = {
+            "selection": selection,
+            "run": snapshot.run,
+            "version": snapshot.version,
+            "points": points,
+            "trace_points": trace_points,
+            "bars": max(len(histories["portfolio"]) - 1, 0),
+            "portfolio": len(histories["portfolio"]),
+            "actions": len(histories["action"]),
+            "traces": traces,
+        }
+        n_points = sum(len(trace.get("x", ())) for trace in fig["data"])
+        stats = self.render_stats(f"Built {n_points} points", fig, started)
+        return fig, graph_state, stats
+
+    def render_stats(self, update, figure, started):
+        """Text shown below the graph: what the update sent, build and serialization times."""
+
+        if not self.show_timings:
+            return None
+        built = time.perf_counter()
+        # The encoder dash uses, so this is the size and time of the response
+        size = len(to_json_plotly(figure))
+        serialized = time.perf_counter()
+        return (
+            f"{update} in {(built - started) * 1000:.0f} ms, "
+            f"{size / 1024:.0f} KB serialized in {(serialized - built) * 1000:.0f} ms"
+        )
+
+    def trace_points(self, n_traces):
+        """Points a series may have with n_traces in the graph, None for all of them."""
+
+        limits = [self.downsampler.max_points]
+        if self.point_budget is not None:
+            limits.append(self.point_budget // max(n_traces, 1))
+        limits = [limit for limit in limits if limit is not None]
+        return max(min(limits), 2) if limits else None
+
+    def _add_scatter(self, fig, row, col, **kwargs):
+        """fig.add_scatter, drawn with WebGL (Scattergl) above webgl_threshold points."""
+
+        if self.webgl_threshold is not None and len(kwargs["x"]) > self.webgl_threshold:
+            fig.add_trace(go.Scattergl(**kwargs), row=row, col=col)
+        else:
+            fig.add_scatter(row=row, col=col, **kwargs)
+
+    @staticmethod
+    def zoom_window(relayout_data, previous):
+        """
+        The x range ([start, end]) the user zoomed the graph to, None when it is
+        autoscaled, `previous` when the relayout event did not change the x range.
+        """
+
+        if not relayout_data:
+            return previous
+        for key, value in relayout_data.items():
+            if not key.startswith("xaxis"):
+                continue
+            if key.endswith(".autorange"):
+                return None
+            if key.endswith(".range[0]"):
+                return [value, relayout_data[key[: -len("[0]")] + "[1]"]]
+            if key.endswith(".range"):
+                return list(value)
+        return previous
+
+    @staticmethod
+    def window_rows(index, window) -> tuple:
+        """Rows of `index` inside the zoom window, one row beyond both sides to reach the edges."""
+
+        if window is None:
+            return 0, len(index)
+        start, end = (pd.Timestamp(value) for value in window)
+        if index.tz is not None and start.tz is None:
+            start, end = start.tz_localize(index.tz), end.tz_localize(index.tz)
+        lo = max(int(index.searchsorted(start)) - 1, 0)
+        hi = min(int(index.searchsorted(end, side="right")) + 1, len(index))
+        return lo, hi
+
+    def build_graph(
+        self, snapshot, selected_stocks, selected_graphs, selected_indicators, window=None
+    ):
+        """
+        Builds the full figure (as a dict) of a snapshot, restricted to the zoom
+        window, with every series downsampled to its share of the point budget
+        (trace_points). Returns it with the list of its traces' sources (one dict per
+        trace, in order), which extend_graph uses to append new rows to them, the
+        most points a series has and the points a series may have.
+        """
+
+        # One consistent snapshot, the backtest thread keeps running meanwhile
+        stock_data = self.price_data(snapshot, selected_indicators)
+        # Trades are read per ticker from the action log's index (TradeLogSnapshot)
+        action_data = snapshot.histories["action"]
+        additional_data = snapshot.portfolio_history
+
+        # Number of bars processed so far; the performance history may only be
+        # recorded every N bars, so count the portfolio rows instead.
+        current_timestamp = len(additional_data) - 1
 
         if isinstance(selected_stocks, str):
             selected_stocks = [selected_stocks]
@@ -269,16 +452,25 @@ class Frontend:
             row_heights=row_heights,
             specs=specs,
         )
+        traces = []
+        points = 0
+        downsampler = self.downsampler
+
+        # The point budget is shared by every series (not the sparse trade traces)
+        indicator_columns = sum(
+            len(columns)
+            for ta_indicator, (columns, _) in self.ta_indicator_info.items()
+            if selected_indicators is not None and ta_indicator in selected_indicators
+        )
+        n_series = len(selected_stocks) * (
+            sum(graph in selected_graphs for graph in ("line", "candlestick", "volume"))
+            + indicator_columns
+        ) + (0 if additional_data.empty else 4)
+        n_points = self.trace_points(n_series)
 
         for selected_stock in selected_stocks:
-            df_buys = self.action_data[
-                (self.action_data["Ticker"] == selected_stock)
-                & (self.action_data["Type"] == "buy")
-            ]
-            df_sells = self.action_data[
-                (self.action_data["Ticker"] == selected_stock)
-                & (self.action_data["Type"] == "sell")
-            ]
+            df_buys = action_data.trades(selected_stock, "buy")
+            df_sells = action_data.trades(selected_stock, "sell")
 
             fig.add_bar(
                 x=df_buys["Date"],
@@ -289,6 +481,9 @@ class Frontend:
                 col=1,
                 width=864000000,
             )
+            traces.append(
+                self._actions_trace(selected_stock, "buy", x="Date", y="Amount")
+            )
 
             fig.add_bar(
                 x=df_sells["Date"],
@@ -299,42 +494,65 @@ class Frontend:
                 col=1,
                 width=864000000,
             )
+            traces.append(
+                self._actions_trace(selected_stock, "sell", x="Date", y="Amount")
+            )
 
         # Adjust main price chart to start from row 2
         for selected_stock in selected_stocks:
-            df = self.stock_data[selected_stock].iloc[:current_timestamp]
+            df = stock_data[selected_stock].iloc[:current_timestamp]
+            lo, hi = self.window_rows(df.index, window)
+            df = df.iloc[lo:hi]
+            dates = self.plot_dates(df.index)
+            # The rows of a run never change, so (run, ticker, rows, field) keys a series
+            key = (snapshot.run, selected_stock, lo, hi)
+            points = max(points, min(len(df), n_points or len(df)))
 
             if "line" in selected_graphs:
-                fig.add_scatter(
-                    x=df.index,
-                    y=df["Close"],
+                x, y = downsampler.line(key + ("Close",), dates, df["Close"], n_points)
+                self._add_scatter(
+                    fig,
+                    x=x,
+                    y=y,
                     mode="lines",
                     name=f"{selected_stock} (Close)",
                     row=2,  # Updated row
                     col=1,
                 )
+                traces.append(self._price_trace(selected_stock, y="Close"))
 
             if "candlestick" in selected_graphs:
+                x, bars = downsampler.ohlcv(
+                    key + ("OHLC",),
+                    dates,
+                    {field: df[field] for field in ("Open", "High", "Low", "Close")},
+                    n_points,
+                )
                 fig.add_candlestick(
-                    x=df.index,
-                    open=df["Open"],
-                    high=df["High"],
-                    low=df["Low"],
-                    close=df["Close"],
+                    x=x,
+                    open=bars["Open"],
+                    high=bars["High"],
+                    low=bars["Low"],
+                    close=bars["Close"],
                     name=f"{selected_stock} (Candlestick)",
                     row=2,  # Updated row
                     col=1,
                 )
+                traces.append(
+                    self._price_trace(
+                        selected_stock, open="Open", high="High", low="Low", close="Close"
+                    )
+                )
 
             if "buy/sell" in selected_graphs:
-                actions_df = self.action_data[
-                    self.action_data["Ticker"] == selected_stock
-                ]
-
-                # Filter buy actions
-                buys = actions_df[actions_df["Type"] == "buy"]
+                # Buy actions
+                buys = action_data.trades(selected_stock, "buy")
+                buy_markers = self._actions_trace(
+                    selected_stock, "buy", x="Date", y="Price", text="Stop Loss"
+                )
                 if not buys.empty:
-                    fig.add_scatter(
+                    self._add_scatter(
+                        fig,
                         x=buys["Date"],
                         y=buys["Price"],
                         mode="markers",
@@ -345,11 +563,20 @@ class Frontend:
                         row=2,  # Updated row
                         col=1,
                     )
-
-                # Filter sell actions
-                sells = actions_df[actions_df["Type"] == "sell"]
+                    traces.append(buy_markers)
+                else:
+                    # No trace yet, the first buy needs a rebuild (see extend_graph)
+                    buy_markers["missing"] = True
+                    traces.append(buy_markers)
+
+                # Sell actions
+                sells = action_data.trades(selected_stock, "sell")
+                sell_markers = self._actions_trace(
+                    selected_stock, "sell", x="Date", y="Price", text="Stop Loss"
+                )
                 if not sells.empty:
-                    fig.add_scatter(
+                    self._add_scatter(
+                        fig,
                         x=sells["Date"],
                         y=sells["Price"],
                         mode="markers",
@@ -360,16 +587,24 @@ class Frontend:
                         row=2,  # Updated row
                         col=1,
                     )
+                    traces.append(sell_markers)
+                else:
+                    sell_markers["missing"] = True
+                    traces.append(sell_markers)
 
             if "volume" in selected_graphs:
-                max_volume = df["Volume"].max()
-                colors = [
-                    "green" if c >= o else "red"
-                    for c, o in zip(df["Close"], df["Open"])
-                ]
+                # Aggregated bars sum the volume of their bucket
+                x, bars = downsampler.ohlcv(
+                    key + ("Volume",),
+                    dates,
+                    {field: df[field] for field in ("Open", "Close", "Volume")},
+                    n_points,
+                )
+                max_volume = np.nanmax(bars["Volume"], initial=0.0)
+                colors = self.volume_colors(bars["Open"], bars["Close"])
                 fig.add_bar(
-                    x=df.index,
-                    y=df["Volume"],
+                    x=x,
+                    y=bars["Volume"],
                     name=f"{selected_stock} Volume",
                     opacity=0.9,
                     marker_color=colors,
@@ -377,6 +612,11 @@ class Frontend:
                     col=1,
                     secondary_y=True,
                 )
+                volume = self._price_trace(selected_stock, y="Volume")
+                volume["colors"] = True
+                volume["axis"] = "yaxis" + fig.data[-1].yaxis[1:]
+                volume["max"] = float(max_volume)
+                traces.append(volume)
                 fig.update_yaxes(
                     title_text="Volume",
                     secondary_y=True,
@@ -391,62 +631,60 @@ class Frontend:
                     if ta_indicator in selected_indicators:
                         if not self.ta_indicator_info[ta_indicator][1]:
                             for col in self.ta_indicator_info[ta_indicator][0]:
-                                fig.add_scatter(
-                                    x=df.index,
-                                    y=df[col],
+                                x, y = downsampler.line(
+                                    key + (col,), dates, df[col], n_points
+                                )
+                                self._add_scatter(
+                                    fig,
+                                    x=x,
+                                    y=y,
                                     mode="lines",
                                     name=f"{ta_indicator}",
                                     row=2,  # Updated row
                                     col=1,
                                 )
+                                traces.append(self._price_trace(selected_stock, y=col))
                         else:
                             for col in self.ta_indicator_info[ta_indicator][0]:
-                                fig.add_scatter(
-                                    x=df.index,
-                                    y=df[col],
+                                x, y = downsampler.line(
+                                    key + (col,), dates, df[col], n_points
+                                )
+                                self._add_scatter(
+                                    fig,
+                                    x=x,
+                                    y=y,
                                     mode="lines",
                                     name=f"{ta_indicator}",
                                     row=3,  # Updated row
                                     col=1,
                                 )
+                                traces.append(self._price_trace(selected_stock, y=col))
 
         # Determine the row for additional portfolio data
         additional_data_row = 4 if indicators_with_exgraph else 3
 
-        # Add portfolio data from self.additional_data
-        if not self.additional_data.empty:
-            fig.add_scatter(
-                x=self.additional_data.index,
-                y=self.additional_data["Capital"],
-                mode="lines",
-                name="Capital",
-                row=additional_data_row,
-                col=1,
-            )
-            fig.add_scatter(
-                x=self.additional_data.index,
-                y=self.additional_data["Cash"],
-                mode="lines",
-                name="Cash",
-                row=additional_data_row,
-                col=1,
-            )
-            fig.add_scatter(
-                x=self.additional_data.index,
-                y=self.additional_data["Equity"],
-                mode="lines",
-                name="Equity",
-                row=additional_data_row,
-                col=1,
-            )
-            fig.add_scatter(
-                x=self.additional_data.index,
-                y=self.additional_data["Portfolio Value"],
-                mode="lines",
-                name="Portfolio Value",
-                row=additional_data_row,
-                col=1,
-            )
+        # Add the portfolio history
+        if not additional_data.empty:
+            lo, hi = self.window_rows(additional_data.index, window)
+            portfolio = additional_data.iloc[lo:hi]
+            points = max(points, min(len(portfolio), n_points or len(portfolio)))
+            for column in ("Capital", "Cash", "Equity", "Portfolio Value"):
+                x, y = downsampler.line(
+                    (snapshot.run, "portfolio", lo, hi, column),
+                    self.plot_dates(portfolio.index),
+                    portfolio[column],
+                    n_points,
+                )
+                self._add_scatter(
+                    fig,
+                    x=x,
+                    y=y,
+                    mode="lines",
+                    name=column,
+                    row=additional_data_row,
+                    col=1,
+                )
+                traces.append({"source": "portfolio", "columns": {"x": None, "y": column}})
 
         # Update axis titles
         fig.update_yaxes(title_text="Price", secondary_y=False, row=2, col=1)
@@ -497,4 +735,139 @@ class Frontend:
             font=dict(size=12),
         )
 
-        return fig
+        # Plotly sends numeric arrays as binary, which a Patch can not extend, so the
+        # appended to ones are sent as lists
+        figure = fig.to_dict()
+        extendable = (trace for trace in traces if not trace.get("missing"))
+        for k, trace in enumerate(extendable):
+            for attribute in trace["columns"]:
+                values = fig.data[k][attribute]
+                if isinstance(values, np.ndarray):
+                    figure["data"][k][attribute] = values.tolist()
+
+        return figure, traces, points, n_points
+
+    def price_data(self, snapshot, selected_indicators=None) -> dict:
+        """
+        The snapshot's price frames with the columns of the selected indicators. The
+        ones the engine did not compute are computed here on copies (see
+        LazyIndicators.compute) the first time they are selected in a run; the
+        engine's frames are never written from a callback.
+        """
+
+        indicators = self.backtest_instance.indicators
+        with self._price_lock:
+            if self._price_data is None or self._price_data[0] != snapshot.run:
+                self._price_data = (snapshot.run, dict(snapshot.data))
+            data = self._price_data[1]
+            frame = next(iter(data.values()), None)
+            if not selected_indicators or indicators is None or frame is None:
+                return data
+            missing = [
+                name
+                for name in selected_indicators
+                if name in self.ta_indicator_info
+                and any(column not in frame.columns for column in self.ta_indicator_info[name][0])
+            ]
+            if missing:
+                data = indicators.compute(missing, data)
+                self._price_data = (snapshot.run, data)
+            return data
+
+    @staticmethod
+    def plot_dates(index):
+        """
+        The dates as plotted: plotly drops the UTC offset of tz-aware dates anyway,
+        and naive dates are a datetime64 array instead of one Timestamp object each.
+        """
+        return index.tz_localize(None) if getattr(index, "tz", None) is not None else index
+
+    @staticmethod
+    def volume_colors(open_, close) -> list:
+        """Green for bars closing at or above their open, red for the others."""
+        rising = np.asarray(close, dtype=np.float64) >= np.asarray(open_, dtype=np.float64)
+        return np.where(rising, "green", "red").tolist()
+
+    @staticmethod
+    def _price_trace(ticker, **columns) -> dict:
+        """Source of a trace plotting price data columns of a ticker over its dates."""
+        return {"source": "price", "ticker": ticker, "columns": dict(x=None, **columns)}
+
+    @staticmethod
+    def _actions_trace(ticker, action_type, text=None, **columns) -> dict:
+        """Source of a trace plotting the actions of one type of a ticker."""
+        return {
+            "source": "actions",
+            "ticker": ticker,
+            "type": action_type,
+            "columns": columns,
+            "text": text,
+        }
+
+    def extend_graph(self, snapshot, graph_state):
+        """
+        Appends the rows the snapshot added since graph_state was taken to the traces
+        of the figure, as a dash Patch: the payload and the work only depend on the
+        number of new rows. Updates graph_state in place. Returns None when the
+        figure needs a rebuild instead (a trace that did not exist yet, or more
+        points than the downsampling budget allows).
+        """
+
+        histories = snapshot.histories
+        bars = max(len(histories["portfolio"]) - 1, 0)
+        points = graph_state["points"] + len(histories["portfolio"]) - graph_state["portfolio"]
+        max_points = graph_state["trace_points"]
+        if max_points is not None and points > 2 * max_points:
+            # Downsampled again once as many bars were appended as a series may have
+            return None
+
+        # Only the new rows are converted to frames
+        portfolio = histories["portfolio"].to_frame(start=graph_state["portfolio"])
+        prices = {}
+
+        patch = dash.Patch()
+        k = -1  # Index of the trace in the figure, missing traces have none
+        for trace in graph_state["traces"]:
+            k += not trace.get("missing")
+            if trace["source"] == "portfolio":
+                rows = portfolio
+            elif trace["source"] == "actions":
+                rows = histories["action"].trades(
+                    trace["ticker"], trace["type"], start=graph_state["actions"]
+                )
+                if trace.get("missing"):
+                    if len(rows):
+                        return None
+                    continue
+            else:
+                ticker = trace["ticker"]
+                if ticker not in prices:
+                    data = self.price_data(snapshot, graph_state["selection"][2])
+                    prices[ticker] = data[ticker].iloc[graph_state["bars"] : bars]
+                rows = prices[ticker]
+            if rows.empty:
+                continue
+
+            for attribute, column in trace["columns"].items():
+                values = self.plot_dates(rows.index) if column is None else rows[column]
+                patch["data"][k][attribute].extend(values.tolist())
+            if trace.get("text"):
+                patch["data"][k]["text"].extend(
+                    [f"{trace['text']}: {value}" for value in rows[trace["text"]]]
+                )
+            if trace.get("colors"):
+                patch["data"][k]["marker"]["color"].extend(
+                    self.volume_colors(rows["Open"], rows["Close"])
+                )
+                # As in build_graph, the range of the last ticker's volume is kept
+                trace["max"] = float(max(trace["max"], rows["Volume"].max()))
+                patch["layout"][trace["axis"]]["range"] = [0, trace["max"] * 3]
+
+        graph_state.update(
+            version=snapshot.version,
+            points=points,
+            bars=bars,
+            portfolio=len(histories["portfolio"]),
+            actions=len(histories["action"]),
+        )
+        return patch
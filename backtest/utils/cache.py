@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+
+class OHLCVCache:
+    """
+    On-disk Parquet cache of OHLCV frames, one file per (ticker, interval).
+
+    An index file keeps, for every entry, its size, when it was last fetched from
+    the provider, the earliest start date requested so far and when it was last
+    read. The least recently read entries are evicted once the cache grows past
+    `max_bytes`. Entries older than `max_age` are dropped and fetched again in full;
+    entries fetched within `refresh_after` are served without any network call.
+
+    Reads only update the access times in memory; the index is written when entries
+    are stored or removed, and on flush() / close() (DataRetriever.get_data flushes
+    once per call). Writes merge the index with the one on disk, so processes sharing
+    the directory (e.g. optimize() workers) keep each other's entries. Two writes
+    racing each other can still drop the other one's latest changes, which at worst
+    costs a download again.
+
+    Parquet support needs pyarrow (pip install pybacktest[cache]).
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(
+        self,
+        directory="~/.cache/pybacktest",
+        max_bytes=1024**3,
+        max_age=None,
+        refresh_after=pd.Timedelta(hours=12),
+    ):
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.max_age = pd.Timedelta(max_age) if max_age is not None else None
+        self.refresh_after = (
+            pd.Timedelta(refresh_after) if refresh_after is not None else None
+        )
+        self._lock = threading.Lock()
+        self._dirty = False  # Access times changed since the index was written
+        self._removed = {}  # Key -> time, entries removed since the index was written
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._index = self._read_index()
+
+    @staticmethod
+    def key(ticker, interval) -> str:
+        return f"{ticker}_{interval}".replace("/", "-").replace("^", "IDX-")
+
+    def path(self, ticker, interval) -> str:
+        return os.path.join(self.directory, self.key(ticker, interval) + ".parquet")
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, self.INDEX_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _tmp_path(path) -> str:
+        # A temporary file per process and thread, so concurrent writers never share one
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _merge_index(self):
+        """Adds the entries other processes wrote to the index file since it was read."""
+
+        for key, entry in self._read_index().items():
+            mine = self._index.get(key)
+            if mine is None:
+                # Stored elsewhere, unless removed here and not stored again since
+                if entry["fetched"] > self._removed.get(key, -1) and os.path.exists(
+                    os.path.join(self.directory, key + ".parquet")
+                ):
+                    self._index[key] = entry
+            elif entry["fetched"] > mine["fetched"]:
+                entry["accessed"] = max(entry["accessed"], mine["accessed"])
+                self._index[key] = entry
+            else:
+                mine["accessed"] = max(mine["accessed"], entry["accessed"])
+        self._removed = {}
+
+    def _write_index(self):
+        self._merge_index()
+        self._evict()
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        tmp = self._tmp_path(path)
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, path)
+        self._dirty = False
+
+    def flush(self):
+        """Writes the access times of the entries read since the index was last written."""
+        with self._lock:
+            if self._dirty:
+                self._write_index()
+
+    def close(self):
+        self.flush()
+
+    def entry(self, ticker, interval) -> dict:
+        """Returns the index entry of a cached frame, or None."""
+        with self._lock:
+            entry = self._index.get(self.key(ticker, interval))
+            return dict(entry) if entry is not None else None
+
+    def is_expired(self, ticker, interval) -> bool:
+        """True if the entry is older than max_age and has to be fetched again in full."""
+        entry = self.entry(ticker, interval)
+        if entry is None:
+            return True
+        if self.max_age is None:
+            return False
+        return time.time() - entry["created"] > self.max_age.total_seconds()
+
+    def is_fresh(self, ticker, interval) -> bool:
+        """True if the entry was fetched within refresh_after and needs no update."""
+        entry = self.entry(ticker, interval)
+        if entry is None or self.refresh_after is None:
+            return False
+        return time.time() - entry["fetched"] <= self.refresh_after.total_seconds()
+
+    def load(self, ticker, interval) -> pd.DataFrame:
+        """Reads a cached frame, or returns None if there is none (or it expired)."""
+
+        key = self.key(ticker, interval)
+        if key not in self._index:
+            return None
+        if self.is_expired(ticker, interval):
+            self.invalidate(ticker, interval)
+            return None
+        try:
+            data = pd.read_parquet(self.path(ticker, interval))
+        except FileNotFoundError:
+            self.invalidate(ticker, interval)
+            return None
+
+        with self._lock:
+            if key in self._index:
+                self._index[key]["accessed"] = time.time()
+                self._dirty = True
+        return data
+
+    def store(self, ticker, interval, data: pd.DataFrame, start=None, full=False):
+        """
+        Writes a frame to the cache. `start` is the start date that was requested from
+        the provider, kept so later runs know how far back the entry reaches.
+        full=True marks a fresh download, which resets the entry's age.
+        """
+
+        path = self.path(ticker, interval)
+        tmp = self._tmp_path(path)
+        data.to_parquet(tmp)
+        os.replace(tmp, path)
+
+        key = self.key(ticker, interval)
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key, {})
+            if full or "created" not in entry:
+                entry["created"] = now
+            if start is not None:
+                start = str(pd.Timestamp(start))
+                previous = entry.get("start")
+                if full or previous is None or pd.Timestamp(start) < pd.Timestamp(previous):
+                    entry["start"] = start
+            entry.update(
+                size=os.path.getsize(path),
+                fetched=now,
+                accessed=now,
+            )
+            self._index[key] = entry
+            self._write_index()
+
+    def covers_start(self, ticker, interval, start) -> bool:
+        """True if the entry was fetched from `start` or earlier."""
+        entry = self.entry(ticker, interval)
+        if entry is None or entry.get("start") is None:
+            return False
+        return pd.Timestamp(entry["start"]) <= pd.Timestamp(start)
+
+    def invalidate(self, ticker=None, interval=None):
+        """Drops matching entries; invalidate() with no arguments clears the cache."""
+
+        with self._lock:
+            for key in list(self._index):
+                if ticker is not None and interval is not None:
+                    if key != self.key(ticker, interval):
+                        continue
+                elif ticker is not None and not key.startswith(self.key(ticker, "")):
+                    continue
+                elif interval is not None and not key.endswith("_" + interval):
+                    continue
+                self._remove(key)
+            self._write_index()
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._index.values())
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        self._removed[key] = time.time()
+        try:
+            os.remove(os.path.join(self.directory, key + ".parquet"))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Removes the least recently read entries until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        total = sum(entry["size"] for entry in self._index.values())
+        for key in sorted(self._index, key=lambda key: self._index[key]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            total -= self._index[key]["size"]
+            self._remove(key)
@@ -1,8 +1,15 @@
-import yfinance as yf
 import pandas as pd
 import pandas_datareader.data as web
 
 from typing import Union, List
+from concurrent.futures import ThreadPoolExecutor
+
+from backtest.utils.cache import OHLCVCache
+from backtest.utils.providers import YFinanceProvider
+from backtest.utils.scheduler import RequestScheduler, CircuitOpenError
+
+
+REQUIRED_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
 
 
 class DataRetriever:
@@ -12,6 +19,13 @@ class DataRetriever:
         start_date=None,
         end_date=None,
         interval="1h",
+        cache=None,
+        offline=False,
+        provider=None,
+        max_workers=8,
+        timeout=30,
+        batch_size=50,
+        scheduler=None,
     ):
 
         self.duration = duration
@@ -19,6 +33,24 @@ class DataRetriever:
         self.end_date = end_date
         self.interval = interval
 
+        # Local OHLCV cache: an OHLCVCache, a cache directory, or None to always download
+        if isinstance(cache, str):
+            cache = OHLCVCache(cache)
+        self.cache = cache
+        self.offline = offline  # Only use the cache, never touch the network
+
+        if self.offline and self.cache is None:
+            raise ValueError("Offline mode needs a cache")
+
+        # Where the bars come from, anything with the YFinanceProvider interface
+        self.provider = provider if provider is not None else YFinanceProvider()
+        self.max_workers = max_workers  # Concurrent downloads
+        self.timeout = timeout  # Seconds per request
+        self.batch_size = batch_size  # Tickers per batch request, None to disable batching
+        # Rate limiting, retries and circuit breaker for all provider requests
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.failed_tickers = {}  # Ticker -> reason, for tickers skipped in the last get_data
+
         if (
             self.duration is not None
             and self.start_date is None
@@ -50,23 +82,29 @@ class DataRetriever:
         SP500=True,
     ):
 
-        data = {}
-
         if sector is not None:
-            tickers = self.get_sector_tickers(self.sector)
-        elif ticker is not None and type(ticker) == list:
-            tickers = ticker
-        elif ticker is not None and type(ticker) == str:
+            tickers = self.get_sector_tickers(sector)
+        elif isinstance(ticker, str):
             tickers = [ticker]
-        elif SP500 is not None:
+        else:
+            # A local list, the caller's is not modified
+            tickers = list(ticker or [])
+
+        if not tickers:
+            if not SP500:
+                raise ValueError("Please provide either ticker or sector")
+            # Without tickers only the S&P 500 benchmark is loaded
             tickers.append("^GSPC")
 
-        else:
-            raise ValueError("Please provide either ticker or sector")
+        self.scheduler.reset()
+        self.failed_tickers = {}
 
-        for ticker in tickers:
-            ticker_data = self.get_ticker_data(ticker)
-            data[ticker] = ticker_data
+        data = self.fetch_tickers(tickers)
+        data = self.check_complete(tickers, data)
+        self.report()
+        if self.cache is not None:
+            # The access times of the entries read, for the cache's eviction order
+            self.cache.flush()
 
         latest_start = max(df.index[0] for df in data.values())
         aligned_data = {
@@ -80,6 +118,116 @@ class DataRetriever:
 
         return aligned_data
 
+    def fetch_tickers(self, tickers) -> dict:
+        """
+        Fetches all tickers concurrently. Tickers that need a full download are first
+        requested through the provider's batch endpoint; the rest (cache hits, incremental
+        updates, and whatever the batch did not return) go through get_ticker_data on a
+        thread pool of max_workers.
+        """
+
+        tickers = list(dict.fromkeys(tickers))
+        data = {}
+
+        if self.batch_size and getattr(self.provider, "supports_batch", False):
+            full = [ticker for ticker in tickers if self.needs_download(ticker)]
+            if len(full) > 1:
+                chunks = [
+                    full[i : i + self.batch_size]
+                    for i in range(0, len(full), self.batch_size)
+                ]
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    for batch in pool.map(self.download_batch, chunks):
+                        data.update(batch)
+
+        pending = [ticker for ticker in tickers if ticker not in data]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for ticker, ticker_data in zip(pending, pool.map(self.try_ticker_data, pending)):
+                if ticker_data is not None:
+                    data[ticker] = ticker_data
+
+        return {ticker: data[ticker] for ticker in tickers if ticker in data}
+
+    def try_ticker_data(self, id) -> pd.DataFrame:
+        """get_ticker_data, but failures are recorded in failed_tickers and give None."""
+
+        try:
+            return self.get_ticker_data(id)
+        except Exception as e:
+            self.failed_tickers[id] = f"{type(e).__name__}: {e}"
+            return None
+
+    def needs_download(self, id) -> bool:
+        """True if the ticker can not be served (even partly) from the cache."""
+
+        if self.offline:
+            return False
+        if self.cache is None:
+            return True
+        return self.cache.is_expired(id, self.interval) or not self.cache.covers_start(
+            id, self.interval, self.start_date
+        )
+
+    def download_batch(self, tickers) -> dict:
+        """Downloads tickers with one batch request and caches them. Failed batches return {}."""
+
+        try:
+            data = self.scheduler.call(
+                self.provider.download,
+                tickers,
+                start=self.start_date,
+                end=self.end_date,
+                interval=self.interval,
+                timeout=self.timeout,
+            )
+        except Exception as e:
+            print(f"Batch download failed ({e}), fetching tickers one by one")
+            return {}
+
+        data = {ticker: df for ticker, df in data.items() if not df.empty}
+        if self.cache is not None:
+            for ticker, df in data.items():
+                self.cache.store(ticker, self.interval, df, start=self.start_date, full=True)
+        return data
+
+    def check_complete(self, tickers, data: dict) -> dict:
+        """
+        Keeps the tickers that were fetched with the OHLCV columns, so they can be aligned.
+        The others are added to failed_tickers.
+        """
+
+        complete = {}
+        for ticker in tickers:
+            if ticker in self.failed_tickers:
+                continue
+            if ticker not in data or data[ticker] is None or data[ticker].empty:
+                self.failed_tickers[ticker] = "no data"
+            elif any(column not in data[ticker].columns for column in REQUIRED_COLUMNS):
+                self.failed_tickers[ticker] = "missing OHLCV columns"
+            else:
+                complete[ticker] = data[ticker]
+
+        if not complete:
+            raise ValueError(
+                f"No data for any ticker: {', '.join(f'{t} ({r})' for t, r in self.failed_tickers.items())}"
+            )
+        return complete
+
+    def report(self):
+        """Prints the skipped tickers and how long requests spent waiting versus downloading."""
+
+        for ticker, reason in self.failed_tickers.items():
+            print(f"Skipping {ticker}: {reason}")
+
+        stats = self.scheduler.stats()
+        if stats["requests"]:
+            print(
+                f"{stats['requests']} requests ({stats['retries']} retries, {stats['failures']} failed): "
+                f"{stats['download_time']:.2f}s downloading, "
+                f"{stats['rate_limit_wait']:.2f}s rate limited, "
+                f"{stats['backoff_wait']:.2f}s backing off"
+            )
+
     def get_sector_tickers(self, sector):
 
         url = f"https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
@@ -88,21 +236,83 @@ class DataRetriever:
         return sector_tickers
 
     def get_ticker_data(self, id) -> pd.DataFrame:
-        ticker = yf.Ticker(id)
-        data = pd.DataFrame()
+        if self.cache is None:
+            return self.download_ticker_data(id)
+
+        cached = self.cache.load(id, self.interval)
+        if cached is not None and (
+            self.offline or self.cache.covers_start(id, self.interval, self.start_date)
+        ):
+            if self.offline or self.cache.is_fresh(id, self.interval):
+                return self.slice_dates(cached)
+
+            # Only fetch the bars after the last cached one. The last bar is fetched again
+            # since it may have been incomplete when it was cached.
+            start = self.naive(cached.index[-1])
+            try:
+                update = self.download_ticker_data(id, start=start)
+            except Exception as e:
+                print(f"Could not update {id} ({e}), using the cached data")
+                return self.slice_dates(cached)
+            if not update.empty:
+                cached = pd.concat([cached[cached.index < update.index[0]], update])
+            self.cache.store(id, self.interval, cached, start=self.start_date)
+            return self.slice_dates(cached)
+
+        if self.offline:
+            raise ValueError(f"{id} ({self.interval}) is not cached and offline mode is on")
+
+        data = self.download_ticker_data(id)
+        if not data.empty:
+            self.cache.store(id, self.interval, data, start=self.start_date, full=True)
+        return data
+
+    @staticmethod
+    def naive(timestamp) -> pd.Timestamp:
+        timestamp = pd.Timestamp(timestamp)
+        return timestamp.tz_localize(None) if timestamp.tzinfo is not None else timestamp
+
+    def slice_dates(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Restricts a cached frame to [start_date, end_date), like a download would be."""
+
+        index = data.index
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        mask = (index >= self.naive(self.start_date)) & (index < self.naive(self.end_date))
+        return data[mask]
+
+    def download_ticker_data(self, id, start=None) -> pd.DataFrame:
+        """
+        Downloads a ticker from `start` (default start_date) through the scheduler.
+        If a full download fails, the whole available history is tried once instead.
+        Raises if there is still no data; an incremental update (start given) may be empty.
+        """
+
         try:
-            data = ticker.history(
-                start=self.start_date,
+            data = self.scheduler.call(
+                self.provider.history,
+                id,
+                start=start if start is not None else self.start_date,
                 end=self.end_date,
                 interval=self.interval,
-                raise_errors=True,
+                timeout=self.timeout,
             )
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            print("Set Duration to Max")
-            while data.empty:
-                print("Trying Again")
-                data = ticker.history(period="max", interval=self.interval)
+            if start is not None:
+                raise
+            print(f"{id}: {e}. Set Duration to Max")
+            data = self.scheduler.call(
+                self.provider.history,
+                id,
+                period="max",
+                interval=self.interval,
+                timeout=self.timeout,
+            )
 
+        if data.empty and start is None:
+            raise ValueError(f"No data returned for {id}")
         return data
 
     def get_risk_free(
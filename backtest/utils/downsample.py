@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def bucket_edges(n, n_buckets) -> np.ndarray:
+    """Start rows of n_buckets (almost) equal buckets over n rows, plus n at the end."""
+    return np.unique(np.linspace(0, n, min(n_buckets, n) + 1).astype(np.intp))
+
+
+def lttb(x, y, n_out) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: the rows of the n_out points that keep the
+    visual shape of the line (x, y). The first and last points are kept, every
+    bucket in between keeps the point forming the largest triangle with the point
+    kept before it and the average of the next bucket. Returns all rows if the
+    line has at most n_out points. NaNs in y are skipped.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    rows = np.flatnonzero(~np.isnan(y))
+    if len(rows) <= max(n_out, 2):
+        return rows
+    x, y = x[rows], y[rows]
+    n = len(rows)
+
+    # n_out - 2 buckets between the first and the last point
+    edges = bucket_edges(n - 2, n_out - 2) + 1
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+    # The point after the last bucket is the last point
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(len(counts) + 2, dtype=np.intp)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(len(counts)):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs(
+            (x[a] - mean_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[b] - y[a])
+        )
+        a = lo + int(area.argmax())
+        keep[b + 1] = a
+    return rows[keep]
+
+
+def aggregate_ohlcv(n_out, open_=None, high=None, low=None, close=None, volume=None) -> tuple:
+    """
+    Aggregates bars into at most n_out buckets of consecutive bars: first open,
+    highest high, lowest low, last close and summed volume (NaNs ignored). Returns
+    (start row of every bucket, dict of the aggregated columns given).
+    """
+
+    columns = {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}
+    columns = {
+        name: np.asarray(values, dtype=np.float64)
+        for name, values in columns.items()
+        if values is not None
+    }
+    n = len(next(iter(columns.values())))
+    edges = bucket_edges(n, n_out)
+    starts = edges[:-1]
+    if len(starts) == n:
+        return starts, columns
+
+    aggregated = {}
+    for name, values in columns.items():
+        if name == "Open":
+            aggregated[name] = values[starts]
+        elif name == "High":
+            aggregated[name] = np.fmax.reduceat(values, starts)
+        elif name == "Low":
+            aggregated[name] = np.fmin.reduceat(values, starts)
+        elif name == "Close":
+            aggregated[name] = values[edges[1:] - 1]
+        else:
+            aggregated[name] = np.add.reduceat(np.nan_to_num(values), starts)
+    return starts, aggregated
+
+
+class Downsampler:
+    """
+    Reduces the series the frontend plots to about `max_points` points: lines with
+    LTTB, candles and volume by OHLCV aggregation. Results are cached in an LRU of
+    `cache_size` entries keyed by the caller's key, e.g. (ticker, field, first row,
+    last row): the rows of a run's history never change once recorded.
+    """
+
+    def __init__(self, max_points=2000, cache_size=256):
+        self.max_points = max_points
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()  # Dash may run callbacks in several threads
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = compute()
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def line(self, key, x, y, n_points=None) -> tuple:
+        """(x, y) of the line, reduced with LTTB if it is longer than n_points (max_points)."""
+        n_points = n_points or self.max_points
+        if n_points is None or len(y) <= n_points:
+            return x, y
+        y = np.asarray(y)
+        # Dates (a DatetimeIndex, also tz-aware) as nanoseconds
+        numeric_x = x.asi8 if hasattr(x, "asi8") else np.asarray(x)
+
+        def compute():
+            rows = lttb(numeric_x, y, n_points)
+            return x[rows], y[rows]
+
+        return self._cached(("line", n_points) + tuple(key), compute)
+
+    def ohlcv(self, key, x, columns: dict, n_points=None) -> tuple:
+        """(x, columns) of bars aggregated into at most n_points (max_points) buckets."""
+        n_points = n_points or self.max_points
+        if n_points is None or len(x) <= n_points:
+            return x, columns
+
+        def compute():
+            starts, aggregated = aggregate_ohlcv(
+                n_points,
+                *(columns.get(name) for name in ("Open", "High", "Low", "Close", "Volume")),
+            )
+            return x[starts], aggregated
+
+        return self._cached(("ohlcv", n_points) + tuple(key), compute)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
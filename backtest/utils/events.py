@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class Cross:
+    """
+    Wake condition: `field` of `ticker` crossing `other` (another field of the ticker
+    or a number). direction="up" fires on the first bar where field > other after a
+    bar where it was not, "down" on the opposite change, "both" on either. A NaN on
+    either side counts as not above.
+    """
+
+    DIRECTIONS = ("up", "down", "both")
+
+    def __init__(self, ticker, field, other, direction="both"):
+        if direction not in self.DIRECTIONS:
+            raise ValueError(f"Unknown direction {direction}, use one of {', '.join(self.DIRECTIONS)}")
+        self.ticker = ticker
+        self.field = field
+        self.other = other
+        self.direction = direction
+
+    def __repr__(self):
+        return f"Cross({self.ticker}, {self.field}, {self.other}, {self.direction})"
+
+
+class Wake:
+    """
+    When an event driven strategy (Strategy.next_event) needs to be called again: at
+    the first bar on or after `date`, or on the first bar where one of the Cross
+    `conditions` fires, whichever comes first. Stop loss triggers always wake the
+    strategy. Wake() sleeps until the next stop loss or the end of the data.
+    """
+
+    def __init__(self, date=None, conditions=()):
+        self.date = date
+        self.conditions = list(conditions)
+
+    def __repr__(self):
+        return f"Wake({self.date}, {self.conditions})"
+
+
+class EventSchedule:
+    """
+    Finds the next bar on which something can happen in an event driven run: the
+    strategy's Wake, or a stop loss trigger (utils/stops.StopBook).
+
+    The bars after the current one are searched with array operations in chunks
+    that double in size, so finding an event n bars ahead costs O(n) vectorized
+    work and no Python per bar.
+    """
+
+    def __init__(self, panel, first_chunk=64):
+        self.panel = panel
+        self.first_chunk = first_chunk
+
+    def _series(self, ticker, field):
+        return self.panel.values[:, self.panel.ticker_index[ticker], self.panel.field_index[field]]
+
+    def next_event(self, i, wake: Wake, stops) -> int:
+        """The first bar after i with an event, len(panel) if there is none."""
+
+        end = len(self.panel)
+        if wake.date is not None:
+            end = min(end, max(int(self.panel.dates.searchsorted(wake.date)), i + 1))
+        end = stops.first_trigger(i + 1, end)
+
+        conditions = [
+            (
+                self._series(condition.ticker, condition.field),
+                self._series(condition.ticker, condition.other)
+                if isinstance(condition.other, str)
+                else condition.other,
+                condition.direction,
+            )
+            for condition in wake.conditions
+        ]
+        start, size = i + 1, self.first_chunk
+        while conditions and start < end:
+            stop = found = min(start + size, end)
+            for series, other, direction in conditions:
+                # Compare from the bar before the chunk to see changes at its first bar
+                other = other[start - 1 : found] if isinstance(other, np.ndarray) else other
+                with np.errstate(invalid="ignore"):
+                    above = series[start - 1 : found] > other
+                if direction == "up":
+                    changes = above[1:] & ~above[:-1]
+                elif direction == "down":
+                    changes = ~above[1:] & above[:-1]
+                else:
+                    changes = above[1:] != above[:-1]
+                if changes.any():
+                    found = start + int(changes.argmax())
+            if found < stop:
+                return found
+            start, size = stop, size * 2
+        return end
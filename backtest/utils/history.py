@@ -0,0 +1,232 @@
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+
+DATE = "date"
+
+
+class HistoryRecorder:
+    """
+    Append-only columnar buffer used for the backtest histories.
+
+    Rows are written into preallocated NumPy arrays that grow geometrically when
+    they run full, so recording a row is amortised O(1) instead of copying the
+    whole history like a per-row pd.concat. A DataFrame is only built when
+    to_frame() is called (end of the run or a frontend snapshot).
+
+    Columns declared with the dtype "date" store integer positions into the
+    `dates` index, which keeps the buffers numeric and avoids boxing a
+    Timestamp per row.
+    """
+
+    def __init__(self, columns: dict, index=None, dates=None, capacity=1024, growth=2.0):
+        self.dtypes = dict(columns)
+        self.index = index
+        self.dates = dates
+        self.growth = growth
+        self._size = 0
+        self._columns = {
+            name: np.empty(max(int(capacity), 1), dtype=self._storage_dtype(dtype))
+            for name, dtype in self.dtypes.items()
+        }
+
+    @staticmethod
+    def _storage_dtype(dtype):
+        return np.int64 if dtype == DATE else dtype
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(next(iter(self._columns.values())))
+
+    def reserve(self, capacity):
+        """Makes sure at least `capacity` rows fit without reallocating."""
+        if capacity <= self.capacity:
+            return
+        columns = {}
+        for name, values in self._columns.items():
+            grown = np.empty(int(capacity), dtype=values.dtype)
+            grown[: self._size] = values[: self._size]
+            columns[name] = grown
+        # Swap in one step so readers never see a half-grown set of columns.
+        self._columns = columns
+
+    def append(self, *values):
+        """Appends one row, values given in column order."""
+        size = self._size
+        if size == self.capacity:
+            self.reserve(max(size + 1, int(size * self.growth)))
+        for column, value in zip(self._columns.values(), values):
+            column[size] = value
+        self._size = size + 1
+
+    def extend(self, columns: dict):
+        """
+        Appends many rows at once, given as a mapping of column name to array.
+        Scalars are broadcast over all new rows.
+        """
+        columns = {name: np.asarray(values) for name, values in columns.items()}
+        n = max((len(values) for values in columns.values() if values.ndim), default=0)
+        size = self._size
+        if size + n > self.capacity:
+            self.reserve(max(size + n, int(size * self.growth)))
+        for name, column in self._columns.items():
+            column[size : size + n] = columns[name]
+        self._size = size + n
+
+    def extend_values(self, n, *values):
+        """
+        Appends n rows given in column order as arrays of length n or scalars, without
+        the conversions of extend(), for hot loops.
+        """
+        size = self._size
+        if size + n > self.capacity:
+            self.reserve(max(size + n, int(size * self.growth)))
+        for column, value in zip(self._columns.values(), values):
+            column[size : size + n] = value
+        self._size = size + n
+
+    def append_row(self, row: dict):
+        """Appends one row given as a mapping of column name to value."""
+        self.append(*(row[name] for name in self._columns))
+
+    def column(self, name) -> np.ndarray:
+        """Returns a view over the recorded part of a single column."""
+        size = self._size
+        return self._columns[name][:size]
+
+    def clear(self):
+        # Fresh arrays, the rows of earlier snapshots must not be written again
+        self._columns = {name: np.empty_like(values) for name, values in self._columns.items()}
+        self._size = 0
+
+    def snapshot(self) -> "HistorySnapshot":
+        """
+        Read-only view of the rows recorded so far, in O(1): recorded rows are never
+        written again and growing swaps in new arrays, so the view stays valid while
+        the recorder keeps appending.
+        """
+        return HistorySnapshot(self._columns, self._size, self.dtypes, self.index, self.dates)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Builds a DataFrame from the rows recorded so far."""
+        return self.snapshot().to_frame()
+
+
+class HistorySnapshot:
+    """The first `size` rows of a HistoryRecorder's columns, frozen at snapshot time."""
+
+    def __init__(self, columns: dict, size, dtypes, index=None, dates=None):
+        self._columns = columns
+        self._size = size
+        self.dtypes = dtypes
+        self.index = index
+        self.dates = dates
+
+    def __len__(self):
+        return self._size
+
+    def column(self, name) -> np.ndarray:
+        """Returns a read-only view of a single column."""
+        values = self._columns[name][: self._size]
+        values.flags.writeable = False
+        return values
+
+    def to_frame(self, start=0, rows=None) -> pd.DataFrame:
+        """
+        Builds a DataFrame from the rows of the snapshot, from row `start` on, or from
+        the given `rows` (row numbers below len(self)).
+        """
+        size = self._size
+        columns = self._columns
+        frame = {}
+        for name, dtype in self.dtypes.items():
+            values = columns[name][start:size] if rows is None else columns[name][rows]
+            if dtype == DATE:
+                frame[name] = (
+                    self.dates.take(values) if self.dates is not None else values.copy()
+                )
+            else:
+                frame[name] = values.copy()
+
+        df = pd.DataFrame(frame, columns=list(self.dtypes))
+        if self.index is not None:
+            df = df.set_index(self.index)
+        return df
+
+
+class TradeLog(HistoryRecorder):
+    """
+    Action HistoryRecorder that also indexes its trades: for every (ticker, type)
+    in `trade_types`, the increasing numbers of the rows recorded with them. The
+    trades of one ticker are then read in O(its trades) (see TradeLogSnapshot.trades)
+    instead of scanning the whole log. The `ticker` and `type` columns name the
+    columns the index reads. Rows recorded with filled=False (orders that were not
+    executed, e.g. buys without enough cash) stay in the log but out of the index.
+    """
+
+    def __init__(
+        self, columns: dict, ticker="Ticker", type="Type", trade_types=("buy", "sell"), **kwargs
+    ):
+        super().__init__(columns, **kwargs)
+        self.ticker_column = ticker
+        self.type_column = type
+        self.trade_types = tuple(trade_types)
+        self._positions = (list(self.dtypes).index(ticker), list(self.dtypes).index(type))
+        self._trades = {}  # (ticker, type) -> row numbers, only ever appended to
+
+    def append(self, *values, filled=True):
+        row = self._size
+        super().append(*values)
+        ticker, type_ = values[self._positions[0]], values[self._positions[1]]
+        if filled and type_ in self.trade_types:
+            self._trades.setdefault((ticker, type_), []).append(row)
+
+    def extend(self, columns: dict, filled=True):
+        start = self._size
+        super().extend(columns)
+        self._index_rows(start, filled)
+
+    def extend_values(self, n, *values, filled=True):
+        start = self._size
+        super().extend_values(n, *values)
+        self._index_rows(start, filled)
+
+    def _index_rows(self, start, filled=True):
+        """Adds the trades among the rows from `start` on to the index, where `filled` (bool or mask)."""
+        tickers = self._columns[self.ticker_column][start : self._size]
+        types = self._columns[self.type_column][start : self._size]
+        for row in np.flatnonzero(np.isin(types, self.trade_types) & filled):
+            self._trades.setdefault((tickers[row], types[row]), []).append(start + int(row))
+
+    def clear(self):
+        super().clear()
+        self._trades = {}
+
+    def snapshot(self) -> "TradeLogSnapshot":
+        # The lengths are taken now, the lists keep growing behind the snapshot
+        trades = {key: (rows, len(rows)) for key, rows in list(self._trades.items())}
+        return TradeLogSnapshot(
+            self._columns, self._size, self.dtypes, self.index, self.dates, trades
+        )
+
+
+class TradeLogSnapshot(HistorySnapshot):
+    """HistorySnapshot of a TradeLog, with its trade index as of snapshot time."""
+
+    def __init__(self, columns: dict, size, dtypes, index=None, dates=None, trades=None):
+        super().__init__(columns, size, dtypes, index, dates)
+        self._trades = trades or {}
+
+    def trade_rows(self, ticker, type, start=0) -> np.ndarray:
+        """Numbers of the rows recorded for `ticker` with `type`, from row `start` on."""
+        rows, length = self._trades.get((ticker, type), ((), 0))
+        return np.asarray(rows[bisect_left(rows, start, 0, length) : length], dtype=np.intp)
+
+    def trades(self, ticker, type, start=0) -> pd.DataFrame:
+        """The rows of the trades of `ticker` with `type` (from row `start` on) as a DataFrame."""
+        return self.to_frame(rows=self.trade_rows(ticker, type, start))
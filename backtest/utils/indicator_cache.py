@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from backtest.utils.indicator_graph import IndicatorGraph
+from backtest.utils.indicator_pool import apply_indicators
+
+
+FINGERPRINT_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class IndicatorCache:
+    """
+    Memoizes indicator columns by (indicator class, parameters, fingerprint of the
+    input OHLCV bars).
+
+    Results are kept in an in-memory LRU of up to `max_bytes` and, with a
+    `directory`, also written to disk (one .npz per entry, never evicted). For every
+    (indicator, ticker) the cache also remembers the last input it saw; when the same
+    bars come back with new bars appended, only the tail is computed, starting
+    `indicator.lookback` bars before the first new one. Indicators without a
+    lookback are computed in full.
+
+    stats() returns the hit / tail hit / miss counters. Share one instance between
+    runs to reuse results.
+    """
+
+    LINEAGE_FILE = "lineage.json"
+
+    def __init__(self, max_bytes=256 * 1024**2, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = os.path.expanduser(directory) if directory is not None else None
+        self._entries = OrderedDict()  # key -> column -> array
+        self._bytes = 0
+        self._lineage = {}  # (indicator key, ticker) -> (length, prefix fingerprint, key)
+        self._lock = threading.Lock()
+        self.hits = self.tail_hits = self.misses = 0
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with open(os.path.join(self.directory, self.LINEAGE_FILE)) as f:
+                    self._lineage = {
+                        tuple(key.split("\n")): tuple(value) for key, value in json.load(f).items()
+                    }
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "tail_hits": self.tail_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._lineage.clear()
+
+    @staticmethod
+    def fingerprint(frame: pd.DataFrame, n=None) -> str:
+        """Hash of the index and OHLCV values of the first n bars (all by default)."""
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(frame.index.asi8[:n].tobytes())
+        for column in FINGERPRINT_COLUMNS:
+            if column in frame.columns:
+                digest.update(column.encode())
+                digest.update(frame[column].to_numpy(dtype=np.float64)[:n].tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def indicator_key(indicator) -> str:
+        cls = type(indicator)
+        return f"{cls.__module__}.{cls.__qualname__}{sorted(indicator.params().items())}"
+
+    def _path(self, key) -> str:
+        name = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + ".npz")
+
+    def get(self, key) -> dict:
+        with self._lock:
+            outputs = self._entries.get(key)
+            if outputs is not None:
+                self._entries.move_to_end(key)
+                return outputs
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key)) as stored:
+                outputs = {column: stored[column] for column in stored.files}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        self._remember(key, outputs)
+        return outputs
+
+    def put(self, key, outputs: dict):
+        self._remember(key, outputs)
+        if self.directory is not None:
+            path = self._path(key)
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, **outputs)
+            os.replace(path + ".tmp", path)
+
+    def _remember(self, key, outputs):
+        size = sum(values.nbytes for values in outputs.values())
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = outputs
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(values.nbytes for values in evicted.values())
+
+    def _save_lineage(self):
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, self.LINEAGE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"\n".join(key): value for key, value in self._lineage.items()}, f)
+        os.replace(path + ".tmp", path)
+
+    def tail_start(self, indicator, ticker, frame, prefixes=None) -> tuple:
+        """
+        (prefix length, cached outputs of the prefix) if the frame extends the bars last
+        cached for this indicator and ticker and the lookback allows computing only the
+        tail, else None. `prefixes` memoizes the prefix fingerprints by length.
+        """
+
+        if indicator.lookback is None:
+            return None
+        with self._lock:
+            lineage = self._lineage.get((self.indicator_key(indicator), ticker))
+        if lineage is None:
+            return None
+        length, prefix, key = lineage
+        if not indicator.lookback <= length < len(frame):
+            return None
+        prefixes = {} if prefixes is None else prefixes
+        if length not in prefixes:
+            prefixes[length] = self.fingerprint(frame, length)
+        if prefixes[length] != prefix:
+            return None
+        outputs = self.get(key)
+        if outputs is None:
+            return None
+        return length, outputs
+
+    def apply(self, indicators, data: dict, backend="serial", max_workers=None) -> dict:
+        """
+        Adds the indicators' columns to the frames of data (ticker -> DataFrame, the
+        frames are replaced) using cached results where possible, and returns data.
+        Indicators without declared columns are not cached and always computed.
+        """
+
+        cacheable = [indicator for indicator in indicators if indicator.columns]
+        uncached = [indicator for indicator in indicators if not indicator.columns]
+
+        results = {ticker: {} for ticker in data}
+        fingerprints = {}
+        # (missing indicators, tail start) -> tickers computed together
+        jobs = {}
+
+        for ticker, frame in data.items():
+            fingerprints[ticker] = fingerprint = self.fingerprint(frame)
+            missing, prefixes, prefix_fingerprints = [], {}, {}
+            for n, indicator in enumerate(cacheable):
+                outputs = self.get(self._key(indicator, fingerprint))
+                if outputs is not None:
+                    results[ticker][n] = outputs
+                    continue
+                missing.append(n)
+                prefixes[n] = self.tail_start(indicator, ticker, frame, prefix_fingerprints)
+
+            if not missing:
+                self._count(hits=len(cacheable))
+                continue
+
+            # Indicators extending the bars cached last time only compute the tail,
+            # grouped by the cached length; the others are computed in full
+            full = [n for n in missing if prefixes[n] is None]
+            tails = {}
+            for n in missing:
+                if prefixes[n] is not None:
+                    tails.setdefault(prefixes[n][0], []).append(n)
+
+            self._count(
+                hits=len(cacheable) - len(missing),
+                tail_hits=len(missing) - len(full),
+                misses=len(full),
+            )
+            if full:
+                jobs.setdefault((tuple(full), 0, None), []).append((ticker, prefixes))
+            for length, group in tails.items():
+                start = length - max(cacheable[n].lookback for n in group)
+                jobs.setdefault((tuple(group), start, length), []).append((ticker, prefixes))
+
+        for (missing, start, length), tickers in jobs.items():
+            graph = IndicatorGraph([cacheable[n] for n in missing])
+            frames = {ticker: data[ticker].iloc[start:] for ticker, _ in tickers}
+            computed = graph.compute_wide(frames)
+            if graph.opaque:
+                frames = apply_indicators(graph.opaque, frames, backend, max_workers)
+                for ticker, frame in frames.items():
+                    computed.setdefault(ticker, {}).update(
+                        (column, frame[column].to_numpy())
+                        for indicator in graph.opaque
+                        for column in indicator.columns
+                    )
+            for ticker, prefixes in tickers:
+                for n in missing:
+                    indicator = cacheable[n]
+                    outputs = {column: computed[ticker][column] for column in indicator.columns}
+                    if length is not None:
+                        prefix = prefixes[n][1]
+                        outputs = {
+                            column: np.concatenate(
+                                [prefix[column][:length], values[length - start :]]
+                            )
+                            for column, values in outputs.items()
+                        }
+                    key = self._key(indicator, fingerprints[ticker])
+                    self.put(key, outputs)
+                    with self._lock:
+                        self._lineage[(self.indicator_key(indicator), ticker)] = (
+                            len(data[ticker]),
+                            fingerprints[ticker],
+                            key,
+                        )
+                    results[ticker][n] = outputs
+        if jobs:
+            with self._lock:
+                self._save_lineage()
+
+        for ticker, outputs in results.items():
+            frame = data[ticker]
+            columns = {
+                column: values
+                for n in sorted(outputs)
+                for column, values in outputs[n].items()
+            }
+            if not columns:
+                continue
+            if any(column in frame.columns for column in columns):
+                frame = frame.drop(columns=list(columns), errors="ignore")
+            new = pd.DataFrame(
+                np.column_stack(list(columns.values())), index=frame.index, columns=list(columns)
+            )
+            data[ticker] = pd.concat([frame, new], axis=1)
+
+        if uncached:
+            IndicatorGraph(uncached).apply_wide(data, backend, max_workers)
+        return data
+
+    def _key(self, indicator, fingerprint) -> str:
+        return f"{self.indicator_key(indicator)}|{fingerprint}"
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
@@ -0,0 +1,314 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backtest.utils.indicator_pool import apply_indicators
+
+
+class Node:
+    """
+    A shared intermediate series, e.g. the 20 bar rolling mean of Close.
+
+    Nodes are identified by (op, source, param), so every indicator asking for the
+    same intermediate gets the same node and it is computed once per ticker. The
+    source is a column of the frame (a price column or another indicator's output)
+    or another Node. Node values are never written into the frame.
+    """
+
+    OPS = {
+        "rolling_mean": lambda x, p: x.rolling(window=p).mean(),
+        "rolling_std": lambda x, p: x.rolling(window=p).std(),
+        "ewm": lambda x, p: x.ewm(span=p, adjust=False).mean(),
+        "diff": lambda x, p: x.diff(p),
+        "gain": lambda x, p: x.where(x > 0, 0),
+        "loss": lambda x, p: -x.where(x < 0, 0),
+    }
+
+    __slots__ = ("op", "source", "param", "key")
+
+    def __init__(self, op, source="Close", param=None):
+        if op not in self.OPS:
+            raise ValueError(f"Unknown intermediate {op}")
+        self.op = op
+        self.source = source
+        self.param = param
+        self.key = (op, source.key if isinstance(source, Node) else source, param)
+
+    def compute(self, values):
+        return self.OPS[self.op](values, self.param)
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Node{self.key}"
+
+
+def rolling_mean(window, source="Close") -> Node:
+    return Node("rolling_mean", source, window)
+
+
+def rolling_std(window, source="Close") -> Node:
+    return Node("rolling_std", source, window)
+
+
+def ewm(span, source="Close") -> Node:
+    return Node("ewm", source, span)
+
+
+def diff(periods=1, source="Close") -> Node:
+    return Node("diff", source, periods)
+
+
+def gain(source) -> Node:
+    return Node("gain", source)
+
+
+def loss(source) -> Node:
+    return Node("loss", source)
+
+
+def like(values: np.ndarray, template):
+    """values as a Series or DataFrame with the index (and columns) of template."""
+    if isinstance(template, pd.DataFrame):
+        return pd.DataFrame(values, index=template.index, columns=template.columns)
+    return pd.Series(values, index=template.index)
+
+
+class IndicatorGraph:
+    """
+    Dependency graph of a set of indicators and the intermediates they share.
+
+    Indicators declare `inputs` (Nodes or column names) and `columns` (their outputs);
+    the graph orders nodes and indicators topologically once, and apply() then runs
+    that order on a frame, computing every intermediate once and writing only the
+    indicators' output columns. Indicators without declared inputs (a custom apply())
+    run afterwards, in the given order.
+
+    Several instances of a family with a `batch` method (e.g. SMA(w) for a sweep of
+    windows, see utils/indicators.evaluate_batch) are computed together from Close
+    in one pass before the graph order, instead of one node chain each.
+
+    apply_wide() runs the same order once for a whole universe on (dates x tickers)
+    frames, so every rolling/ewm call covers all tickers at once.
+    """
+
+    def __init__(self, indicators):
+        self.indicators = list(indicators)
+        self.opaque = [ind for ind in self.indicators if ind.inputs is None]
+        families = {}
+        for indicator in self.indicators:
+            batch = getattr(type(indicator), "batch", None)
+            if batch is not None and indicator.inputs is not None:
+                families.setdefault(batch, []).append(indicator)
+        self.batches = {batch: members for batch, members in families.items() if len(members) > 1}
+        batched = {id(member) for members in self.batches.values() for member in members}
+        self.order = self.sort(
+            [ind for ind in self.indicators if ind.inputs is not None and id(ind) not in batched]
+        )
+
+    @staticmethod
+    def sort(indicators) -> list:
+        """Topological order of the indicators and all the nodes they depend on."""
+
+        producers = {}
+        for indicator in indicators:
+            for column in indicator.columns:
+                producers[column] = indicator
+
+        def dependencies(item):
+            sources = [item.source] if isinstance(item, Node) else item.inputs
+            for source in sources:
+                if isinstance(source, Node):
+                    yield source
+                elif source in producers and producers[source] is not item:
+                    yield producers[source]
+
+        order, done, visiting = [], set(), set()
+
+        def visit(item):
+            key = item if isinstance(item, Node) else id(item)
+            if key in done:
+                return
+            if key in visiting:
+                raise ValueError(f"Indicator dependency cycle at {item!r}")
+            visiting.add(key)
+            for dependency in dependencies(item):
+                visit(dependency)
+            visiting.discard(key)
+            done.add(key)
+            order.append(item)
+
+        for indicator in indicators:
+            visit(indicator)
+        return order
+
+    def nodes(self) -> list:
+        return [item for item in self.order if isinstance(item, Node)]
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Adds every indicator's columns to data (in place) and returns it."""
+
+        for column, series in self.run(lambda column: data[column]).items():
+            data[column] = series
+
+        for indicator in self.opaque:
+            data = indicator.apply(data)
+        return data
+
+    def run(self, get) -> dict:
+        """Runs the graph order with `get(column)` for the frame columns, returns column -> values."""
+
+        values, outputs = {}, {}
+
+        if self.batches:
+            close = get("Close")
+            for batch, members in self.batches.items():
+                for column, array in batch(members, close.to_numpy()).items():
+                    outputs[column] = values[column] = like(array, close)
+
+        def value(source):
+            if isinstance(source, Node):
+                return values[source]
+            if source not in values:
+                values[source] = get(source)
+            return values[source]
+
+        for item in self.order:
+            if isinstance(item, Node):
+                values[item] = item.compute(value(item.source))
+            else:
+                computed = item.compute({source: value(source) for source in item.inputs})
+                for column in item.columns:
+                    outputs[column] = values[column] = computed[column]
+        return outputs
+
+    def apply_wide(self, data: dict, backend="serial", max_workers=None) -> dict:
+        """
+        Adds every indicator's columns to the frames of data (ticker -> DataFrame; the
+        frames are replaced) and returns data. Tickers sharing a date index are
+        computed together on wide (dates x tickers) frames and the results split back
+        per ticker. Indicators without declared inputs are applied per ticker with the
+        given backend (see utils/indicator_pool.py).
+        """
+
+        for ticker, columns in self.compute_wide(data).items():
+            # One concat per ticker instead of inserting the columns one by one
+            frame = data[ticker]
+            if any(column in frame.columns for column in columns):
+                frame = frame.drop(columns=list(columns), errors="ignore")
+            new = pd.DataFrame(
+                np.column_stack(list(columns.values())), index=frame.index, columns=list(columns)
+            )
+            data[ticker] = pd.concat([frame, new], axis=1)
+
+        if self.opaque:
+            data.update(apply_indicators(self.opaque, data, backend, max_workers))
+        return data
+
+    def compute_wide(self, data: dict) -> dict:
+        """
+        Computes the output columns of the indicators with declared inputs for every
+        frame of data, without touching the frames. Returns ticker -> column -> array.
+        """
+
+        results = {}
+        groups = []
+        for ticker, frame in data.items():
+            for index, tickers in groups:
+                if frame.index.equals(index):
+                    tickers.append(ticker)
+                    break
+            else:
+                groups.append((frame.index, [ticker]))
+
+        for index, tickers in groups:
+
+            def wide(column):
+                return pd.DataFrame(
+                    np.column_stack([data[ticker][column].to_numpy() for ticker in tickers]),
+                    index=index,
+                    columns=tickers,
+                )
+
+            outputs = {column: block.to_numpy() for column, block in self.run(wide).items()}
+            for j, ticker in enumerate(tickers):
+                results[ticker] = {column: block[:, j] for column, block in outputs.items()}
+        return results
+
+
+class LazyIndicators:
+    """
+    The indicators a run can use or show, keyed by name. Their columns are only
+    added to the per-ticker frames the first time the engine materializes them (the
+    strategy's indicators); the frontend computes the ones selected in the dashboard
+    on copies of a snapshot's frames (compute).
+    """
+
+    def __init__(self, indicators, data: dict, backend="serial", max_workers=None, cache=None):
+        self.backend = backend  # How indicators without declared inputs are applied
+        self.max_workers = max_workers
+        self.cache = cache  # IndicatorCache (utils/indicator_cache.py) or None
+        self.indicators = {}
+        for indicator in indicators:
+            self.indicators.setdefault(str(indicator), indicator)
+        self.data = data
+        self.materialized = set()
+        self._lock = threading.Lock()
+
+    def add(self, indicators):
+        """Makes more indicators available, e.g. the ones a later optimize() grid declares."""
+        with self._lock:
+            for indicator in indicators:
+                self.indicators.setdefault(str(indicator), indicator)
+
+    def info(self) -> dict:
+        """name -> (columns, need_extra_graph) of every available indicator."""
+        return {
+            name: (indicator.columns, indicator.need_extra_graph)
+            for name, indicator in self.indicators.items()
+        }
+
+    def compute(self, names, data: dict) -> dict:
+        """
+        New frames of `data` with the named indicators' columns added. Neither the dict
+        nor its frames are changed, so readers on other threads (the frontend) can use
+        this on a snapshot while the engine runs. Unknown names are ignored.
+        """
+
+        indicators = [
+            self.indicators[name] for name in dict.fromkeys(names) if name in self.indicators
+        ]
+        # Shallow copies, indicators only implementing apply() may add columns in place
+        frames = {ticker: frame.copy(deep=False) for ticker, frame in data.items()}
+        if not indicators:
+            return frames
+        if self.cache is not None:
+            return self.cache.apply(indicators, frames, self.backend, self.max_workers)
+        return IndicatorGraph(indicators).apply_wide(frames, self.backend, self.max_workers)
+
+    def materialize(self, names) -> list:
+        """
+        Computes the named indicators that are not computed yet on every ticker.
+        Unknown names are ignored. Returns the names computed by this call.
+        """
+
+        with self._lock:
+            pending = [
+                self.indicators[name]
+                for name in dict.fromkeys(names)
+                if name in self.indicators and name not in self.materialized
+            ]
+            if not pending:
+                return []
+
+            if self.cache is not None:
+                self.cache.apply(pending, self.data, self.backend, self.max_workers)
+            else:
+                IndicatorGraph(pending).apply_wide(self.data, self.backend, self.max_workers)
+            self.materialized.update(str(indicator) for indicator in pending)
+            return [str(indicator) for indicator in pending]
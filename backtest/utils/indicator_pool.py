@@ -0,0 +1,183 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+BACKENDS = ("serial", "threads", "processes")
+
+
+def output_columns(indicators, original, frame) -> list:
+    """
+    Columns of an enriched frame in a fixed layout: the original columns, then each
+    indicator's declared columns in order. Indicators that declare none keep every
+    column they added.
+    """
+
+    columns = list(original)
+    for indicator in indicators:
+        added = indicator.columns or [
+            column for column in frame.columns if column not in columns
+        ]
+        columns += [column for column in added if column not in columns]
+    return columns
+
+
+def apply_frame(indicators, frame: pd.DataFrame) -> pd.DataFrame:
+    original = list(frame.columns)
+    for indicator in indicators:
+        frame = indicator.apply(frame)
+    return frame[output_columns(indicators, original, frame)]
+
+
+def chunked(items, n_chunks) -> list:
+    size = max(1, math.ceil(len(items) / n_chunks))
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def apply_indicators(
+    indicators, data: dict, backend="serial", max_workers=None, chunk_size=None
+) -> dict:
+    """
+    Applies indicators (their apply()) to every frame of data (ticker -> DataFrame)
+    and returns a new dict in the same ticker order.
+
+    backend="serial" runs in this thread, "threads" on a thread pool and "processes"
+    on a process pool, with the tickers split into chunks of `chunk_size` (default:
+    about four chunks per worker). The process backend passes the frames through
+    shared memory instead of pickling them, so the indicators must declare their
+    output columns and be picklable. The column layout is the same for every backend.
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, use one of {', '.join(BACKENDS)}")
+
+    tickers = list(data)
+    if not indicators or not tickers:
+        return dict(data)
+
+    if backend == "serial":
+        return {ticker: apply_frame(indicators, data[ticker]) for ticker in tickers}
+
+    workers = max_workers or os.cpu_count() or 1
+    chunks = (
+        [tickers[i : i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+        if chunk_size
+        else chunked(tickers, workers * 4)
+    )
+
+    if backend == "threads":
+
+        def apply_chunk(chunk):
+            return [apply_frame(indicators, data[ticker]) for ticker in chunk]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = [frame for result in pool.map(apply_chunk, chunks) for frame in result]
+        return dict(zip(tickers, frames))
+
+    return apply_processes(indicators, data, tickers, chunks, workers)
+
+
+def apply_processes(indicators, data, tickers, chunks, workers) -> dict:
+    undeclared = [str(indicator) for indicator in indicators if not indicator.columns]
+    if undeclared:
+        raise ValueError(
+            f"The process backend needs declared output columns, missing for {', '.join(undeclared)}"
+        )
+
+    inputs = [
+        list(frame.select_dtypes("number").columns) for frame in data.values()
+    ]
+    outputs = [column for indicator in indicators for column in indicator.columns]
+    rows = np.array([len(data[ticker]) for ticker in tickers])
+    offsets = np.concatenate([[0], np.cumsum(rows)])
+    width = max(len(columns) for columns in inputs)
+
+    # All frames stacked row-wise: the numeric input columns (NaN padded to `width`),
+    # the output columns written by the workers, and the index as int64 nanoseconds.
+    shm_in = shared_memory.SharedMemory(create=True, size=max(offsets[-1] * width * 8, 1))
+    shm_out = shared_memory.SharedMemory(
+        create=True, size=max(offsets[-1] * len(outputs) * 8, 1)
+    )
+    shm_index = shared_memory.SharedMemory(create=True, size=max(offsets[-1] * 8, 1))
+    try:
+        values = np.ndarray((offsets[-1], width), dtype=np.float64, buffer=shm_in.buf)
+        index = np.ndarray((offsets[-1],), dtype=np.int64, buffer=shm_index.buf)
+        values[...] = np.nan
+        timezones = []
+        for n, ticker in enumerate(tickers):
+            frame = data[ticker]
+            start, end = offsets[n], offsets[n + 1]
+            values[start:end, : len(inputs[n])] = frame[inputs[n]].to_numpy(dtype=np.float64)
+            frame_index = frame.index
+            timezones.append(str(frame_index.tz) if frame_index.tz is not None else None)
+            if frame_index.tz is not None:
+                frame_index = frame_index.tz_convert("UTC").tz_localize(None)
+            index[start:end] = frame_index.as_unit("ns").asi8
+
+        position = {ticker: n for n, ticker in enumerate(tickers)}
+        tasks = [
+            [
+                (offsets[position[t]], offsets[position[t] + 1], inputs[position[t]], timezones[position[t]])
+                for t in chunk
+            ]
+            for chunk in chunks
+        ]
+        spec = (shm_in.name, shm_out.name, shm_index.name, offsets[-1], width, outputs)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_indicator_worker,
+            initargs=(indicators, spec),
+        ) as pool:
+            list(pool.map(apply_shared_chunk, tasks))
+
+        out = np.ndarray((offsets[-1], len(outputs)), dtype=np.float64, buffer=shm_out.buf)
+        result = {}
+        for n, ticker in enumerate(tickers):
+            frame = data[ticker]
+            block = out[offsets[n] : offsets[n + 1]].copy()
+            kept = frame.drop(columns=[c for c in outputs if c in frame.columns])
+            enriched = pd.concat(
+                [kept, pd.DataFrame(block, index=frame.index, columns=outputs)], axis=1
+            )
+            result[ticker] = enriched[output_columns(indicators, frame.columns, enriched)]
+        return result
+    finally:
+        for shm in (shm_in, shm_out, shm_index):
+            shm.close()
+            shm.unlink()
+
+
+# State of an indicator worker process, set once by init_indicator_worker
+_worker_state = {}
+
+
+def init_indicator_worker(indicators, spec):
+    name_in, name_out, name_index, n_rows, width, outputs = spec
+    handles = [shared_memory.SharedMemory(name=name) for name in (name_in, name_out, name_index)]
+    _worker_state["handles"] = handles  # Keep the mappings alive
+    _worker_state["values"] = np.ndarray((n_rows, width), dtype=np.float64, buffer=handles[0].buf)
+    _worker_state["out"] = np.ndarray((n_rows, len(outputs)), dtype=np.float64, buffer=handles[1].buf)
+    _worker_state["index"] = np.ndarray((n_rows,), dtype=np.int64, buffer=handles[2].buf)
+    _worker_state["indicators"] = indicators
+    _worker_state["outputs"] = outputs
+
+
+def apply_shared_chunk(chunk):
+    """Rebuilds each frame of the chunk from shared memory, applies the indicators and writes the outputs back."""
+
+    values, out, index = _worker_state["values"], _worker_state["out"], _worker_state["index"]
+    indicators, outputs = _worker_state["indicators"], _worker_state["outputs"]
+    for start, end, columns, tz in chunk:
+        frame_index = pd.DatetimeIndex(index[start:end].view("datetime64[ns]"))
+        if tz is not None:
+            frame_index = frame_index.tz_localize("UTC").tz_convert(tz)
+        frame = pd.DataFrame(
+            values[start:end, : len(columns)].copy(), index=frame_index, columns=columns
+        )
+        for indicator in indicators:
+            frame = indicator.apply(frame)
+        out[start:end] = frame[outputs].to_numpy(dtype=np.float64)
@@ -1,190 +1,367 @@
+import math
+
+import numpy as np
 import pandas as pd
-from backtest.core.indicator_base import Indicator, check_valid_data
+from backtest.core.indicator_base import Indicator, check_valid_data, register_indicator
+from backtest.utils.indicator_graph import IndicatorGraph, rolling_mean, rolling_std, ewm, diff, gain, loss
+from backtest.utils.streaming import RollingMean, RollingWindow, EWM, Diff, IndicatorStream
 import plotly.graph_objects as go
 import plotly.express as px
 
 
-__all__ = ["SMA20"]
+__all__ = [
+    "SMA",
+    "EMA",
+    "MACD",
+    "RSI",
+    "Bollinger",
+    "SMA20",
+    "SMA50",
+    "SMA200",
+    "BollingerBands",
+    "DEFAULT_INDICATORS",
+    "evaluate_batch",
+]
 
 
-class SMA20(Indicator):
+def suffix(*params) -> str:
+    return "_".join(f"{param:g}" if isinstance(param, float) else str(param) for param in params)
 
-    def __init__(self):
-        super().__init__("SMA20")
-        self.window = 20
-        self.columns = ["SMA20"]
-        self.need_extra_graph = False
 
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            data["SMA20"] = data["Close"].rolling(window=self.window).mean()
-            return data
+class LineIndicator(Indicator):
+    """Indicator drawn as one line per column."""
 
     def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
         if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["SMA20"], mode="lines", name="SMA20"),
-                row=1,
-                col=1,
-            )
+            for column in self.columns:
+                fig.add_trace(
+                    go.Scatter(x=data.index, y=data[column], mode="lines", name=column),
+                    row=1,
+                    col=1,
+                )
             return fig
 
     def __repr__(self):
-        return "SMA20"
+        return self.name
 
 
-class SMA50(Indicator):
+@register_indicator
+class SMA(LineIndicator):
+    """Simple moving average of Close over `window` bars, column SMA<window>."""
 
-    def __init__(self):
-        super().__init__("SMA50")
-        self.window = 50
-        self.columns = ["SMA50"]
+    def __init__(self, window=20):
+        super().__init__(f"SMA{window}")
+        self.window = window
+        self.columns = [self.name]
         self.need_extra_graph = False
+        self.lookback = self.window
+        self.mean = rolling_mean(self.window)
+        self.inputs = [self.mean]
 
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            data["SMA50"] = data["Close"].rolling(window=self.window).mean()
-            return data
+    def compute(self, inputs: dict) -> dict:
+        return {self.name: inputs[self.mean]}
 
-    def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
-        if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["SMA50"], mode="lines", name="SMA50"),
-                row=1,
-                col=1,
-            )
-            return fig
+    def stream(self) -> IndicatorStream:
+        mean = RollingMean(self.window)
+        return IndicatorStream(lambda bar: {self.name: mean.update(bar["Close"])})
 
-    def __repr__(self):
-        return "SMA50"
+    @staticmethod
+    def batch(indicators, close: np.ndarray) -> dict:
+        windows = {indicator.window for indicator in indicators}
+        moments = rolling_moments(close, windows, std=False)
+        return {indicator.name: moments[indicator.window][0] for indicator in indicators}
 
 
-class SMA200(Indicator):
+@register_indicator
+class EMA(LineIndicator):
+    """Exponential moving average of Close (adjust=False) with `span`, column EMA<span>."""
 
-    def __init__(self):
-        super().__init__("SMA200")
-        self.window = 200
-        self.columns = ["SMA200"]
+    def __init__(self, span=20):
+        super().__init__(f"EMA{span}")
+        self.span = span
+        self.columns = [self.name]
         self.need_extra_graph = False
+        self.mean = ewm(self.span)
+        self.inputs = [self.mean]
+
+    def compute(self, inputs: dict) -> dict:
+        return {self.name: inputs[self.mean]}
+
+    def stream(self) -> IndicatorStream:
+        mean = EWM(self.span)
+        return IndicatorStream(lambda bar: {self.name: mean.update(bar["Close"])})
+
+    @staticmethod
+    def batch(indicators, close: np.ndarray) -> dict:
+        spans = sorted({indicator.span for indicator in indicators})
+        means = ewm_spans(close, spans)
+        return {indicator.name: means[indicator.span] for indicator in indicators}
+
+
+@register_indicator
+class MACD(LineIndicator):
+    """
+    MACD line (fast EMA - slow EMA) and its `signal` EMA. With the default 12/26/9
+    the columns are MACD and Signal, otherwise they carry the parameters.
+    """
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        default = (fast, slow, signal) == (12, 26, 9)
+        super().__init__("MACD" if default else f"MACD{suffix(fast, slow, signal)}")
+        self.window1 = fast
+        self.window2 = slow
+        self.window3 = signal
+        self.signal_column = "Signal" if default else f"Signal{suffix(fast, slow, signal)}"
+        self.columns = [self.name, self.signal_column]
+        self.need_extra_graph = True
+        self.fast = ewm(self.window1)
+        self.slow = ewm(self.window2)
+        self.inputs = [self.fast, self.slow]
 
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            data["SMA200"] = data["Close"].rolling(window=self.window).mean()
-            return data
+    def compute(self, inputs: dict) -> dict:
+        macd = inputs[self.fast] - inputs[self.slow]
+        return {
+            self.name: macd,
+            self.signal_column: macd.ewm(span=self.window3, adjust=False).mean(),
+        }
 
-    def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
-        if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["SMA200"], mode="lines", name="SMA200"),
-                row=1,
-                col=1,
-            )
-            return fig
+    def stream(self) -> IndicatorStream:
+        fast, slow, signal = EWM(self.window1), EWM(self.window2), EWM(self.window3)
 
-    def __repr__(self):
-        return "SMA200"
+        def update(bar):
+            close = bar["Close"]
+            macd = fast.update(close) - slow.update(close)
+            return {self.name: macd, self.signal_column: signal.update(macd)}
 
+        return IndicatorStream(update)
 
-class MACD(Indicator):
 
-    def __init__(self):
-        super().__init__("MACD")
-        self.window1 = 12
-        self.window2 = 26
-        self.window3 = 9
-        self.columns = ["MACD", "Signal"]
+@register_indicator
+class RSI(LineIndicator):
+    """Relative strength index over `window` bars, column RSI (RSI<window> if not 14)."""
+
+    def __init__(self, window=14):
+        super().__init__("RSI" if window == 14 else f"RSI{window}")
+        self.window = window
+        self.columns = [self.name]
         self.need_extra_graph = True
+        self.lookback = self.window + 1
+        delta = diff()
+        self.gain = rolling_mean(self.window, gain(delta))
+        self.loss = rolling_mean(self.window, loss(delta))
+        self.inputs = [self.gain, self.loss]
+
+    def compute(self, inputs: dict) -> dict:
+        rs = inputs[self.gain] / inputs[self.loss]
+        return {self.name: 100 - (100 / (1 + rs))}
+
+    def stream(self) -> IndicatorStream:
+        delta, gains, losses = Diff(), RollingMean(self.window), RollingMean(self.window)
+
+        def update(bar):
+            change = delta.update(bar["Close"])
+            # Like where(delta > 0, 0): the NaN of the first bar counts as 0
+            gain = gains.update(change if change > 0 else 0.0)
+            loss = losses.update(-change if change < 0 else 0.0)
+            rs = gain / loss if loss != 0 else (math.inf if gain > 0 else math.nan)
+            return {self.name: 100 - (100 / (1 + rs))}
+
+        return IndicatorStream(update)
+
+    @staticmethod
+    def batch(indicators, close: np.ndarray) -> dict:
+        close = np.asarray(close, dtype=np.float64)
+        delta = np.diff(close, axis=0, prepend=np.nan)
+        windows = {indicator.window for indicator in indicators}
+        gains = rolling_moments(np.where(delta > 0, delta, 0.0), windows, std=False)
+        losses = rolling_moments(np.where(delta < 0, -delta, 0.0), windows, std=False)
+        result = {}
+        for indicator in indicators:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rs = gains[indicator.window][0] / losses[indicator.window][0]
+                result[indicator.name] = 100 - (100 / (1 + rs))
+        return result
+
+
+@register_indicator
+class Bollinger(LineIndicator):
+    """
+    Bollinger bands: `window` bar mean of Close +- k standard deviations. With the
+    default 20/2 the columns are UpperBand and LowerBand, otherwise they carry the
+    parameters.
+    """
+
+    def __init__(self, window=20, k=2):
+        default = (window, k) == (20, 2)
+        super().__init__("BollingerBands" if default else f"Bollinger{suffix(window, k)}")
+        self.window = window
+        self.k = k
+        label = "" if default else suffix(window, k)
+        self.columns = [f"UpperBand{label}", f"LowerBand{label}"]
+        self.need_extra_graph = False
+        self.lookback = self.window
+        self.mean = rolling_mean(self.window)
+        self.std = rolling_std(self.window)
+        self.inputs = [self.mean, self.std]
 
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            data["MACD"] = (
-                data["Close"].ewm(span=self.window1, adjust=False).mean()
-                - data["Close"].ewm(span=self.window2, adjust=False).mean()
-            )
-            data["Signal"] = data["MACD"].ewm(span=self.window3, adjust=False).mean()
-            return data
+    def bands(self, mean, std) -> dict:
+        upper, lower = self.columns
+        return {upper: mean + (std * self.k), lower: mean - (std * self.k)}
 
-    def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
-        if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["MACD"], mode="lines", name="MACD"),
-                row=1,
-                col=1,
-            )
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["Signal"], mode="lines", name="Signal"),
-                row=1,
-                col=1,
-            )
-            return fig
+    def compute(self, inputs: dict) -> dict:
+        return self.bands(inputs[self.mean], inputs[self.std])
 
-    def __repr__(self):
-        return "MACD"
+    def stream(self) -> IndicatorStream:
+        window = RollingWindow(self.window)
 
+        def update(bar):
+            window.push(bar["Close"])
+            return self.bands(window.mean(), window.std())
 
-class RSI(Indicator):
+        return IndicatorStream(update)
 
-    def __init__(self):
-        super().__init__("RSI")
-        self.window = 14
-        self.columns = ["RSI"]
-        self.need_extra_graph = True
+    @staticmethod
+    def batch(indicators, close: np.ndarray) -> dict:
+        moments = rolling_moments(close, {indicator.window for indicator in indicators})
+        result = {}
+        for indicator in indicators:
+            result.update(indicator.bands(*moments[indicator.window]))
+        return result
 
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            delta = data["Close"].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=self.window).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=self.window).mean()
-            rs = gain / loss
-            data["RSI"] = 100 - (100 / (1 + rs))
-            return data
 
-    def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
-        if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(x=data.index, y=data["RSI"], mode="lines", name="RSI"),
-                row=1,
-                col=1,
-            )
-            return fig
+# The fixed-window indicators the frontend has always offered
+@register_indicator
+class SMA20(SMA):
+    def __init__(self):
+        super().__init__(20)
 
-    def __repr__(self):
-        return "RSI"
 
+@register_indicator
+class SMA50(SMA):
+    def __init__(self):
+        super().__init__(50)
 
-class BollingerBands(Indicator):
 
+@register_indicator
+class SMA200(SMA):
     def __init__(self):
-        super().__init__("BollingerBands")
-        self.window = 20
-        self.columns = ["UpperBand", "LowerBand"]
-        self.need_extra_graph = False
-
-    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
-        if check_valid_data(data):
-            data["SMA"] = data["Close"].rolling(window=self.window).mean()
-            data["STD"] = data["Close"].rolling(window=self.window).std()
-            data["UpperBand"] = data["SMA"] + (data["STD"] * 2)
-            data["LowerBand"] = data["SMA"] - (data["STD"] * 2)
-            return data
+        super().__init__(200)
 
-    def visualize(self, data: pd.DataFrame, fig: go.Figure) -> go.Figure:
-        if check_valid_data(data):
-            fig.add_trace(
-                go.Scatter(
-                    x=data.index, y=data["UpperBand"], mode="lines", name="UpperBand"
-                ),
-                row=1,
-                col=1,
-            )
-            fig.add_trace(
-                go.Scatter(
-                    x=data.index, y=data["LowerBand"], mode="lines", name="LowerBand"
-                ),
-                row=1,
-                col=1,
-            )
-            return fig
 
-    def __repr__(self):
-        return "BollingerBands"
+@register_indicator
+class BollingerBands(Bollinger):
+    def __init__(self):
+        super().__init__(20, 2)
+
+
+# Offered in the frontend when Backtest gets no indicators. Other instances are
+# configured as specs, e.g. ("SMA", {"window": 100}) or ("Bollinger", {"k": 2.5}).
+DEFAULT_INDICATORS = ["SMA20", "SMA50", "SMA200", "MACD", "RSI", "BollingerBands"]
+
+
+# Rows of x per block of rolling_moments. The cumulative sums restart every block
+# (centered on its own mean), so their rounding error does not grow with the series.
+MOMENT_BLOCK = 1024
+
+
+def rolling_moments(x, windows, std=True) -> dict:
+    """
+    Rolling mean (and sample standard deviation) of x along axis 0 for several
+    windows from shared cumulative sums. x is (dates,) or (dates x tickers).
+    Returns window -> (mean, std); values are NaN until the window is full and
+    while it contains a NaN. Matches pandas rolling to floating point tolerance.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    windows = sorted(set(windows))
+    result = {
+        window: (np.full(x.shape, np.nan), np.full(x.shape, np.nan) if std else None)
+        for window in windows
+    }
+    longest = max((window for window in windows if window <= len(x)), default=0)
+    if not longest:
+        return result
+
+    block = max(MOMENT_BLOCK, 4 * longest)
+    for start in range(0, len(x), block):
+        # Output rows start..stop-1, whose windows reach back to row `first`
+        stop = min(start + block, len(x))
+        first = max(start - longest + 1, 0)
+        chunk = x[first:stop]
+        missing = np.isnan(chunk)
+        present = np.where(missing, 0.0, chunk)
+        count = (~missing).sum(axis=0)
+        center = present.sum(axis=0) / np.maximum(count, 1)
+        centered = np.where(missing, 0.0, chunk - center)
+
+        zeros = np.zeros((1,) + x.shape[1:])
+        sums = np.concatenate([zeros, np.cumsum(centered, axis=0)])
+        squares = np.concatenate([zeros, np.cumsum(centered**2, axis=0)]) if std else None
+        nans = np.concatenate([zeros, np.cumsum(missing, axis=0)])
+
+        for window in windows:
+            if window > len(x):
+                continue
+            mean, deviation = result[window]
+            # Rows of the block that end a full window, in block coordinates + 1
+            begin = max(start, window - 1) - first + 1
+            end = stop - first + 1
+            if begin >= end:
+                continue
+            rows = slice(begin + first - 1, stop)
+            total = sums[begin:end] - sums[begin - window : end - window]
+            invalid = (nans[begin:end] - nans[begin - window : end - window]) > 0
+            mean[rows] = np.where(invalid, np.nan, total / window + center)
+            if std and window > 1:
+                spread = (
+                    squares[begin:end] - squares[begin - window : end - window] - total**2 / window
+                )
+                variance = np.maximum(spread, 0.0) / (window - 1)
+                deviation[rows] = np.where(invalid, np.nan, np.sqrt(variance))
+    return result
+
+
+def ewm_spans(x, spans) -> dict:
+    """
+    ewm(span, adjust=False).mean() of x along axis 0 for several spans, like the
+    graph's ewm nodes (including how NaNs are handled). x is (dates,) or
+    (dates x tickers); each span is one pandas call over every column.
+    Returns span -> array.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    frame = pd.DataFrame(x if x.ndim == 2 else x[:, None])
+    result = {}
+    for span in spans:
+        means = frame.ewm(span=span, adjust=False).mean().to_numpy()
+        result[span] = means if x.ndim == 2 else means[:, 0]
+    return result
+
+
+def evaluate_batch(indicators, close) -> dict:
+    """
+    Computes many Close-based indicators at once, e.g. SMA(w) for a sweep of windows.
+    Instances of the same family (a class with a `batch` method) share one pass;
+    the others run through their indicator graph. close is (dates,) or
+    (dates x tickers). Returns column -> array shaped like close.
+    """
+
+    close = np.asarray(close, dtype=np.float64)
+    families, others = {}, []
+    for indicator in indicators:
+        batch = getattr(type(indicator), "batch", None)
+        if batch is None:
+            others.append(indicator)
+        else:
+            families.setdefault(batch, []).append(indicator)
+
+    result = {}
+    for batch, members in families.items():
+        result.update(batch(members, close))
+    if others:
+        frame = pd.DataFrame(close if close.ndim == 2 else close[:, None])
+        outputs = IndicatorGraph(others).run(lambda column: frame)
+        for column, values in outputs.items():
+            values = values.to_numpy()
+            result[column] = values if close.ndim == 2 else values[:, 0]
+    return result
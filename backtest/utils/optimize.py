@@ -0,0 +1,88 @@
+import itertools
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest.utils.panel import PricePanel
+
+
+def expand_grid(param_grid) -> list:
+    """
+    Expands a parameter grid into a list of parameter dicts.
+    Accepts a dict of name -> list of values (cartesian product) or a list of such dicts.
+    """
+
+    if isinstance(param_grid, dict):
+        param_grid = [param_grid]
+
+    combinations = []
+    for grid in param_grid:
+        names = list(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            combinations.append(dict(zip(names, values)))
+    return combinations
+
+
+class SharedPanel:
+    """
+    Copies the values of a PricePanel into shared memory once, so worker processes
+    can map the same buffer instead of receiving a pickled copy with every task.
+    """
+
+    def __init__(self, panel: PricePanel):
+        self.panel = panel
+        self.shm = shared_memory.SharedMemory(create=True, size=max(panel.values.nbytes, 1))
+        shared = np.ndarray(panel.values.shape, dtype=np.float64, buffer=self.shm.buf)
+        shared[...] = panel.values
+
+    def spec(self) -> tuple:
+        """Everything a worker needs to rebuild the panel, see attach()."""
+        panel = self.panel
+        return (self.shm.name, panel.values.shape, panel.dates, panel.tickers, panel.fields)
+
+    @staticmethod
+    def attach(spec):
+        """Maps the shared buffer in a worker, returns (shared memory handle, PricePanel)."""
+        name, shape, dates, tickers, fields = spec
+        shm = shared_memory.SharedMemory(name=name)
+        values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        values.flags.writeable = False
+        return shm, PricePanel(values, dates, tickers, fields)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EarlyAbort:
+    """
+    Abort hook for Backtest.run_backtest / Backtest.optimize.
+
+    Stops a run once `metric` is below `below` (or above `above`) after at least
+    `min_bars` bars. Being a plain class, it pickles to worker processes.
+    """
+
+    def __init__(self, metric, below=None, above=None, min_bars=0):
+        self.metric = metric
+        self.below = below
+        self.above = above
+        self.min_bars = min_bars
+
+    def __call__(self, metrics: dict, i) -> bool:
+        if i + 1 < self.min_bars:
+            return False
+        value = metrics[self.metric]
+        if self.below is not None and value < self.below:
+            return True
+        if self.above is not None and value > self.above:
+            return True
+        return False
+
+    def __repr__(self):
+        return f"EarlyAbort({self.metric}, below={self.below}, above={self.above}, min_bars={self.min_bars})"
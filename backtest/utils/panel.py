@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+
+
+def unknown_field(name) -> KeyError:
+    """The error for reading a field the panel does not have, e.g. an undeclared indicator's column."""
+    return KeyError(
+        f"{name!r} is not in the price panel, indicator columns are only computed for "
+        "the indicators declared in Strategy.indicators"
+    )
+
+
+class PricePanel:
+    """
+    Aligned price panel: one contiguous float64 array shaped (dates x tickers x fields)
+    holding the OHLCV and indicator columns of every ticker on the shared date index.
+
+    The engine reads bars from it by position instead of doing a label lookup and
+    building a Series for every ticker on every date.
+    """
+
+    def __init__(self, values: np.ndarray, dates, tickers, fields):
+        self.values = values
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.fields = list(fields)
+        self.ticker_index = {ticker: j for j, ticker in enumerate(self.tickers)}
+        self.field_index = {field: f for f, field in enumerate(self.fields)}
+
+    @classmethod
+    def from_frames(cls, data: dict, tickers, dates):
+        """
+        Builds the panel from the per-ticker DataFrames, restricted to `dates`.
+        Only the numeric columns every ticker has are included.
+        """
+
+        frames = [data[ticker] for ticker in tickers]
+        fields = [
+            column
+            for column in frames[0].select_dtypes("number").columns
+            if all(column in frame.columns for frame in frames[1:])
+        ]
+
+        values = np.empty((len(dates), len(tickers), len(fields)), dtype=np.float64)
+        for j, frame in enumerate(frames):
+            if not frame.index.equals(dates):
+                frame = frame.reindex(dates)
+            values[:, j, :] = frame[fields].to_numpy(dtype=np.float64)
+        return cls(values, dates, tickers, fields)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def field(self, name) -> np.ndarray:
+        """Returns a (dates x tickers) view of a single field."""
+        return self.values[:, :, self.field_index[name]]
+
+    def to_frames(self) -> dict:
+        """Returns a dict of ticker -> DataFrame with the panel's fields, on the panel's dates."""
+        return {
+            ticker: pd.DataFrame(self.values[:, j, :], index=self.dates, columns=self.fields)
+            for j, ticker in enumerate(self.tickers)
+        }
+
+    def with_fields(self, names) -> "PricePanel":
+        """Returns a writable copy of the panel with NaN-filled fields appended for `names`."""
+        names = [name for name in names if name not in self.field_index]
+        values = np.full(self.values.shape[:2] + (len(self.fields) + len(names),), np.nan)
+        values[:, :, : len(self.fields)] = self.values
+        return PricePanel(values, self.dates, self.tickers, self.fields + names)
+
+    def row(self, i, ticker) -> "PanelRow":
+        return PanelRow(
+            self.values[i, self.ticker_index[ticker]], self.field_index, self.dates[i]
+        )
+
+
+class PanelRow:
+    """
+    Read-only view of one ticker on one date of a PricePanel.
+
+    Supports the parts of the Series API strategies use on a row (row["Close"],
+    row.Close, row.get, row.name, row.index) without creating a pandas object.
+    to_series() builds the equivalent Series when the full API is needed.
+    """
+
+    __slots__ = ("_values", "_fields", "name")
+
+    def __init__(self, values: np.ndarray, fields: dict, name=None):
+        self._values = values
+        self._fields = fields
+        self.name = name
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._fields[key]]
+        except KeyError:
+            raise unknown_field(key) from None
+
+    def __getattr__(self, key):
+        try:
+            return self._values[self._fields[key]]
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def get(self, key, default=None):
+        f = self._fields.get(key)
+        return default if f is None else self._values[f]
+
+    def keys(self):
+        return list(self._fields)
+
+    @property
+    def index(self):
+        return pd.Index(list(self._fields))
+
+    def to_series(self) -> pd.Series:
+        return pd.Series(self._values.copy(), index=list(self._fields), name=self.name)
+
+    def __repr__(self):
+        return f"PanelRow({self.name}, {dict(zip(self._fields, self._values))})"
+
+
+class History:
+    """
+    Look-ahead-safe, read-only access to the past bars of a PricePanel, given to
+    strategies as Strategy.history during Backtest.run_backtest.
+
+    history(ticker, field, n) returns the last n values of `field` up to and
+    including the current bar (fewer at the start of the data) as a NumPy view
+    of the panel: nothing is copied and the view cannot be written to. Bars after
+    the current one are never visible; the engine advances the current bar with
+    seek(i).
+    """
+
+    __slots__ = ("panel", "i", "_values", "_columns")
+
+    def __init__(self, panel: PricePanel):
+        self.panel = panel
+        self.i = -1  # Current bar, nothing is visible before the first seek
+        self._values = panel.values.view()
+        self._values.flags.writeable = False
+        self._columns = {}  # (ticker, field) -> read-only (dates,) view
+
+    def seek(self, i):
+        self.i = i
+
+    @property
+    def date(self):
+        return self.panel.dates[self.i] if self.i >= 0 else None
+
+    def _column(self, ticker, field) -> np.ndarray:
+        key = (ticker, field)
+        column = self._columns.get(key)
+        if column is None:
+            if field not in self.panel.field_index:
+                raise unknown_field(field)
+            column = self._columns[key] = self._values[
+                :, self.panel.ticker_index[ticker], self.panel.field_index[field]
+            ]
+        return column
+
+    def __call__(self, ticker, field, n) -> np.ndarray:
+        end = self.i + 1
+        return self._column(ticker, field)[max(end - n, 0) : end]
+
+    def __repr__(self):
+        return f"History({self.date}, {len(self.panel.tickers)} tickers)"
+
+
+class CrossSection:
+    """
+    Every ticker of a PricePanel on the current date, given to Strategy.get_actions.
+
+    cross_section[field] (or field(field)) is a read-only (tickers,) view in the
+    order of `tickers`; history(field, n) is the read-only (n x tickers) view of
+    the last n bars up to the current one. Like History, later bars are never
+    visible and nothing is copied.
+    """
+
+    __slots__ = ("panel", "tickers", "ticker_index", "field_index", "i", "date", "values", "_values")
+
+    def __init__(self, panel: PricePanel):
+        self.panel = panel
+        self.tickers = panel.tickers
+        self.ticker_index = panel.ticker_index
+        self.field_index = panel.field_index
+        self._values = panel.values.view()
+        self._values.flags.writeable = False
+        self.i = -1
+        self.date = None
+        self.values = None  # (tickers x fields) view of the current date
+
+    def seek(self, i):
+        self.i = i
+        self.date = self.panel.dates[i]
+        self.values = self._values[i]
+
+    def field(self, name) -> np.ndarray:
+        try:
+            return self.values[:, self.field_index[name]]
+        except KeyError:
+            raise unknown_field(name) from None
+
+    __getitem__ = field
+
+    def history(self, name, n) -> np.ndarray:
+        if name not in self.field_index:
+            raise unknown_field(name)
+        end = self.i + 1
+        return self._values[max(end - n, 0) : end, :, self.field_index[name]]
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __repr__(self):
+        return f"CrossSection({self.date}, {len(self.tickers)} tickers)"
@@ -81,6 +81,206 @@ def calculate_metrics(
     return pd.Series(metrics)
 
 
+class MetricsAccumulator:
+    """
+    Online version of calculate_metrics.
+
+    Every figure is kept up to date in O(1) per bar (O(tickers) for the Buy & Hold
+    return): Welford running mean/variance of the bar returns for volatility, Sharpe
+    and Sortino, a running equity peak with drawdown sums, and exposure and trade
+    counters. metrics() gives the same numbers as the calculate_* functions run on
+    the full histories, up to floating-point rounding.
+    """
+
+    def __init__(self, initial_capital, first_closes, risk_free_rate=0.02):
+        self.initial_capital = initial_capital
+        self.first_closes = np.asarray(first_closes, dtype=np.float64)
+        self.daily_risk_free = risk_free_rate / 252
+
+        self.start = None
+        self.end = None
+        self.bars = 0
+        self.exposed_bars = 0
+        self.trades = 0
+
+        self.equity = None
+        self.equity_peak = None
+        self.buy_hold_return = np.nan
+
+        # Welford state over all bar returns
+        self.n_returns = 0
+        self.mean_return = 0.0
+        self.m2_return = 0.0
+
+        # Welford state over the negative excess returns only
+        self.n_downside = 0
+        self.mean_downside = 0.0
+        self.m2_downside = 0.0
+
+        self.max_drawdown = 0.0
+        self.drawdown_sum = 0.0
+        self.drawdown_count = 0
+
+    def update(self, date, cash, equity, closes=None):
+        """Adds one bar of portfolio state (and the tickers' closes at that bar)."""
+
+        if self.start is None:
+            self.start = date
+        self.end = date
+        self.bars += 1
+
+        if abs(equity - cash) > 0.01:
+            self.exposed_bars += 1
+
+        if self.equity is not None:
+            bar_return = equity / self.equity - 1
+            self.n_returns += 1
+            delta = bar_return - self.mean_return
+            self.mean_return += delta / self.n_returns
+            self.m2_return += delta * (bar_return - self.mean_return)
+
+            excess = bar_return - self.daily_risk_free
+            if excess < 0:
+                self.n_downside += 1
+                delta = excess - self.mean_downside
+                self.mean_downside += delta / self.n_downside
+                self.m2_downside += delta * (excess - self.mean_downside)
+        self.equity = equity
+
+        if self.equity_peak is None or equity > self.equity_peak:
+            self.equity_peak = equity
+        drawdown = ((equity - self.equity_peak) / self.equity_peak) * 100
+        if drawdown < 0:
+            self.drawdown_sum += drawdown
+            self.drawdown_count += 1
+            self.max_drawdown = max(self.max_drawdown, -drawdown)
+
+        if closes is not None and len(self.first_closes):
+            self.buy_hold_return = np.mean(
+                ((closes - self.first_closes) / self.first_closes) * 100
+            )
+
+    def update_many(self, start, end, cash, equity, closes=None):
+        """
+        Adds a run of bars from `start` to `end` (dates) at once, all with the same
+        cash: `equity` holds their equity values and `closes` the tickers' closes at
+        the last one. Gives the same state as calling update() bar by bar, up to
+        floating-point rounding.
+        """
+
+        equity = np.asarray(equity, dtype=np.float64)
+        if not len(equity):
+            return
+        if self.start is None:
+            self.start = start
+        self.end = end
+        self.bars += len(equity)
+        self.exposed_bars += int(np.count_nonzero(np.abs(equity - cash) > 0.01))
+
+        previous = equity[:-1] if self.equity is None else np.concatenate([[self.equity], equity[:-1]])
+        returns = equity[-len(previous) :] / previous - 1 if len(previous) else previous
+        self.n_returns, self.mean_return, self.m2_return = merge_moments(
+            (self.n_returns, self.mean_return, self.m2_return), returns
+        )
+        excess = returns - self.daily_risk_free
+        self.n_downside, self.mean_downside, self.m2_downside = merge_moments(
+            (self.n_downside, self.mean_downside, self.m2_downside), excess[excess < 0]
+        )
+        self.equity = equity[-1]
+
+        peaks = np.maximum.accumulate(
+            equity if self.equity_peak is None else np.maximum(equity, self.equity_peak)
+        )
+        self.equity_peak = peaks[-1]
+        drawdowns = ((equity - peaks) / peaks) * 100
+        drawdowns = drawdowns[drawdowns < 0]
+        if len(drawdowns):
+            self.drawdown_sum += drawdowns.sum()
+            self.drawdown_count += len(drawdowns)
+            self.max_drawdown = max(self.max_drawdown, -drawdowns.min())
+
+        if closes is not None and len(self.first_closes):
+            self.buy_hold_return = np.mean(
+                ((closes - self.first_closes) / self.first_closes) * 100
+            )
+
+    def count_trade(self, n=1):
+        self.trades += n
+
+    def return_pct(self):
+        return ((self.equity - self.initial_capital) / self.initial_capital) * 100
+
+    def return_ann(self):
+        total_days = (self.end - self.start).days
+        if total_days == 0:
+            return 0
+        return (((1 + self.return_pct() / 100) ** (365 / total_days)) - 1) * 100
+
+    def volatility_ann(self):
+        if self.n_returns == 0:
+            return np.nan
+        return np.sqrt(self.m2_return / self.n_returns) * np.sqrt(252) * 100
+
+    def sharpe_ratio(self):
+        if self.n_returns < 2:
+            return np.nan
+        std = np.sqrt(self.m2_return / (self.n_returns - 1))
+        if std == 0:
+            return 0
+        return np.sqrt(252) * ((self.mean_return - self.daily_risk_free) / std)
+
+    def sortino_ratio(self):
+        if self.n_downside == 0:
+            return 0
+        if self.n_downside < 2:
+            return np.nan
+        std = np.sqrt(self.m2_downside / (self.n_downside - 1))
+        if std == 0:
+            return 0
+        return np.sqrt(252) * ((self.mean_return - self.daily_risk_free) / std)
+
+    def metrics(self) -> dict:
+        """Returns the current metrics keyed like get_performance_metrics()."""
+
+        return_ann = self.return_ann()
+        return {
+            "Start": self.start,
+            "End": self.end,
+            "Duration": self.end - self.start,
+            "Exposure Time [%]": (self.exposed_bars / self.bars) * 100,
+            "Equity Final [$]": self.equity,
+            "Equity Peak [$]": self.equity_peak,
+            "Return [%]": self.return_pct(),
+            "Buy & Hold Return [%]": self.buy_hold_return,
+            "Return (Ann.) [%]": return_ann,
+            "Volatility (Ann.) [%]": self.volatility_ann(),
+            "CAGR [%]": return_ann,
+            "Sharpe Ratio": self.sharpe_ratio(),
+            "Sortino Ratio": self.sortino_ratio(),
+            "Max. Drawdown [%]": self.max_drawdown,
+            "Avg. Drawdown [%]": (
+                abs(self.drawdown_sum / self.drawdown_count)
+                if self.drawdown_count > 0
+                else 0
+            ),
+            "# Trades": self.trades,
+        }
+
+
+def merge_moments(moments, values) -> tuple:
+    """Adds values to Welford state (count, mean, M2) with the parallel merge formula."""
+
+    n, mean, m2 = moments
+    k = len(values)
+    if k == 0:
+        return n, mean, m2
+    batch_mean = values.mean()
+    batch_m2 = ((values - batch_mean) ** 2).sum()
+    total = n + k
+    delta = batch_mean - mean
+    return total, mean + delta * k / total, m2 + batch_m2 + delta**2 * n * k / total
+
+
 def calculate_Start(results_df: pd.DataFrame):
     """Get the start date of the backtest"""
     try:
@@ -238,10 +438,7 @@ def calculate_AvgDrawdown(results_df: pd.DataFrame):
 
 def calculate_Trades(results_df: pd.DataFrame, action_data):
     """Calculate total number of trades"""
-    trade_count = 0
-
-    trade_count += sum(1 for entry in action_data["Type"] if entry in ["buy", "sell"])
-    return trade_count
+    return int(pd.Series(action_data["Type"], dtype=object).isin(["buy", "sell"]).sum())
 
 
 def calculate_WinRate(results_df: pd.DataFrame):
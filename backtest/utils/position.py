@@ -4,6 +4,8 @@ import numpy as np
 class Position:
     """Position Class that deals with the position that the trader is currently in"""
 
+    __slots__ = ("size", "entry_price", "capital_invested", "highest_price", "stop_loss")
+
     def __init__(self, size, entry_price, stop_loss):
         self.size = size
         self.entry_price = entry_price
@@ -24,8 +26,6 @@ class Position:
         if amount > self.size:
             raise ValueError("Cannot sell more than the current position size")
 
-        self.size -= amount
-
         self.size -= amount
         self.capital_invested -= self.size * self.entry_price * (1 + comission)
 
@@ -48,3 +48,105 @@ class Position:
 
     def __repr__(self):
         return f"Position(size={self.size}, entry_price={self.entry_price}, stop_loss={self.stop_loss})"
+
+
+def book_field(name, optional=False):
+    """Property reading / writing one ticker's element of a PositionBook array (NaN is None if optional)."""
+
+    def get(self):
+        value = getattr(self.book, name)[self.j]
+        return None if optional and value != value else value
+
+    def set(self, value):
+        getattr(self.book, name)[self.j] = np.nan if value is None else value
+
+    return property(get, set)
+
+
+class PositionView(Position):
+    """The Position of one ticker of a PositionBook, reading and writing the book's arrays."""
+
+    __slots__ = ("book", "j")
+
+    def __init__(self, book, j):
+        self.book = book
+        self.j = j
+
+    size = book_field("size")
+    entry_price = book_field("entry_price", optional=True)
+    capital_invested = book_field("capital_invested")
+    highest_price = book_field("highest_price", optional=True)
+    stop_loss = book_field("stop_loss", optional=True)
+
+
+class PositionBook:
+    """
+    The positions of every ticker as struct-of-arrays: size, entry_price,
+    capital_invested, highest_price and stop_loss are float64 arrays over `tickers`
+    (NaN for no price / stop), so the engine can value and record all positions
+    with array operations.
+
+    It behaves like the dict of ticker -> Position it replaces: positions[ticker]
+    is a PositionView of that ticker (one per ticker, created once) with the
+    Position API.
+    """
+
+    def __init__(self, tickers):
+        self.tickers = list(tickers)
+        self.index = {ticker: j for j, ticker in enumerate(self.tickers)}
+        self.ticker_array = np.array(self.tickers, dtype=object)
+        n_tickers = len(self.tickers)
+        self.size = np.zeros(n_tickers)
+        self.entry_price = np.full(n_tickers, np.nan)
+        self.capital_invested = np.zeros(n_tickers)
+        self.highest_price = np.full(n_tickers, np.nan)
+        self.stop_loss = np.full(n_tickers, np.nan)
+        self._views = [PositionView(self, j) for j in range(n_tickers)]
+
+    @classmethod
+    def of(cls, positions) -> "PositionBook":
+        """`positions` as a book: a PositionBook as is, a dict of ticker -> Position copied."""
+        if isinstance(positions, PositionBook):
+            return positions
+        book = cls(positions)
+        for ticker, position in positions.items():
+            view = book[ticker]
+            for name in Position.__slots__:
+                setattr(view, name, getattr(position, name))
+        return book
+
+    def __getitem__(self, ticker) -> PositionView:
+        return self._views[self.index[ticker]]
+
+    def __contains__(self, ticker):
+        return ticker in self.index
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def keys(self):
+        return list(self.tickers)
+
+    def values(self):
+        return list(self._views)
+
+    def items(self):
+        return list(zip(self.tickers, self._views))
+
+    def select(self, tickers) -> "PositionBook":
+        """A new book with the positions of `tickers`, in that order."""
+        book = PositionBook(tickers)
+        rows = [self.index[ticker] for ticker in book.tickers]
+        for name in ("size", "entry_price", "capital_invested", "highest_price", "stop_loss"):
+            getattr(book, name)[:] = getattr(self, name)[rows]
+        return book
+
+    def value(self, prices) -> float:
+        """Market value of all positions at `prices` (aligned with tickers)."""
+        return float(self.size @ prices)
+
+    def __repr__(self):
+        return f"PositionBook({', '.join(f'{t}: {v!r}' for t, v in self.items())})"
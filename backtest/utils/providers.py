@@ -0,0 +1,137 @@
+import time
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+
+class YFinanceProvider:
+    """Downloads OHLCV data from Yahoo Finance through yfinance."""
+
+    supports_batch = True
+
+    def history(
+        self, ticker, start=None, end=None, interval="1d", period=None, timeout=None
+    ) -> pd.DataFrame:
+        if period is not None:
+            return yf.Ticker(ticker).history(
+                period=period, interval=interval, timeout=timeout
+            )
+        return yf.Ticker(ticker).history(
+            start=start,
+            end=end,
+            interval=interval,
+            raise_errors=True,
+            timeout=timeout,
+        )
+
+    def download(self, tickers, start=None, end=None, interval="1d", timeout=None) -> dict:
+        """
+        Downloads many tickers in one request. Returns a dict of ticker -> DataFrame
+        shaped like history(); tickers without data are left out.
+        """
+
+        frame = yf.download(
+            tickers,
+            start=start,
+            end=end,
+            interval=interval,
+            group_by="ticker",
+            auto_adjust=True,
+            actions=True,
+            ignore_tz=False,
+            threads=True,
+            progress=False,
+            timeout=timeout,
+        )
+
+        data = {}
+        for ticker in tickers:
+            if ticker not in frame.columns.get_level_values(0):
+                continue
+            ticker_data = frame[ticker].dropna(how="all")
+            if not ticker_data.empty:
+                data[ticker] = ticker_data
+        return data
+
+
+class FakeProvider:
+    """
+    Offline provider returning deterministic random-walk OHLCV bars, with an injected
+    delay per request. Used to test and benchmark DataRetriever without the network.
+    """
+
+    supports_batch = True
+
+    FREQUENCIES = {
+        "1m": "min",
+        "5m": "5min",
+        "15m": "15min",
+        "30m": "30min",
+        "1h": "h",
+        "1d": "D",
+        "1wk": "W",
+        "1mo": "MS",
+    }
+
+    def __init__(self, latency=0.0, batch_latency=None, tz="America/New_York"):
+        self.latency = latency
+        self.batch_latency = latency if batch_latency is None else batch_latency
+        self.tz = tz
+        self.requests = 0
+
+    def localize(self, timestamp) -> pd.Timestamp:
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is None:
+            return timestamp.tz_localize(self.tz)
+        return timestamp.tz_convert(self.tz)
+
+    def bars(self, ticker, start, end, interval) -> pd.DataFrame:
+        end = self.localize(end)
+        index = pd.date_range(
+            self.localize(start).ceil("D"),
+            end,
+            freq=self.FREQUENCIES.get(interval, interval),
+            inclusive="left",
+        )
+        index = index[index < end]
+        # Prices are a function of the timestamp, so overlapping requests agree
+        rng = np.random.default_rng(sum(map(ord, ticker)))
+        phase = rng.uniform(0, 2 * np.pi, 3)
+        period = rng.uniform(5, 60, 3)
+        trend = rng.normal(0, 0.2)
+        days = ((index - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(days=1)).to_numpy()
+        close = 100 * np.exp(
+            trend * (days - 10_000) / 365
+            + 0.1 * np.sin(days / period[0] + phase[0])
+            + 0.03 * np.sin(days / period[1] + phase[1])
+            + 0.01 * np.sin(days * 7.3 / period[2] + phase[2])
+        )
+        open_ = close * (1 + 0.002 * np.sin(days * 13.1 + phase[0]))
+        return pd.DataFrame(
+            {
+                "Open": open_,
+                "High": np.maximum(open_, close) * 1.005,
+                "Low": np.minimum(open_, close) * 0.995,
+                "Close": close,
+                "Volume": 5e5 * (1.5 + np.sin(days * 3.1 + phase[1])),
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            },
+            index=index,
+        )
+
+    def history(
+        self, ticker, start=None, end=None, interval="1d", period=None, timeout=None
+    ) -> pd.DataFrame:
+        self.requests += 1
+        time.sleep(self.latency)
+        if period is not None:
+            end = pd.Timestamp.today()
+            start = end - pd.Timedelta(days=365 * 5)
+        return self.bars(ticker, start, end, interval)
+
+    def download(self, tickers, start=None, end=None, interval="1d", timeout=None) -> dict:
+        self.requests += 1
+        time.sleep(self.batch_latency)
+        return {ticker: self.bars(ticker, start, end, interval) for ticker in tickers}
@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request once too many requests failed in a row."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` requests per second on average,
+    with bursts of up to `capacity` requests.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes one token, waiting for it if necessary. Returns the seconds waited."""
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+
+class RequestScheduler:
+    """
+    Sends provider requests for DataRetriever.
+
+    Every attempt takes a token from a bucket shared by all threads. Failed attempts
+    are retried up to `retries` times with exponential backoff and jitter. After
+    `failure_threshold` failures in a row the circuit opens and requests fail
+    immediately with CircuitOpenError. After `reset_timeout` seconds it half-opens:
+    one trial request is sent, which closes the circuit if it succeeds and opens it
+    again if it fails. With reset_timeout=None the circuit stays open for the rest of
+    the run. Call reset() at the start of a run.
+
+    stats() reports how long requests spent waiting (rate limit and backoff) versus
+    downloading.
+    """
+
+    def __init__(
+        self,
+        rate=5.0,
+        burst=10,
+        retries=3,
+        backoff=0.5,
+        max_backoff=30.0,
+        jitter=0.5,
+        failure_threshold=10,
+        reset_timeout=60.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._consecutive_failures = 0
+            self.circuit_open = False
+            self._opened_at = None
+            self._trial = False  # Whether the half-open trial request is in flight
+            self._stats = {
+                "requests": 0,
+                "retries": 0,
+                "failures": 0,
+                "rate_limit_wait": 0.0,
+                "backoff_wait": 0.0,
+                "download_time": 0.0,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._stats[name] += amount
+
+    def delay(self, attempt) -> float:
+        """Backoff before retry number `attempt` (0 based), with jitter."""
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return delay * random.uniform(1 - self.jitter, 1)
+
+    def _admit(self) -> bool:
+        """Raises CircuitOpenError unless a request may be sent, returns whether it is the trial."""
+
+        with self._lock:
+            if not self.circuit_open:
+                return False
+            if (
+                self.reset_timeout is not None
+                and not self._trial
+                and self.clock() - self._opened_at >= self.reset_timeout
+            ):
+                self._trial = True
+                return True
+        raise CircuitOpenError(
+            f"{self.failure_threshold} requests failed in a row, not sending more"
+        )
+
+    def call(self, fn, *args, **kwargs):
+        """Calls fn(*args, **kwargs) with rate limiting and retries, returns its result."""
+
+        for attempt in range(self.retries + 1):
+            trial = self._admit()
+            waited = self.bucket.acquire()
+            start = self.clock()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                self._count(
+                    requests=1,
+                    failures=1,
+                    rate_limit_wait=waited,
+                    download_time=self.clock() - start,
+                )
+                with self._lock:
+                    self._consecutive_failures += 1
+                    if trial or self._consecutive_failures >= self.failure_threshold:
+                        self.circuit_open = True
+                        self._opened_at = self.clock()
+                        self._trial = False
+                    circuit_open = self.circuit_open
+                if attempt == self.retries or circuit_open:
+                    raise
+                delay = self.delay(attempt)
+                self._count(retries=1, backoff_wait=delay)
+                self.sleep(delay)
+            else:
+                self._count(
+                    requests=1,
+                    rate_limit_wait=waited,
+                    download_time=self.clock() - start,
+                )
+                with self._lock:
+                    self._consecutive_failures = 0
+                    if trial:
+                        self.circuit_open = False
+                        self._trial = False
+                return result
@@ -0,0 +1,91 @@
+import time
+from functools import cached_property
+from types import MappingProxyType
+
+
+class Snapshot:
+    """
+    Immutable state of a run as published by the engine: the histories up to bar
+    `bar` (HistorySnapshot views, see utils/history.py), the price data and whether
+    the run is done. `run` counts the runs of the publisher, the histories of a run
+    only grow. Readers on other threads only ever see a complete snapshot.
+
+    The DataFrames are built on first access and shared by every reader of the
+    snapshot. `data` (ticker -> price frame) is a read-only copy of the engine's
+    dict taken when the snapshot was published, so frames the engine replaces later
+    do not show up in it; the frames themselves must not be modified.
+    """
+
+    def __init__(self, version, bar, data, histories: dict, done=False, run=0):
+        self.version = version
+        self.run = run
+        self.bar = bar  # Last bar processed, -1 before the first one
+        self.data = MappingProxyType(dict(data or {}))
+        self.histories = histories
+        self.done = done
+
+    @cached_property
+    def portfolio_history(self):
+        return self.histories["portfolio"].to_frame()
+
+    @cached_property
+    def action_history(self):
+        return self.histories["action"].to_frame()
+
+    @cached_property
+    def position_history(self):
+        return self.histories["position"].to_frame()
+
+    @cached_property
+    def performance_history(self):
+        return self.histories["performance"].to_frame()
+
+    def __repr__(self):
+        return f"Snapshot(version={self.version}, bar={self.bar}, done={self.done})"
+
+
+class SnapshotPublisher:
+    """
+    Hands snapshots from the backtest thread to the frontend callbacks.
+
+    The engine asks due(i) after each bar and publishes when `every` bars or
+    `interval_ms` milliseconds passed since the last snapshot (either one, None
+    turns it off). Publishing swaps a single reference, so readers need no lock:
+    `latest` is always a complete snapshot, and its version only changes when a
+    new one was published.
+    """
+
+    def __init__(self, every=100, interval_ms=None, clock=time.monotonic):
+        self.every = every
+        self.interval_ms = interval_ms
+        self.clock = clock
+        self.latest = None
+        self.run = 0
+        self._version = 0
+        self._bar = -1
+        self._time = clock()
+
+    @property
+    def version(self):
+        return self.latest.version if self.latest is not None else 0
+
+    def start_run(self):
+        """Called when the engine starts recording a new run."""
+        self.run += 1
+        self._bar = -1
+
+    def due(self, i) -> bool:
+        if self.every is not None and i - self._bar >= self.every:
+            return True
+        return (
+            self.interval_ms is not None
+            and (self.clock() - self._time) * 1000 >= self.interval_ms
+        )
+
+    def publish(self, bar, data, histories: dict, done=False) -> Snapshot:
+        self._version += 1
+        self._bar = bar
+        self._time = self.clock()
+        snapshot = Snapshot(self._version, bar, data, histories, done, self.run)
+        self.latest = snapshot
+        return snapshot
@@ -0,0 +1,226 @@
+import numpy as np
+
+
+STOP_TRIGGERS = ("close", "low")
+GAP_POLICIES = ("close", "stop", "level")
+
+
+class StopRule:
+    """
+    How stop losses behave once a position is bought with a stop `level`.
+
+    - trailing_pct: None keeps the level fixed. Otherwise the level rises to
+      peak * (1 - trailing_pct), the peak being the running maximum of the fill
+      price and the High (trigger="low") or Close (trigger="close") of the bars
+      after the one checked, so a bar never trails the stop it is checked against.
+    - trigger: "close" triggers on a Close at or below the level, "low" on a Low
+      at or below it.
+    - gap: fill price of a triggered stop. "close" fills at the bar's Close,
+      "level" at the level, "stop" at the level or the Open if the bar opened
+      below it (a gap through the stop).
+    """
+
+    def __init__(self, trailing_pct=None, trigger="close", gap="close"):
+        if trigger not in STOP_TRIGGERS:
+            raise ValueError(f"Unknown stop trigger {trigger}, use one of {', '.join(STOP_TRIGGERS)}")
+        if gap not in GAP_POLICIES:
+            raise ValueError(f"Unknown gap policy {gap}, use one of {', '.join(GAP_POLICIES)}")
+        self.trailing_pct = trailing_pct
+        self.trigger = trigger
+        self.gap = gap
+
+    @property
+    def trigger_field(self):
+        return "Low" if self.trigger == "low" else "Close"
+
+    @property
+    def peak_field(self):
+        return "High" if self.trigger == "low" else "Close"
+
+    def initial(self, level, price):
+        """Level right after a buy at `price` with the stop at `level`."""
+        if self.trailing_pct is None:
+            return level
+        return np.fmax(level, price * (1 - self.trailing_pct))
+
+    def fill(self, level, open_, close):
+        if self.gap == "close":
+            return close
+        if self.gap == "level":
+            return level
+        return np.where(open_ < level, open_, level)
+
+    def levels(self, level, reference, peaks) -> tuple:
+        """
+        Stop levels over a window of bars (axis 0) starting at a level and peak
+        reference: (level checked on each bar, level after each bar).
+        """
+
+        if self.trailing_pct is None:
+            level = np.broadcast_to(level, peaks.shape)
+            return level, level
+        with np.errstate(invalid="ignore"):
+            running = np.fmax.accumulate(
+                np.concatenate([np.broadcast_to(reference, (1,) + peaks.shape[1:]), peaks]), axis=0
+            )
+            trailed = np.fmax(level, running * (1 - self.trailing_pct))
+        return trailed[:-1], trailed[1:]
+
+    def __repr__(self):
+        return f"StopRule(trailing_pct={self.trailing_pct}, trigger={self.trigger}, gap={self.gap})"
+
+
+class StopBook:
+    """
+    The stops of every open position of a run, kept in arrays over the tickers of
+    a PricePanel so the engine checks and trails all of them with one array
+    operation per bar (check / trail), or searches whole runs of bars at once
+    (first_trigger / advance).
+    """
+
+    def __init__(self, rule: StopRule, panel, first_chunk=64):
+        n_tickers = len(panel.tickers)
+        self.rule = rule
+        self.ticker_index = panel.ticker_index
+        self.first_chunk = first_chunk
+        self.triggers = panel.field(rule.trigger_field)
+        self.peaks = panel.field(rule.peak_field)
+        self.opens = panel.field("Open") if rule.gap == "stop" else None
+        self.closes = panel.field("Close")
+        self.level = np.full(n_tickers, np.nan)  # NaN without an open position
+        self.reference = np.full(n_tickers, np.nan)  # Peak the trailing level follows
+        self.active = np.zeros(n_tickers, dtype=bool)
+
+    def set(self, ticker, level, price) -> float:
+        """Sets the stop of a ticker after a buy filled at `price`, returns the level."""
+        j = self.ticker_index[ticker]
+        self.level[j] = level = float(self.rule.initial(level, price))
+        self.reference[j] = price
+        self.active[j] = True
+        return level
+
+    def remove(self, ticker):
+        j = self.ticker_index[ticker]
+        self.active[j] = False
+        self.level[j] = np.nan  # Never triggers
+
+    def check(self, i) -> tuple:
+        """(mask of the tickers whose stop triggers on bar i, their fill prices)."""
+
+        triggered = self.triggers[i] <= self.level
+        if not triggered.any():
+            return triggered, None
+        opens = self.opens[i] if self.opens is not None else None
+        # A copy, the levels of the stopped positions are cleared when they are sold
+        return triggered, self.rule.fill(self.level.copy(), opens, self.closes[i])
+
+    def trail(self, i, skip=None) -> np.ndarray:
+        """
+        Trails the levels with bar i (not the tickers in the `skip` mask) and returns
+        the tickers whose level changed.
+        """
+
+        if self.rule.trailing_pct is None:
+            return np.empty(0, dtype=np.intp)
+        active = self.active if skip is None else self.active & ~skip
+        self.reference[active] = np.fmax(self.reference[active], self.peaks[i][active])
+        trailed = self.reference * (1 - self.rule.trailing_pct)
+        changed = np.flatnonzero(active & (trailed > self.level))
+        self.level[changed] = trailed[changed]
+        return changed
+
+    def first_trigger(self, start, end) -> int:
+        """The first bar in [start, end) on which an active stop triggers, else end."""
+
+        columns = np.flatnonzero(self.active)
+        if not columns.size:
+            return end
+        level, reference = self.level[columns], self.reference[columns]
+        size = self.first_chunk
+        while start < end:
+            stop = min(start + size, end)
+            peaks = self.peaks[start:stop, columns]
+            checked, after = self.rule.levels(level, reference, peaks)
+            with np.errstate(invalid="ignore"):
+                hits = (self.triggers[start:stop, columns] <= checked).any(axis=1)
+            if hits.any():
+                return start + int(hits.argmax())
+            level = after[-1]
+            if self.rule.trailing_pct is not None:
+                reference = np.fmax(reference, np.nanmax(peaks, axis=0, initial=-np.inf))
+            start, size = stop, size * 2
+        return end
+
+    def advance(self, start, end) -> np.ndarray:
+        """
+        Trails the active stops over bars [start, end) on which none triggers and
+        returns the (bars x tickers) levels after each bar, NaN for inactive tickers.
+        """
+
+        levels = np.full((end - start, len(self.level)), np.nan)
+        columns = np.flatnonzero(self.active)
+        if not columns.size:
+            return levels
+        peaks = self.peaks[start:end, columns]
+        _, after = self.rule.levels(self.level[columns], self.reference[columns], peaks)
+        levels[:, columns] = after
+        self.level[columns] = after[-1]
+        if self.rule.trailing_pct is not None:
+            self.reference[columns] = np.fmax(
+                self.reference[columns], np.nanmax(peaks, axis=0, initial=-np.inf)
+            )
+        return levels
+
+
+def first_stops(rule: StopRule, level, reference, starts, ends, columns, triggers, peaks, first_chunk=16) -> tuple:
+    """
+    Searches many holding periods at once. Period k holds the bars starts[k] + 1 ..
+    ends[k] of column columns[k] of the (bars x tickers) triggers / peaks, after a buy
+    that set the stop at level[k] with the peak reference[k]. All periods are searched
+    together in chunks of bars that double in size, like StopBook.first_trigger.
+
+    Returns (bar of each period's first trigger, -1 for none, the level checked on it,
+    and (rows, columns, levels) of the levels after the searched bars up to the trigger,
+    where the triggering bar gets its checked level).
+    """
+
+    starts, ends, columns = np.asarray(starts), np.asarray(ends), np.asarray(columns)
+    hits = np.full(len(starts), -1, dtype=np.intp)
+    checked_levels = np.full(len(starts), np.nan)
+    written = ([np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)], [np.empty(0)])
+    active = np.arange(len(starts))
+    level = np.asarray(level, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    last_row = triggers.shape[0] - 1
+    offset, size = 1, first_chunk
+    while active.size:
+        steps = np.arange(size)[:, None]
+        rows = starts[active] + offset + steps
+        valid = rows <= ends[active]
+        rows = np.minimum(rows, last_row)
+        cols = np.broadcast_to(columns[active], rows.shape)
+        with np.errstate(invalid="ignore"):
+            chunk_peaks = np.where(valid, peaks[rows, cols], np.nan)
+            checked, after = rule.levels(level, reference, chunk_peaks)
+            triggered = valid & (triggers[rows, cols] <= checked)
+
+        found = triggered.any(axis=0)
+        first = np.where(found, triggered.argmax(axis=0), size)
+        kept = valid & (steps <= first)
+        written[0].append(rows[kept])
+        written[1].append(cols[kept])
+        written[2].append(np.where(steps == first, checked, after)[kept])
+        hit = active[found]
+        hits[hit] = rows[first[found], np.flatnonzero(found)]
+        checked_levels[hit] = checked[first[found], np.flatnonzero(found)]
+
+        # Periods without a trigger yet that hold more bars go on with the next chunk
+        going = ~found & (starts[active] + offset + size <= ends[active])
+        level = after[-1, going]
+        reference = reference[going]
+        if rule.trailing_pct is not None:
+            reference = np.fmax(reference, np.fmax.reduce(chunk_peaks[:, going], axis=0))
+        active = active[going]
+        offset, size = offset + size, size * 2
+
+    return hits, checked_levels, tuple(np.concatenate(values) for values in written)
@@ -0,0 +1,156 @@
+import math
+
+import numpy as np
+
+
+class RollingWindow:
+    """
+    Fixed size ring buffer with running sums, for O(1) rolling mean and standard
+    deviation (ddof=1, like pandas). Both are NaN until `window` values were added
+    or while a NaN is inside the window.
+    """
+
+    __slots__ = ("window", "buffer", "pos", "count", "nans", "nonzero", "mean_", "m2")
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = np.zeros(window)
+        self.pos = 0
+        self.count = 0
+        self.nans = 0
+        self.nonzero = 0  # A window of zeros has exactly mean 0, without rounding residue
+        # Welford mean and sum of squared deviations of the non-NaN values in the window
+        self.mean_ = 0.0
+        self.m2 = 0.0
+
+    def _add(self, x):
+        if math.isnan(x):
+            self.nans += 1
+            return
+        self.nonzero += x != 0
+        n = self.count - self.nans
+        delta = x - self.mean_
+        self.mean_ += delta / n
+        self.m2 += delta * (x - self.mean_)
+
+    def _remove(self, x):
+        if math.isnan(x):
+            self.nans -= 1
+            return
+        self.nonzero -= x != 0
+        n = self.count - self.nans
+        if n == 0:
+            self.mean_ = self.m2 = 0.0
+            return
+        delta = x - self.mean_
+        self.mean_ -= delta / n
+        self.m2 = max(self.m2 - delta * (x - self.mean_), 0.0)
+
+    def push(self, x):
+        x = float(x)
+        if self.count == self.window:
+            old = self.buffer[self.pos]
+            self.count -= 1
+            self._remove(old)
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        self.count += 1
+        self._add(x)
+
+    def ready(self) -> bool:
+        return self.count == self.window and self.nans == 0
+
+    def mean(self) -> float:
+        if not self.ready():
+            return math.nan
+        return self.mean_ if self.nonzero else 0.0
+
+    def std(self) -> float:
+        if not self.ready() or self.window < 2:
+            return math.nan
+        return math.sqrt(self.m2 / (self.window - 1)) if self.nonzero else 0.0
+
+
+class RollingMean(RollingWindow):
+    __slots__ = ()
+
+    def update(self, x) -> float:
+        self.push(x)
+        return self.mean()
+
+
+class EWM:
+    """Recursive exponential moving average, like pandas ewm(span, adjust=False).mean()."""
+
+    __slots__ = ("alpha", "value", "weight")
+
+    def __init__(self, span):
+        self.alpha = 2 / (span + 1)
+        self.value = math.nan
+        self.weight = 1.0  # Weight of value, decays over NaNs like in pandas
+
+    def update(self, x) -> float:
+        x = float(x)
+        if math.isnan(self.value):
+            self.value = x
+            return self.value
+        self.weight *= 1 - self.alpha
+        if not math.isnan(x):
+            if x != self.value:
+                self.value = (self.weight * self.value + self.alpha * x) / (self.weight + self.alpha)
+            self.weight = 1.0
+        return self.value
+
+
+class Diff:
+    """x - previous x, NaN on the first value."""
+
+    __slots__ = ("previous",)
+
+    def __init__(self):
+        self.previous = math.nan
+
+    def update(self, x) -> float:
+        x = float(x)
+        delta = x - self.previous
+        self.previous = x
+        return delta
+
+
+class IndicatorStream:
+    """
+    Streaming state of one indicator on one ticker, see Indicator.stream().
+    update(bar) takes the next bar (anything indexable by column name) and returns
+    column -> value for that bar.
+    """
+
+    __slots__ = ("update",)
+
+    def __init__(self, update):
+        self.update = update
+
+
+class IndicatorFeed:
+    """
+    Feeds bars through the streaming form of a set of indicators, one stream per
+    (ticker, indicator), and writes the values into the indicator fields of the bar.
+    Used by Backtest.run_backtest with stream_indicators=True instead of computing
+    the columns up front.
+    """
+
+    def __init__(self, indicators, tickers, field_index: dict):
+        self.indicators = list(indicators)
+        self.streams = [
+            [indicator.stream() for indicator in self.indicators] for _ in tickers
+        ]
+        self.fields = [
+            [(column, field_index[column]) for column in indicator.columns]
+            for indicator in self.indicators
+        ]
+
+    def update(self, j, bar, values: np.ndarray):
+        """Feeds `bar` of the j-th ticker and stores the results in `values` (the bar's array)."""
+        for stream, fields in zip(self.streams[j], self.fields):
+            outputs = stream.update(bar)
+            for column, f in fields:
+                values[f] = outputs[column]
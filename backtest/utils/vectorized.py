@@ -0,0 +1,426 @@
+import numpy as np
+
+from backtest.utils.stops import StopRule, first_stops
+
+
+# Rows simulated at once after a skipped buy, doubled while no buy is skipped
+REJECTION_WINDOW = 64
+# Buys skipped this close together switch to bar by bar steps (see step_bars)
+STEPPING_GAP = 16
+
+
+def simulate_targets(
+    close,
+    targets,
+    initial_capital,
+    commission=0.0,
+    slippage=0.0,
+    stop_loss_pct=None,
+    stop_rule=None,
+    prices=None,
+) -> dict:
+    """
+    Simulates target position sizes over a whole (dates x tickers) close matrix.
+
+    The result matches the event loop running a strategy that buys or sells the
+    difference to its target on every bar:
+    - stop losses are checked on the close before the bar's order, and a stopped
+      position is bought back on the same bar while the target stays positive,
+    - buys are filled at close + slippage and set the stop to fill * (1 - stop_loss_pct),
+      sells are filled at close - slippage, stops at their fill price - slippage,
+    - buys the available cash can not cover are skipped and retried on the next bar.
+
+    Cash, commission and equity are computed with array operations over the date
+    axis, and the holding periods of all tickers are searched for their stops at once
+    (VectorStops). A skipped buy changes everything after it, so the run is then
+    continued in growing windows from that bar, or bar by bar with the tickers in
+    arrays while buys keep being skipped (step_bars). The Python work scales with the
+    number of bars with skipped buys, not the number of bars or trades.
+
+    stop_rule (utils/stops.StopRule) sets the trailing, trigger and gap policy of the
+    stops, by default fixed stops triggered and filled on the close. Rules reading
+    other fields get them from `prices` (field -> dates x tickers array).
+
+    Returns a dict of arrays, see the keys at the end of the function.
+    """
+
+    close = np.asarray(close, dtype=np.float64)
+    n_bars, n_tickers = close.shape
+    requested = np.clip(np.nan_to_num(np.asarray(targets, dtype=np.float64)), 0, None)
+
+    # Same operation order as execute_order so the fills match bit for bit
+    buy_price = close + close * slippage
+    sell_price = close - close * slippage
+
+    sizes = requested.copy()
+    stops = VectorStops(stop_rule or StopRule(), stop_loss_pct, close, buy_price, prices)
+    stopped = stops.find(sizes)
+    stops_valid = np.full(n_tickers, n_bars)
+    cash = np.empty((n_bars, n_tickers, 2))
+
+    start, end = 0, n_bars
+    last_skip = -n_bars  # Last bar with a skipped buy
+    stepping = False
+    while start < n_bars:
+        if stepping:
+            # Buys keep being skipped, go bar by bar until they stop
+            stops.start_state(sizes, stopped, start)
+            start, last_skip = step_bars(
+                stops, sizes, stopped, cash, initial_capital, start,
+                buy_price, sell_price, commission, slippage,
+            )
+            stops_valid[:] = start
+            stepping = False
+            end = min(n_bars, start + REJECTION_WINDOW)
+            continue
+
+        stale = np.flatnonzero(stops_valid < end)
+        if stale.size:
+            stops.refresh(sizes, stopped, stale, stops_valid[stale], end)
+            stops_valid[stale] = end
+
+        rows = slice(start, end)
+        previous = shift_down(sizes, start, end)
+        before_order = np.where(stopped[rows], 0.0, previous)
+        delta = sizes[rows] - before_order
+        flows = order_flows(
+            previous, stopped[rows], stops.fills[rows], delta, buy_price[rows], sell_price[rows],
+            commission, slippage,
+        )
+        opening_cash = cash[start - 1, -1, 1] if start else initial_capital
+        cash[rows] = running_cash(opening_cash, flows)
+
+        rejected = (delta > 0) & (cash[rows][..., 0] < buy_price[rows] * delta)
+        if rejected.any():
+            # Only the bar of the first skipped buy is certain, everything after it
+            # depends on it. Its stops are settled, so the bar itself is finished.
+            t = int(np.argmax(rejected.any(axis=1)))
+            bar = start + t
+            opening_cash = cash[bar - 1, -1, 1] if bar else initial_capital
+            cash[bar], skipped = settle_bar(opening_cash, flows[t], delta[t], buy_price[bar])
+            sizes[bar, skipped] = before_order[t, skipped]
+            stops_valid[skipped] = bar + 1
+            stepping = bar - last_skip <= STEPPING_GAP
+            start, last_skip = bar + 1, bar
+            end = min(n_bars, start + REJECTION_WINDOW)
+        else:
+            start, end = end, min(n_bars, end + 2 * (end - start))
+
+    previous = shift_down(sizes, 0, n_bars)
+    before_order = np.where(stopped, 0.0, previous)
+    bought = sizes > before_order
+    entry_price = forward_fill(np.where(bought, buy_price, np.nan))
+    stop_rule = stops.rule
+    # Levels only count on bars entered with a position, flat bars keep the last one
+    levels = np.where(previous > 0, stops.levels, np.nan)
+    stop_loss = (
+        forward_fill(
+            np.where(bought, stop_rule.initial(buy_price * (1 - stop_loss_pct), buy_price), levels)
+        )
+        if stop_loss_pct is not None
+        else np.full_like(entry_price, np.nan)
+    )
+
+    value = np.zeros(n_bars)
+    for n in range(n_tickers):
+        value += sizes[:, n] * close[:, n]
+    cash_end = cash[:, -1, 1]
+
+    return {
+        "size": sizes,
+        "previous_size": previous,
+        "stopped": stopped,
+        "executed": sizes - before_order,
+        "attempted": requested - before_order,
+        "entry_price": entry_price,
+        "stop_loss": stop_loss,
+        "buy_price": buy_price,
+        "sell_price": sell_price,
+        "stop_fill": stops.fills,
+        "stop_price": stops.fills - stops.fills * slippage,
+        "cash": cash_end,
+        "equity": cash_end + value,
+    }
+
+
+def shift_down(values, start, end) -> np.ndarray:
+    """Returns values[start - 1 : end - 1], with a row of zeros before the first row."""
+
+    if start:
+        return values[start - 1 : end - 1]
+    return np.vstack([np.zeros((1, values.shape[1])), values[: end - 1]])
+
+
+def order_flows(previous, stopped, stop_fill, delta, buy_price, sell_price, commission, slippage):
+    """
+    Cash flows of bars (any leading shape x tickers x 2): the stop loss sale before
+    the order, then the order, with the operations of execute_order.
+    """
+
+    flows = np.empty(delta.shape + (2,))
+    stop_price = stop_fill - stop_fill * slippage
+    flows[..., 0] = np.where(stopped, previous * stop_price * (1 - commission), 0.0)
+    flows[..., 1] = np.where(
+        delta > 0,
+        -(buy_price * delta * (1 + commission)),
+        -delta * sell_price * (1 - commission),
+    )
+    return flows
+
+
+def running_cash(opening_cash, flows) -> np.ndarray:
+    """Cash after each flow, added one at a time in ticker order like the event loop."""
+    return np.cumsum(np.concatenate([[opening_cash], flows.reshape(-1)]))[1:].reshape(flows.shape)
+
+
+def settle_bar(opening_cash, flows, delta, buy_price) -> tuple:
+    """
+    Cash of one bar (tickers x 2) from its flows, skipping the buys the cash does not
+    cover ticker by ticker: a skipped buy leaves more cash for the tickers after it.
+    The delta and order flow of skipped buys are zeroed in place. Returns the cash
+    and the mask of the skipped buys.
+    """
+
+    skipped = np.zeros(len(delta), dtype=bool)
+    while True:
+        cash = running_cash(opening_cash, flows)
+        rejected = (delta > 0) & (cash[:, 0] < buy_price * delta)
+        if not rejected.any():
+            return cash, skipped
+        n = int(np.argmax(rejected))
+        skipped[n] = True
+        delta[n] = 0.0
+        flows[n, 1] = 0.0
+
+
+def step_bars(
+    stops, sizes, stopped, cash, initial_capital, start, buy_price, sell_price, commission, slippage
+) -> int:
+    """
+    Simulates the bars from `start` one at a time with the tickers in arrays and the
+    stops as running state (VectorStops.start_state / step), which is cheaper than
+    windows while buys keep being skipped. Stops once no buy was skipped for
+    REJECTION_WINDOW bars. Returns (the next bar to simulate, the last bar with a
+    skipped buy).
+    """
+
+    n_bars, n_tickers = sizes.shape
+    previous = sizes[start - 1] if start else np.zeros(n_tickers)
+    opening_cash = cash[start - 1, -1, 1] if start else initial_capital
+    last_skip = start - 1
+    for bar in range(start, n_bars):
+        triggered = stops.step(bar, previous > 0, stopped)
+        before_order = np.where(triggered, 0.0, previous)
+        delta = sizes[bar] - before_order
+        flows = order_flows(
+            previous, triggered, stops.fills[bar], delta, buy_price[bar], sell_price[bar],
+            commission, slippage,
+        )
+        cash[bar], skipped = settle_bar(opening_cash, flows, delta, buy_price[bar])
+        if skipped.any():
+            sizes[bar, skipped] = before_order[skipped]
+            last_skip = bar
+        stops.bought(bar, sizes[bar] > before_order)
+        previous, opening_cash = sizes[bar], cash[bar, -1, 1]
+        if bar - last_skip >= REJECTION_WINDOW:
+            return bar + 1, last_skip
+    return n_bars, last_skip
+
+
+class VectorStops:
+    """
+    Stop loss triggers of simulate_targets. The bars after a buy, up to the next buy or
+    until the position is sold, are one holding period with its own stop level, and the
+    periods of all tickers are searched at once (utils/stops.first_stops). A stop that
+    is bought back on the same bar opens a new period, searched in the next round.
+    Besides the trigger mask it fills `fills` (the fill price on trigger bars) and
+    `levels` (the stop level after each held bar, NaN elsewhere).
+    """
+
+    def __init__(self, rule: StopRule, stop_loss_pct, close, buy_price, prices=None):
+        prices = dict(prices or {})
+        prices["Close"] = close
+        self.rule = rule
+        self.stop_loss_pct = stop_loss_pct
+        self.close = close
+        self.buy_price = buy_price
+        self.triggers = prices[rule.trigger_field]
+        self.peaks = prices[rule.peak_field]
+        self.opens = prices["Open"] if rule.gap == "stop" else None
+        self.fills = close.copy()
+        self.levels = np.full(close.shape, np.nan)
+
+    def find(self, sizes) -> np.ndarray:
+        """Returns a (dates x tickers) mask of the bars on which the stop loss triggers."""
+
+        stopped = np.zeros(sizes.shape, dtype=bool)
+        if self.stop_loss_pct is None:
+            return stopped
+        n_tickers = sizes.shape[1]
+        self.search(
+            sizes,
+            stopped,
+            np.arange(n_tickers),
+            np.zeros(n_tickers, dtype=np.intp),
+            np.full(n_tickers, -1),
+            sizes.shape[0],
+        )
+        return stopped
+
+    def refresh(self, sizes, stopped, columns, starts, end):
+        """
+        Recomputes the stops of the tickers in `columns` on the bars from their `starts`
+        to `end` after their sizes changed, starting at the last buy before the start,
+        which set the stop level.
+        """
+
+        if self.stop_loss_pct is None:
+            return
+        anchors = np.array(
+            [last_buy(sizes[:, n], stopped[:, n], start) for n, start in zip(columns, starts)],
+            dtype=np.intp,
+        )
+        self.search(sizes, stopped, columns, starts, anchors, end)
+
+    def start_state(self, sizes, stopped, bar):
+        """Sets the running stop level and peak of the tickers held into `bar`, for step()."""
+
+        n_tickers = sizes.shape[1]
+        self.level = np.full(n_tickers, np.nan)
+        self.reference = np.full(n_tickers, np.nan)
+        if self.stop_loss_pct is None or not bar:
+            return
+        for n in np.flatnonzero(sizes[bar - 1] > 0):
+            anchor = last_buy(sizes[:, n], stopped[:, n], bar)
+            fill = self.buy_price[anchor, n]
+            level = self.rule.initial(fill * (1 - self.stop_loss_pct), fill)
+            self.level[n] = level
+            self.reference[n] = fill
+            if self.rule.trailing_pct is not None:
+                self.reference[n] = np.fmax.reduce(np.r_[fill, self.peaks[anchor + 1 : bar, n]])
+                self.level[n] = np.fmax(level, self.reference[n] * (1 - self.rule.trailing_pct))
+
+    def step(self, bar, held, stopped) -> np.ndarray:
+        """
+        Checks, then trails the running stops of the `held` tickers on one bar, like
+        StopBook.check / trail, and writes the bar's triggers, fills and levels.
+        Returns the trigger mask.
+        """
+
+        if self.stop_loss_pct is None:
+            return stopped[bar]
+        level = self.level
+        with np.errstate(invalid="ignore"):
+            triggered = held & (self.triggers[bar] <= level)
+        stopped[bar] = triggered
+        self.fills[bar] = self.close[bar]
+        if triggered.any():
+            opens = self.opens[bar, triggered] if self.opens is not None else None
+            self.fills[bar, triggered] = self.rule.fill(
+                level[triggered], opens, self.close[bar, triggered]
+            )
+        if self.rule.trailing_pct is not None:
+            trailed = held & ~triggered
+            self.reference[trailed] = np.fmax(self.reference[trailed], self.peaks[bar, trailed])
+            level[trailed] = np.fmax(
+                level[trailed], self.reference[trailed] * (1 - self.rule.trailing_pct)
+            )
+        self.levels[bar] = np.where(held, level, np.nan)
+        return triggered
+
+    def bought(self, bar, mask):
+        """Sets the running stops of the tickers that bought on `bar`."""
+
+        if self.stop_loss_pct is None or not mask.any():
+            return
+        fill = self.buy_price[bar, mask]
+        self.level[mask] = self.rule.initial(fill * (1 - self.stop_loss_pct), fill)
+        self.reference[mask] = fill
+
+    def search(self, sizes, stopped, columns, starts, anchors, end):
+        """
+        Clears and searches the stops of the tickers in `columns` up to bar `end`: from
+        their anchor, the buy whose period is still open, or from `starts` where the
+        anchor is -1 (nothing held).
+        """
+
+        held = anchors >= 0
+        first = np.where(held, anchors + 1, starts)
+        lo = int(np.where(held, anchors, starts).min(initial=end))
+        if lo >= end:
+            return
+        rows = np.arange(lo, end)[:, None]
+        size = sizes[lo:end, columns]
+        previous = (
+            sizes[lo - 1 : end - 1, columns]
+            if lo
+            else np.vstack([np.zeros((1, len(columns))), sizes[: end - 1, columns]])
+        )
+
+        # The bars from `first` on are searched again
+        cleared = rows >= first
+        stopped[lo:end, columns] &= ~cleared
+        self.levels[lo:end, columns] = np.where(cleared, np.nan, self.levels[lo:end, columns])
+        self.fills[lo:end, columns] = np.where(
+            cleared, self.close[lo:end, columns], self.fills[lo:end, columns]
+        )
+
+        increases = size > previous
+        # A period is held until the next buy (checked before its order), or until the
+        # bar on which the target drops to 0
+        last = np.minimum(next_after(increases, lo, end), next_after(size <= 0, lo, end))
+        last = np.minimum(last, end - 1)
+
+        t, k = np.nonzero((increases & cleared) | (rows == anchors))
+        t += lo
+        while t.size:
+            n = columns[k]
+            fill = self.buy_price[t, n]
+            level = self.rule.initial(fill * (1 - self.stop_loss_pct), fill)
+            hits, checked, (level_rows, level_columns, levels) = first_stops(
+                self.rule, level, fill, t, last[t - lo, k], n, self.triggers, self.peaks
+            )
+            self.levels[level_rows, level_columns] = levels
+
+            found = hits >= 0
+            t, k, n = hits[found], k[found], n[found]
+            stopped[t, n] = True
+            self.fills[t, n] = self.rule.fill(
+                checked[found], self.opens[t, n] if self.opens is not None else None, self.close[t, n]
+            )
+            # Bought back on the same bar: a new period, unless that bar buys more anyway
+            again = (sizes[t, n] > 0) & ~increases[t - lo, k]
+            t, k = t[again], k[again]
+
+
+def last_buy(size, stopped, start) -> int:
+    """The last bar before `start` on which a ticker with these sizes bought, -1 for none."""
+
+    chunk = REJECTION_WINDOW
+    while start > 0:
+        begin = max(start - chunk, 0)
+        previous = size[begin - 1 : start - 1] if begin else np.r_[0.0, size[: start - 1]]
+        bought = np.flatnonzero(size[begin:start] > np.where(stopped[begin:start], 0.0, previous))
+        if bought.size:
+            return begin + int(bought[-1])
+        start, chunk = begin, chunk * 2
+    return -1
+
+
+def next_after(mask, lo, end) -> np.ndarray:
+    """For every row lo..end-1 of a mask, the next later row where it is set, else `end`."""
+
+    bars = np.where(mask, np.arange(lo, end)[:, None], end)
+    following = np.minimum.accumulate(bars[::-1], axis=0)[::-1]
+    return np.vstack([following[1:], np.full((1, mask.shape[1]), end)])
+
+
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Forward fills NaNs down the first axis of a 2D array."""
+
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(values.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = np.take_along_axis(values, rows, axis=0)
+    filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+    return filled
@@ -12,6 +12,9 @@ setup(
         "tinycss2 == 1.4.0",
         "yfinance == 0.2.52",
     ],
+    extras_require={
+        "cache": ["pyarrow"],  # Parquet files for the local OHLCV cache
+    },
     author="Carlo Teufel",
     description="A comprehensive backtesting framework for financial trading strategies with interactive dashboard",
     long_description=open("README.md").read(),  # Ensure you have a README.md file
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.core.action_base import Action
+from backtest.core.strategy_base import Strategy
+from backtest.utils.dataretriever import DataRetriever
+
+
+def synthetic_prices(ticker, n_bars=300) -> pd.DataFrame:
+    """Random walk OHLCV bars, the same for a ticker on every call."""
+
+    rng = np.random.default_rng(sum(map(ord, ticker)))
+    index = pd.date_range("2020-01-01", periods=n_bars, freq="D", tz="America/New_York")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars)))
+    open_ = close * (1 + rng.normal(0, 0.005, n_bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n_bars)))
+    volume = rng.integers(100_000, 1_000_000, n_bars).astype(float)
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+@pytest.fixture
+def prices(monkeypatch):
+    """Serves synthetic_prices instead of downloading; records the tickers requested."""
+
+    requested = []
+
+    def get_ticker_data(self, ticker):
+        requested.append(ticker)
+        return synthetic_prices(ticker)
+
+    monkeypatch.setattr(DataRetriever, "get_ticker_data", get_ticker_data)
+    monkeypatch.setattr(DataRetriever, "needs_download", lambda self, ticker: False)
+    return requested
+
+
+class Threshold(Strategy):
+    """Holds `amount` while the close is above its SMA, in both run modes."""
+
+    def __init__(self, window=20, amount=1):
+        self.window = window
+        self.amount = amount
+        self.column = f"SMA{window}"
+        self.indicators = [("SMA", {"window": window})]
+
+    def get_action(self, row, ticker, positions):
+        close, sma = row["Close"], row[self.column]
+        if not positions[ticker].is_open() and close > sma:
+            return Action("buy", self.amount, None)
+        if positions[ticker].is_open() and close < sma:
+            return Action("sell", positions[ticker].size, None)
+        return Action("None", 0, None)
+
+    def generate_signals(self, data):
+        return {
+            ticker: (frame["Close"] > frame[self.column]).astype(float) * self.amount
+            for ticker, frame in data.items()
+        }
+
+
+class BatchThreshold(Threshold):
+    """Threshold through get_actions, one call per date."""
+
+    def get_actions(self, date, cross_section, positions):
+        close, sma = cross_section["Close"], cross_section[self.column]
+        orders = {}
+        for j, ticker in enumerate(cross_section.tickers):
+            if not positions[ticker].is_open() and close[j] > sma[j]:
+                orders[ticker] = Action("buy", self.amount, None)
+            elif positions[ticker].is_open() and close[j] < sma[j]:
+                orders[ticker] = Action("sell", positions[ticker].size, None)
+        return orders
+
+
+class Targets(Strategy):
+    """Trades to a target size of 0-3 derived from each bar's close, changing often."""
+
+    indicators = []
+
+    @staticmethod
+    def target(close):
+        return np.floor(np.asarray(close) * 7) % 4
+
+    def get_action(self, row, ticker, positions):
+        target, size = self.target(row["Close"]), positions[ticker].size
+        if target > size:
+            return Action("buy", target - size, None)
+        if target < size:
+            return Action("sell", size - target, None)
+        return Action("None", 0, None)
+
+    def generate_signals(self, data):
+        return {ticker: self.target(frame["Close"]) for ticker, frame in data.items()}
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.backtest import Backtest
+from backtest.core.action_base import Action
+
+from conftest import BatchThreshold, Threshold
+
+TICKERS = ["AAA", "BBB", "CCC", "DDD", "EEE"]
+
+
+def run(strategy, **settings):
+    backtest = Backtest(interval="1d", commission=0.001, **settings)
+    backtest.run(strategy, TICKERS, start_visualizer=False)
+    return backtest
+
+
+@pytest.mark.parametrize("capital", [150, 400, 1e6])
+@pytest.mark.parametrize("trailing", [None, 0.02])
+@pytest.mark.parametrize("amount", [1, 3])
+def test_batched_matches_per_ticker(prices, capital, trailing, amount):
+    settings = dict(initial_capital=capital, stop_loss_pct=0.01, trailing_stop_pct=trailing)
+    per_ticker = run(Threshold(20, amount), **settings)
+    batched = run(BatchThreshold(20, amount), **settings)
+
+    pd.testing.assert_frame_equal(batched.portfolio_history, per_ticker.portfolio_history)
+    pd.testing.assert_frame_equal(batched.action_history, per_ticker.action_history)
+    pd.testing.assert_frame_equal(batched.position_history, per_ticker.position_history)
+    assert np.isclose(batched.capital, per_ticker.capital)
+
+
+class Sparse(BatchThreshold):
+    """BatchThreshold that also names some tickers it leaves alone, and unknown ones."""
+
+    def get_actions(self, date, cross_section, positions):
+        orders = super().get_actions(date, cross_section, positions)
+        orders.setdefault("BBB", Action("None", 0, None))
+        orders["XXX"] = Action("buy", 1, None)
+        return orders
+
+
+@pytest.mark.parametrize("record_noops", [True, False])
+def test_sparse_orders_match_per_ticker(prices, record_noops):
+    settings = dict(initial_capital=400, stop_loss_pct=0.01, trailing_stop_pct=0.02, record_noops=record_noops)
+    per_ticker = run(Threshold(20, 2), **settings)
+    batched = run(Sparse(20, 2), **settings)
+
+    pd.testing.assert_frame_equal(batched.portfolio_history, per_ticker.portfolio_history)
+    pd.testing.assert_frame_equal(batched.action_history, per_ticker.action_history)
+    pd.testing.assert_frame_equal(batched.position_history, per_ticker.position_history)
+    if not record_noops:
+        assert (batched.action_history["Type"] != "None").all()
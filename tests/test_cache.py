@@ -0,0 +1,129 @@
+import itertools
+import os
+
+import pandas as pd
+import pytest
+
+import backtest.utils.cache as cache_module
+from backtest.utils.cache import OHLCVCache
+from backtest.utils.dataretriever import DataRetriever
+from backtest.utils.providers import FakeProvider
+
+
+class RecordingProvider(FakeProvider):
+    """FakeProvider that records the start of every history request."""
+
+    def __init__(self):
+        super().__init__()
+        self.starts = []
+
+    def history(self, ticker, start=None, end=None, **kwargs):
+        self.starts.append(pd.Timestamp(start))
+        return super().history(ticker, start=start, end=end, **kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the cache's clock with one that ticks one second per reading."""
+
+    ticks = itertools.count(1_000_000)
+
+    class Clock:
+        @staticmethod
+        def time():
+            return float(next(ticks))
+
+    monkeypatch.setattr(cache_module, "time", Clock)
+
+
+def retriever(directory, provider, end="2022-03-01", **kwargs):
+    cache = OHLCVCache(str(directory), **kwargs)
+    return DataRetriever(
+        start_date="2022-01-01", end_date=end, interval="1d", cache=cache, provider=provider
+    )
+
+
+def frame(n_bars=100):
+    index = pd.date_range("2022-01-01", periods=n_bars, freq="D")
+    return pd.DataFrame({"Close": range(n_bars)}, index=index, dtype=float)
+
+
+def test_refresh_only_fetches_the_new_bars(tmp_path):
+    provider = RecordingProvider()
+    first = retriever(tmp_path, provider, refresh_after=None).get_data("AAA", SP500=False)
+    assert provider.starts == [pd.Timestamp("2022-01-01")]
+
+    later = retriever(tmp_path, provider, end="2022-04-01", refresh_after=None)
+    data = later.get_data("AAA", SP500=False)["AAA"]
+    # From the last cached bar on, which is fetched again
+    assert provider.starts[1] == first["AAA"].index[-1].tz_localize(None)
+    expected = FakeProvider().history("AAA", start="2022-01-01", end="2022-04-01")
+    pd.testing.assert_frame_equal(data, expected, check_freq=False)
+
+
+def test_fresh_entries_are_served_without_requests(tmp_path):
+    provider = RecordingProvider()
+    retriever(tmp_path, provider).get_data("AAA", SP500=False)
+    retriever(tmp_path, provider).get_data("AAA", SP500=False)
+    assert provider.requests == 1
+
+
+def test_offline_mode_only_reads_the_cache(tmp_path):
+    online = retriever(tmp_path, RecordingProvider())
+    expected = online.get_data("AAA", SP500=False)["AAA"]
+
+    provider = RecordingProvider()
+    offline = DataRetriever(
+        start_date="2022-01-01",
+        end_date="2022-03-01",
+        interval="1d",
+        cache=OHLCVCache(str(tmp_path)),
+        provider=provider,
+        offline=True,
+    )
+    data = offline.get_data(["AAA", "BBB"], SP500=False)
+    assert provider.requests == 0
+    pd.testing.assert_frame_equal(data["AAA"], expected, check_freq=False)
+    assert "not cached" in offline.failed_tickers["BBB"]
+
+    with pytest.raises(ValueError):
+        DataRetriever(start_date="2022-01-01", end_date="2022-03-01", offline=True)
+
+
+def test_evicts_the_least_recently_read_entries(tmp_path, clock):
+    cache = OHLCVCache(str(tmp_path), max_bytes=None)
+    for ticker in ("AAA", "BBB", "CCC"):
+        cache.store(ticker, "1d", frame())
+    cache.load("AAA", "1d")
+
+    cache.max_bytes = cache.size()
+    cache.store("DDD", "1d", frame())
+    assert cache.entry("BBB", "1d") is None
+    assert not os.path.exists(cache.path("BBB", "1d"))
+    for ticker in ("AAA", "CCC", "DDD"):
+        assert cache.load(ticker, "1d") is not None
+
+
+def test_reads_do_not_write_the_index(tmp_path, clock):
+    cache = OHLCVCache(str(tmp_path))
+    cache.store("AAA", "1d", frame())
+    index = os.path.join(str(tmp_path), OHLCVCache.INDEX_FILE)
+    written = os.stat(index).st_mtime_ns, open(index).read()
+
+    cache.load("AAA", "1d")
+    assert (os.stat(index).st_mtime_ns, open(index).read()) == written
+
+    cache.flush()
+    assert OHLCVCache(str(tmp_path)).entry("AAA", "1d")["accessed"] > cache.entry("AAA", "1d")["fetched"]
+
+
+def test_instances_sharing_a_directory_keep_each_others_entries(tmp_path, clock):
+    first, second = OHLCVCache(str(tmp_path)), OHLCVCache(str(tmp_path))
+    first.store("AAA", "1d", frame())
+    second.store("BBB", "1d", frame())
+    first.invalidate("AAA", "1d")
+
+    reopened = OHLCVCache(str(tmp_path))
+    assert reopened.entry("AAA", "1d") is None
+    assert reopened.load("BBB", "1d") is not None
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
@@ -0,0 +1,112 @@
+import time
+
+import pandas as pd
+import pytest
+
+from backtest.utils.dataretriever import DataRetriever
+from backtest.utils.providers import FakeProvider
+from backtest.utils.scheduler import RequestScheduler
+
+TICKERS = ["AAA", "BBB", "CCC", "DDD", "EEE", "FFF", "GGG"]
+
+
+class CountingProvider(FakeProvider):
+    """FakeProvider that records its requests, and can fail or leave out tickers."""
+
+    def __init__(self, latency=0.0, failing_batches=False, missing=(), broken=None):
+        super().__init__(latency=latency)
+        self.failing_batches = failing_batches
+        self.missing = set(missing)  # Left out of batch downloads
+        self.broken = broken or {}  # Ticker -> frame returned instead of its bars
+        self.histories, self.batches = [], []
+
+    def history(self, ticker, **kwargs):
+        self.histories.append(ticker)
+        data = super().history(ticker, **kwargs)
+        return self.broken.get(ticker, data)
+
+    def download(self, tickers, **kwargs):
+        self.batches.append(list(tickers))
+        if self.failing_batches:
+            raise ConnectionError("batch endpoint down")
+        data = super().download(tickers, **kwargs)
+        return {ticker: df for ticker, df in data.items() if ticker not in self.missing}
+
+
+def retriever(provider, **kwargs):
+    return DataRetriever(
+        start_date="2022-01-01",
+        end_date="2022-06-01",
+        interval="1d",
+        provider=provider,
+        scheduler=RequestScheduler(rate=1000, burst=100, retries=0),
+        **kwargs,
+    )
+
+
+def test_downloads_run_concurrently():
+    provider = CountingProvider(latency=0.2)
+    start = time.perf_counter()
+    data = retriever(provider, batch_size=None, max_workers=len(TICKERS)).get_data(TICKERS, SP500=False)
+    elapsed = time.perf_counter() - start
+
+    assert list(data) == TICKERS
+    assert sorted(provider.histories) == TICKERS
+    # One after another would take len(TICKERS) * 0.2s
+    assert elapsed < 0.5 * len(TICKERS) * 0.2
+
+
+def test_full_downloads_go_through_the_batch_endpoint():
+    provider = CountingProvider()
+    data = retriever(provider, batch_size=3).get_data(TICKERS, SP500=False)
+
+    assert list(data) == TICKERS
+    assert sorted(map(len, provider.batches)) == [1, 3, 3]
+    assert provider.histories == []
+
+
+def test_failed_or_partial_batches_fall_back_to_single_downloads():
+    provider = CountingProvider(failing_batches=True)
+    data = retriever(provider, batch_size=3).get_data(TICKERS, SP500=False)
+    assert list(data) == TICKERS
+    assert sorted(provider.histories) == TICKERS
+
+    provider = CountingProvider(missing={"BBB"})
+    data = retriever(provider, batch_size=10).get_data(TICKERS, SP500=False)
+    assert list(data) == TICKERS
+    assert provider.histories == ["BBB"]
+
+
+def test_incomplete_tickers_are_skipped_and_reported():
+    bars = FakeProvider().history("CCC", start="2022-01-01", end="2022-06-01")
+    provider = CountingProvider(
+        broken={"BBB": bars.drop(columns="Volume"), "CCC": bars.iloc[:0]}
+    )
+    dataretriever = retriever(provider, batch_size=None)
+    data = dataretriever.get_data(["AAA", "BBB", "CCC"], SP500=False)
+
+    assert list(data) == ["AAA"]
+    assert dataretriever.failed_tickers["BBB"] == "missing OHLCV columns"
+    assert "No data" in dataretriever.failed_tickers["CCC"]
+
+    with pytest.raises(ValueError, match="No data for any ticker"):
+        dataretriever.get_data(["BBB", "CCC"], SP500=False)
+
+
+def test_tickers_are_aligned_on_the_latest_start():
+    late = FakeProvider().history("BBB", start="2022-03-01", end="2022-06-01")
+    provider = CountingProvider(broken={"BBB": late})
+    data = retriever(provider, batch_size=None).get_data(["AAA", "BBB"], SP500=False)
+
+    assert data["AAA"].index[0] == data["BBB"].index[0] == late.index[0]
+    assert data["AAA"].index[-1] == pd.Timestamp("2022-05-31", tz="America/New_York")
+
+
+def test_the_callers_ticker_list_is_not_modified():
+    tickers = []
+    data = retriever(CountingProvider()).get_data(tickers)
+    assert list(data) == ["^GSPC"]
+    assert tickers == []
+
+    with pytest.raises(ValueError):
+        retriever(CountingProvider()).get_data(tickers, SP500=False)
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from backtest.backtest import Backtest
+from backtest.utils.events import Cross, Wake
+
+from conftest import BatchThreshold, Threshold
+
+TICKERS = ["AAA", "BBB", "CCC", "DDD"]
+
+
+class EventThreshold(Threshold):
+    """
+    Threshold that sleeps until the close crosses its SMA (or stops trigger), the only
+    bars on which Threshold can act. It also wakes up every `every` days on top.
+    """
+
+    def __init__(self, window=20, amount=1, every=None):
+        super().__init__(window, amount)
+        self.every = every
+
+    def next_event(self, date, cross_section, positions):
+        conditions = [Cross(ticker, "Close", self.column) for ticker in cross_section.tickers]
+        wake_date = date + pd.Timedelta(days=self.every) if self.every is not None else None
+        return Wake(wake_date, conditions)
+
+
+class BatchEventThreshold(BatchThreshold, EventThreshold):
+    """EventThreshold through get_actions."""
+
+
+def run(strategy, **settings):
+    backtest = Backtest(interval="1d", commission=0.001, initial_capital=1e6, **settings)
+    backtest.run(strategy, TICKERS, start_visualizer=False)
+    return backtest
+
+
+def trades(backtest):
+    """The action history without the no-op records, which event driven runs skip."""
+    actions = backtest.action_history
+    return actions[actions["Type"] != "None"].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("every", [None, 7])
+@pytest.mark.parametrize("trailing", [None, 0.03])
+@pytest.mark.parametrize("batched", [False, True])
+def test_event_driven_run_matches_per_bar_run(prices, every, trailing, batched):
+    settings = dict(stop_loss_pct=0.02, trailing_stop_pct=trailing)
+    per_bar = (BatchThreshold if batched else Threshold)(20, 3)
+    events = (BatchEventThreshold if batched else EventThreshold)(20, 3, every)
+    expected, actual = run(per_bar, **settings), run(events, **settings)
+
+    # Bars were skipped, and stops fired on some of them
+    assert len(actual.action_history) < 0.75 * len(expected.action_history)
+    assert trades(expected)["Stop Loss"].notna().any()
+
+    pd.testing.assert_frame_equal(actual.portfolio_history, expected.portfolio_history)
+    pd.testing.assert_frame_equal(trades(actual), trades(expected))
+    pd.testing.assert_frame_equal(actual.position_history, expected.position_history)
+    assert actual.capital == pytest.approx(expected.capital, rel=1e-12)
+    final = actual.performance_history.iloc[-1]
+    pd.testing.assert_series_equal(final, expected.performance_history.iloc[-1], check_names=False)
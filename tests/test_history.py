@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.backtest import Backtest
+from backtest.utils.history import DATE, HistoryRecorder, TradeLog
+
+from conftest import BatchThreshold, Targets, Threshold
+
+DATES = pd.date_range("2021-01-01", periods=10, freq="D")
+
+
+def recorder(capacity=2):
+    return HistoryRecorder(
+        {"Ticker": object, "Price": np.float64, "Date": DATE}, dates=DATES, capacity=capacity
+    )
+
+
+def test_to_frame_keeps_the_column_layout():
+    history = recorder()
+    history.append("AAA", 1.5, 0)
+    history.append_row({"Date": 3, "Price": 2.5, "Ticker": "BBB"})
+    history.extend({"Ticker": ["CCC", "DDD"], "Price": 3.5, "Date": [4, 5]})
+
+    frame = history.to_frame()
+    assert list(frame.columns) == ["Ticker", "Price", "Date"]
+    assert frame["Ticker"].tolist() == ["AAA", "BBB", "CCC", "DDD"]
+    assert frame["Price"].tolist() == [1.5, 2.5, 3.5, 3.5]
+    assert frame["Date"].tolist() == list(DATES[[0, 3, 4, 5]])
+
+    indexed = HistoryRecorder({"Date": DATE, "Cash": np.float64}, index="Date", dates=DATES)
+    indexed.append(2, 100.0)
+    assert indexed.to_frame().index.equals(pd.DatetimeIndex(DATES[[2]], name="Date"))
+
+
+def test_capacity_grows_without_losing_rows():
+    history = recorder(capacity=1)
+    for i in range(5):
+        history.append("AAA", float(i), i)
+    assert len(history) == 5
+    assert history.capacity >= 5
+
+    history.extend_values(20, "BBB", np.arange(20.0), 9)
+    assert len(history) == 25
+    assert history.capacity >= 25
+    np.testing.assert_array_equal(history.column("Price"), np.r_[np.arange(5.0), np.arange(20.0)])
+
+    history.reserve(100)
+    assert history.capacity == 100
+    assert history.to_frame()["Ticker"].tolist() == ["AAA"] * 5 + ["BBB"] * 20
+    history.reserve(10)
+    assert history.capacity == 100
+
+
+def test_snapshot_is_isolated_from_later_rows():
+    history = recorder(capacity=2)
+    history.append("AAA", 1.0, 0)
+    history.append("BBB", 2.0, 1)
+    snapshot = history.snapshot()
+    expected = snapshot.to_frame()
+
+    # Writes rows the snapshot must not see, without and with growing the buffers
+    history.clear()
+    history.append("CCC", 3.0, 2)
+    history.extend_values(10, "DDD", 4.0, 3)
+
+    assert len(snapshot) == 2
+    pd.testing.assert_frame_equal(snapshot.to_frame(), expected)
+    assert history.to_frame()["Ticker"].tolist() == ["CCC"] + ["DDD"] * 10
+    with pytest.raises(ValueError):
+        snapshot.column("Price")[0] = 0.0
+
+
+def test_trade_log_only_indexes_filled_orders():
+    log = TradeLog({"Ticker": object, "Type": object, "Date": DATE}, dates=DATES)
+    log.append("AAA", "buy", 0)
+    log.append("AAA", "buy", 1, filled=False)
+    log.append("AAA", "None", 2)
+    tickers = np.array(["AAA", "BBB", "AAA"], dtype=object)
+    log.extend_values(3, tickers, "sell", 3, filled=np.array([True, True, False]))
+    log.extend({"Ticker": "BBB", "Type": ["buy", "sell"], "Date": 4}, filled=np.array([False, True]))
+
+    snapshot = log.snapshot()
+    assert len(snapshot) == 8
+    assert snapshot.trade_rows("AAA", "buy").tolist() == [0]
+    assert snapshot.trade_rows("AAA", "sell").tolist() == [3]
+    assert snapshot.trade_rows("BBB", "buy").tolist() == []
+    assert snapshot.trade_rows("BBB", "sell").tolist() == [4, 7]
+
+
+@pytest.mark.parametrize(
+    "strategy, mode",
+    [(Threshold(20, 3), "event"), (BatchThreshold(20, 3), "event"), (Targets(), "vectorized")],
+    ids=["per-ticker", "batched", "vectorized"],
+)
+def test_rejected_orders_are_not_indexed_as_trades(prices, strategy, mode):
+    # Too little cash for some of the buys
+    backtest = Backtest(interval="1d", initial_capital=400, stop_loss_pct=0.02)
+    backtest.run(strategy, ["AAA", "BBB", "CCC"], start_visualizer=False, mode=mode)
+
+    actions, orders = backtest.action_history, backtest.order_history
+    snapshot = backtest.snapshot.histories["action"]
+    assert (actions["Type"] == "buy").sum() > (orders["Type"] == "buy").sum()
+    for ticker in backtest.tickers:
+        for type_ in ("buy", "sell"):
+            executed = orders[(orders["Ticker"] == ticker) & (orders["Type"] == type_)]
+            trades = snapshot.trades(ticker, type_)
+            assert len(trades) == len(executed)
+            np.testing.assert_allclose(trades["Amount"].to_numpy(), executed["Amount"].to_numpy())
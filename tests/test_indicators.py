@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.utils.indicators import SMA, RSI, MACD, Bollinger, EMA, evaluate_batch, rolling_moments
+from backtest.utils.indicator_graph import IndicatorGraph
+from backtest.backtest import Backtest
+
+from conftest import BatchThreshold, Threshold, synthetic_prices
+
+WINDOWS = [2, 20, 200]
+
+
+def long_series(kind, n_bars=300_000):
+    rng = np.random.default_rng(7)
+    if kind == "walk":
+        return 100 * np.exp(np.cumsum(rng.normal(0, 0.0005, (n_bars, 2)), axis=0))
+    if kind == "trend":
+        return np.arange(n_bars)[:, None] + rng.normal(0, 1, (n_bars, 2))
+    values = 1e4 + np.cumsum(rng.normal(0, 1, (n_bars, 2)), axis=0)
+    return np.where(rng.random((n_bars, 2)) < 0.01, np.nan, values)
+
+
+def exact_std(x, window, rows):
+    """Two-pass sample standard deviation of the windows ending on `rows`."""
+    windows = x[rows[:, None] + np.arange(1 - window, 1)]
+    return windows.std(axis=1, ddof=1)
+
+
+@pytest.mark.parametrize("kind", ["walk", "trend", "nan"])
+def test_rolling_moments_match_pandas_on_long_series(kind):
+    x = long_series(kind)
+    moments = rolling_moments(x, WINDOWS)
+    scale = np.nanmean(np.abs(x))
+
+    for window in WINDOWS:
+        rolling = pd.DataFrame(x).rolling(window)
+        mean, std = moments[window]
+        expected_mean, expected_std = rolling.mean().to_numpy(), rolling.std().to_numpy()
+        np.testing.assert_array_equal(np.isnan(mean), np.isnan(expected_mean))
+        np.testing.assert_array_equal(np.isnan(std), np.isnan(expected_std))
+        np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+        # pandas' own rounding error is up to ~1e-7 of the price scale for short windows
+        np.testing.assert_allclose(std, expected_std, rtol=0, atol=1e-6 * scale)
+
+        rows = np.random.default_rng(window).integers(window - 1, len(x), 2000)
+        exact = exact_std(x, window, rows)
+        np.testing.assert_allclose(std[rows], exact, rtol=0, atol=1e-8 * scale)
+
+
+def test_evaluate_batch_matches_indicator_graph():
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.02, (3000, 4)), axis=0))
+    close[100:110, 2] = np.nan
+    indicators = [SMA(5), SMA(50), Bollinger(20, 2.5), RSI(9), EMA(10)]
+
+    batch = evaluate_batch(indicators, close)
+    frame = pd.DataFrame(close)
+    graph = IndicatorGraph(indicators).run(lambda column: frame)
+    for column, values in graph.items():
+        np.testing.assert_allclose(batch[column], values.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+def test_graph_computes_families_in_one_batch():
+    data = {ticker: synthetic_prices(ticker, 500) for ticker in ["AAA", "BBB"]}
+    data["AAA"].iloc[200:205, data["AAA"].columns.get_loc("Close")] = np.nan
+    indicators = [SMA(5), SMA(50), RSI(9), RSI(), EMA(3), EMA(10), MACD(), Bollinger()]
+
+    graph = IndicatorGraph(indicators)
+    assert {type(members[0]) for members in graph.batches.values()} == {SMA, RSI, EMA}
+    computed = graph.apply_wide({ticker: frame.copy() for ticker, frame in data.items()})
+    for ticker, frame in data.items():
+        for indicator in indicators:
+            expected = IndicatorGraph([indicator]).apply(frame.copy())
+            for column in indicator.columns:
+                np.testing.assert_allclose(
+                    computed[ticker][column], expected[column], rtol=1e-9, atol=1e-9, err_msg=column
+                )
+
+
+class Undeclared(Threshold):
+    """Reads SMA20 without declaring it."""
+
+    def __init__(self):
+        super().__init__(20)
+        self.indicators = []
+
+
+class BatchUndeclared(BatchThreshold, Undeclared):
+    """Reads SMA20 from the cross section without declaring it."""
+
+
+@pytest.mark.parametrize("strategy", [Undeclared, BatchUndeclared])
+def test_undeclared_indicator_columns_are_not_computed(prices, strategy):
+    backtest = Backtest(interval="1d", initial_capital=1e4)
+    with pytest.raises(KeyError, match="Strategy.indicators"):
+        backtest.run(strategy(), ["AAA"], start_visualizer=False)
+    assert "SMA20" not in backtest.panel.field_index
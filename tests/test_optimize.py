@@ -0,0 +1,34 @@
+import pandas as pd
+
+from backtest.backtest import Backtest
+
+from conftest import Threshold
+
+TICKERS = ["AAA", "BBB", "CCC"]
+
+
+def optimize(backtest, grid, tickers=TICKERS):
+    return backtest.optimize(Threshold, grid, tickers=tickers, metric="Return [%]", n_jobs=1)
+
+
+def test_optimize_twice_with_different_grids(prices):
+    backtest = Backtest(interval="1d", initial_capital=1e4)
+    optimize(backtest, {"window": [10, 20]})
+    # Only indicators of the new grid, which the loaded data does not have yet
+    second = optimize(backtest, {"window": [50], "amount": [1, 2]}, tickers=None)
+    fresh = optimize(Backtest(interval="1d", initial_capital=1e4), {"window": [50], "amount": [1, 2]})
+
+    pd.testing.assert_frame_equal(second, fresh)
+    assert sorted(set(prices)) == sorted(TICKERS + ["^GSPC"])
+
+
+def test_optimize_reloads_other_tickers(prices):
+    backtest = Backtest(interval="1d", initial_capital=1e4)
+    optimize(backtest, {"window": [10]})
+    prices.clear()
+    results = optimize(backtest, {"window": [10]}, tickers=["DDD", "EEE"])
+    fresh = optimize(Backtest(interval="1d", initial_capital=1e4), {"window": [10]}, tickers=["DDD", "EEE"])
+
+    assert "DDD" in prices and "AAA" not in prices
+    assert list(backtest.panel.tickers) == ["DDD", "EEE", "^GSPC"]
+    pd.testing.assert_frame_equal(results, fresh)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.utils.performance import MetricsAccumulator, calculate_metrics, merge_moments
+
+from conftest import synthetic_prices
+
+TICKERS = ["AAA", "BBB"]
+
+
+def portfolio(n_bars):
+    """A portfolio history that is in the market on some bars and flat (all cash) on others."""
+
+    rng = np.random.default_rng(n_bars)
+    dates = pd.date_range("2020-01-01", periods=n_bars, freq="D", tz="America/New_York")
+    equity = 10_000 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    flat = rng.random(n_bars) < 0.3
+    equity[flat] = np.maximum.accumulate(equity)[flat]
+    cash = np.where(flat, equity, equity * 0.4)
+    history = pd.DataFrame(
+        {"Capital": 10_000.0, "Cash": cash, "Equity": equity, "Portfolio Value": equity},
+        index=pd.Index(dates, name="Date"),
+    )
+    types = rng.choice(["buy", "sell", "None"], n_bars)
+    return history, pd.DataFrame({"Type": types})
+
+
+def assert_metrics_equal(actual, expected):
+    for name, value in actual.items():
+        if name in ("Start", "End", "Duration"):
+            assert value == expected[name], name
+        else:
+            np.testing.assert_allclose(value, expected[name], rtol=1e-9, atol=1e-12, err_msg=name)
+
+
+@pytest.mark.parametrize("n_bars", [2, 3, 30, 252, 1000])
+def test_accumulator_matches_calculate_metrics(n_bars):
+    history, actions = portfolio(n_bars)
+    data = {ticker: synthetic_prices(ticker, n_bars) for ticker in TICKERS}
+    closes = np.column_stack([data[ticker]["Close"].to_numpy() for ticker in TICKERS])
+
+    accumulator = MetricsAccumulator(10_000.0, closes[0])
+    for i, (date, row) in enumerate(history.iterrows()):
+        accumulator.update(date, row["Cash"], row["Equity"], closes[i])
+    accumulator.count_trade(int(actions["Type"].isin(["buy", "sell"]).sum()))
+
+    expected = calculate_metrics(history.index[-1], data, history.copy(), actions)
+    assert_metrics_equal(accumulator.metrics(), expected)
+
+
+@pytest.mark.parametrize("n_bars", [30, 1000])
+def test_update_many_matches_update(n_bars):
+    history, _ = portfolio(n_bars)
+    dates, cash, equity = history.index, history["Cash"].to_numpy(), history["Equity"].to_numpy()
+    # update_many takes runs of bars that share their cash
+    runs = np.flatnonzero(np.diff(cash) != 0) + 1
+
+    one_by_one = MetricsAccumulator(10_000.0, [])
+    in_runs = MetricsAccumulator(10_000.0, [])
+    for i in range(n_bars):
+        one_by_one.update(dates[i], cash[i], equity[i])
+    for start, end in zip(np.r_[0, runs], np.r_[runs, n_bars]):
+        in_runs.update_many(dates[start], dates[end - 1], cash[start], equity[start:end])
+
+    assert_metrics_equal(in_runs.metrics(), one_by_one.metrics())
+
+
+def test_merge_moments_matches_numpy():
+    values = np.random.default_rng(3).normal(5, 2, 1000)
+    moments = (0, 0.0, 0.0)
+    for chunk in np.split(values, [1, 2, 10, 500, 500]):
+        moments = merge_moments(moments, chunk)
+
+    n, mean, m2 = moments
+    assert n == len(values)
+    np.testing.assert_allclose(mean, values.mean(), rtol=1e-12)
+    np.testing.assert_allclose(m2 / n, values.var(), rtol=1e-12)
@@ -0,0 +1,147 @@
+import pytest
+
+from backtest.utils.scheduler import CircuitOpenError, RequestScheduler, TokenBucket
+
+
+class Clock:
+    """Fake monotonic clock, sleeping advances it instead of waiting."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Flaky:
+    """Callable that fails its first `failures` calls."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("try again")
+        return "data"
+
+
+def scheduler(clock, **kwargs):
+    options = dict(rate=1000, burst=1000, retries=0, failure_threshold=3, reset_timeout=60.0)
+    options.update(kwargs)
+    return RequestScheduler(clock=clock, sleep=clock.sleep, **options)
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    clock = Clock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock, sleep=clock.sleep)
+
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.now == pytest.approx(1.0)
+
+    # Idle time refills the bucket, but not beyond its capacity
+    clock.now += 100
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_rate_limit_wait_is_reported():
+    clock = Clock()
+    requests = scheduler(clock, rate=1.0, burst=1)
+    for _ in range(4):
+        requests.call(lambda: None)
+
+    stats = requests.stats()
+    assert stats["requests"] == 4
+    assert stats["rate_limit_wait"] == pytest.approx(3.0)
+
+
+def test_retries_back_off_exponentially_with_jitter():
+    clock = Clock()
+    requests = scheduler(clock, retries=4, backoff=1.0, max_backoff=5.0, jitter=0.5, failure_threshold=10)
+    assert requests.call(Flaky(4)) == "data"
+
+    # Full backoffs 1, 2, 4, capped at 5, each cut by up to half by the jitter
+    for delay, full in zip(clock.sleeps, [1, 2, 4, 5]):
+        assert full * 0.5 <= delay <= full
+    stats = requests.stats()
+    assert (stats["requests"], stats["retries"], stats["failures"]) == (5, 4, 4)
+    assert stats["backoff_wait"] == pytest.approx(sum(clock.sleeps))
+
+
+def test_retry_budget_is_per_call():
+    clock = Clock()
+    requests = scheduler(clock, retries=2, failure_threshold=10)
+    failing = Flaky(3)
+    with pytest.raises(ConnectionError):
+        requests.call(failing)
+    assert failing.calls == 3
+    assert requests.call(failing) == "data"
+
+
+def test_circuit_opens_after_consecutive_failures():
+    clock = Clock()
+    requests = scheduler(clock)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            requests.call(Flaky(1))
+    # A success in between starts the count again
+    requests.call(lambda: None)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            requests.call(Flaky(1))
+    assert requests.circuit_open
+
+    never_sent = Flaky(0)
+    with pytest.raises(CircuitOpenError):
+        requests.call(never_sent)
+    assert never_sent.calls == 0
+
+
+def test_circuit_half_opens_after_the_reset_timeout():
+    clock = Clock()
+    requests = scheduler(clock)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            requests.call(Flaky(1))
+
+    clock.now += 59
+    with pytest.raises(CircuitOpenError):
+        requests.call(lambda: None)
+
+    # A failed trial opens the circuit for another reset_timeout
+    clock.now += 1
+    with pytest.raises(ConnectionError):
+        requests.call(Flaky(1))
+    with pytest.raises(CircuitOpenError):
+        requests.call(lambda: None)
+
+    # A successful trial closes it
+    clock.now += 60
+    assert requests.call(lambda: "data") == "data"
+    assert not requests.circuit_open
+    assert requests.call(lambda: "more") == "more"
+
+
+def test_circuit_stays_open_without_reset_timeout():
+    clock = Clock()
+    requests = scheduler(clock, reset_timeout=None)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            requests.call(Flaky(1))
+
+    clock.now += 1e6
+    with pytest.raises(CircuitOpenError):
+        requests.call(lambda: None)
+
+    requests.reset()
+    assert requests.call(lambda: "data") == "data"
+    assert requests.stats()["requests"] == 1
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.backtest import Backtest
+from backtest.utils.indicator_graph import IndicatorGraph
+from backtest.utils.indicators import EMA, MACD, RSI, SMA, Bollinger
+
+from conftest import BatchThreshold, Threshold, synthetic_prices
+
+INDICATORS = [
+    SMA(1),
+    SMA(5),
+    SMA(20),
+    EMA(1),
+    EMA(10),
+    MACD(),
+    MACD(5, 11, 4),
+    RSI(),
+    RSI(5),
+    Bollinger(),
+    Bollinger(10, 1.5),
+]
+
+
+def close_prices(kind, n_bars=400):
+    frame = synthetic_prices("AAA", n_bars)
+    close = frame["Close"].to_numpy().copy()
+    if kind == "gaps":
+        # Single missing bars and a long gap, longer than some of the windows
+        close[[30, 31, 90, 250]] = np.nan
+        close[150:180] = np.nan
+    elif kind == "flat":
+        close[100:160] = close[100]
+    frame["Close"] = close
+    return frame
+
+
+@pytest.mark.parametrize("kind", ["walk", "gaps", "flat"])
+@pytest.mark.parametrize("indicator", INDICATORS, ids=str)
+def test_streaming_matches_batch(indicator, kind):
+    frame = close_prices(kind)
+    expected = IndicatorGraph([indicator]).apply(frame.copy())
+
+    stream = indicator.stream()
+    streamed = [stream.update(row) for _, row in frame.iterrows()]
+    for column in indicator.columns:
+        np.testing.assert_allclose(
+            [values[column] for values in streamed],
+            expected[column].to_numpy(),
+            rtol=1e-9,
+            atol=1e-9,
+            equal_nan=True,
+            err_msg=column,
+        )
+
+
+@pytest.mark.parametrize("strategy", [Threshold, BatchThreshold])
+def test_streamed_run_matches_precomputed(prices, strategy):
+    results = []
+    for stream in (False, True):
+        backtest = Backtest(
+            interval="1d",
+            initial_capital=1e4,
+            stop_loss_pct=0.02,
+            trailing_stop_pct=0.02,
+            stream_indicators=stream,
+        )
+        backtest.run(strategy(20, 3), ["AAA", "BBB", "CCC"], start_visualizer=False)
+        results.append(backtest)
+    precomputed, streamed = results
+
+    pd.testing.assert_frame_equal(streamed.portfolio_history, precomputed.portfolio_history)
+    pd.testing.assert_frame_equal(streamed.action_history, precomputed.action_history)
+    pd.testing.assert_frame_equal(streamed.position_history, precomputed.position_history)
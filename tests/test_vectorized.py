@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+import pytest
+
+from backtest.backtest import Backtest
+from backtest.utils.dataretriever import DataRetriever
+from backtest.utils.position import PositionBook
+
+from conftest import Targets, Threshold, synthetic_prices
+
+TICKERS = ["AAA", "BBB", "CCC"]
+
+
+def run(strategy, mode, **settings):
+    backtest = Backtest(interval="1d", slippage=0.001, commission=0.001, **settings)
+    backtest.run(strategy, TICKERS, start_visualizer=False, mode=mode)
+    return backtest
+
+
+def trades(backtest):
+    actions = backtest.action_history
+    return actions[actions["Type"] != "None"].reset_index(drop=True)
+
+
+@pytest.mark.parametrize("strategy", [Threshold(20, amount=2), Targets()], ids=["threshold", "targets"])
+@pytest.mark.parametrize("capital", [300, 600, 1e6])
+@pytest.mark.parametrize(
+    "stops",
+    [
+        dict(stop_loss_pct=0.02),
+        dict(stop_loss_pct=0.01, stop_gap="stop"),
+        dict(stop_loss_pct=0.03, stop_gap="level", stop_trigger="low"),
+        dict(stop_loss_pct=0.02, trailing_stop_pct=0.02, stop_gap="stop", stop_trigger="low"),
+    ],
+    ids=["close", "gap-stop", "gap-level-low", "trailing"],
+)
+def test_vectorized_matches_event_loop(prices, strategy, capital, stops):
+    event = run(strategy, "event", initial_capital=capital, **stops)
+    vectorized = run(strategy, "vectorized", initial_capital=capital, **stops)
+
+    np.testing.assert_allclose(
+        vectorized.portfolio_history["Equity"].to_numpy(),
+        event.portfolio_history["Equity"].to_numpy(),
+        rtol=0,
+        atol=1e-8,
+    )
+    columns = ["Size", "Entry Price", "Stop Loss"]
+    np.testing.assert_allclose(
+        vectorized.position_history[columns].to_numpy(dtype=float),
+        event.position_history[columns].to_numpy(dtype=float),
+    )
+
+    expected, actual = trades(event), trades(vectorized)
+    assert len(actual) == len(expected)
+    assert (actual[["Ticker", "Type", "Date"]] == expected[["Ticker", "Type", "Date"]]).all().all()
+    columns = ["Amount", "Price", "Stop Loss"]
+    np.testing.assert_allclose(
+        actual[columns].to_numpy(dtype=float), expected[columns].to_numpy(dtype=float)
+    )
+
+
+def test_rejected_buys_leave_no_stop_level(prices):
+    # Too little cash for most buys, so positions that never opened must stay without a stop
+    backtest = run(Targets(), "vectorized", initial_capital=150, stop_loss_pct=0.02)
+    positions = backtest.position_history
+    never_held = positions.groupby("Ticker")["Size"].transform(
+        lambda size: size.cumsum() == 0
+    )
+    assert never_held.any()
+    assert positions.loc[never_held, "Stop Loss"].isna().all()
+
+
+def test_vectorized_is_much_faster_than_the_event_loop(prices, monkeypatch):
+    monkeypatch.setattr(DataRetriever, "get_ticker_data", lambda self, ticker: synthetic_prices(ticker, 2000))
+    strategy = Targets()
+    backtest = Backtest(interval="1d", initial_capital=1e7, stop_loss_pct=0.02, record_noops=False)
+    backtest.get_tickers([f"T{n:02d}" for n in range(20)])
+    backtest.select_indicators([strategy])
+    backtest.get_data()
+
+    def best_time(run):
+        times = []
+        for _ in range(3):
+            backtest.positions = PositionBook(backtest.tickers)
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    event = best_time(lambda: backtest.run_backtest(strategy, backtest.tickers))
+    vectorized = best_time(lambda: backtest.run_vectorized_backtest(strategy))
+    # About 10x here, the margin leaves room for noisy machines
+    assert vectorized * 4 < event
@@ -4,14 +4,18 @@ from backtest.utils.position import Position
 
 class CustomStrategy(Strategy):
 
+    # Only declared indicators are computed, this adds the SMA50 column
+    indicators = [("SMA", {"window": 50})]
+
     def __init__(self):
         pass
 
 
     def get_action(self, data, ticker,positions):
         # Custom strategy to buy if the price is above the 50-day moving average
-        if not positions[ticker].is_open():
+        if not positions[ticker].is_open() and data['Close'] > data['SMA50']:
             return Action(type='buy', amount = 1, stop_loss=data['Close']*0.95)
         else:
             return Action(type='None', amount = 0, stop_loss=None)
+            
             
\ No newline at end of file